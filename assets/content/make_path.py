@@ -282,33 +282,28 @@ def make_path_titletxt():
 
 
 import csv
+import hashlib
+import json
 import os
 
+ID_MAP_FILE = "item_ids.json"           # ファイル名 → item_id の固定表
+CHANGES_FILE = "items_changes.json"     # 直近のビルドで変わった item_id
 
-def txts_to_single_csv(input_dir, output_csv="items.csv"):
-    """
-    指定フォルダ内の全txtファイルを読み取り、1つのCSV (items.csv) にまとめて出力する。
-    CSVのカラムは item_id, title, body, tags, category。
-    """
-    txt_files = [f for f in os.listdir(input_dir) if f.endswith(".txt")]
-    if not txt_files:
-        print("⚠️ 指定フォルダにtxtファイルが見つかりません。")
-        return
-
-    rows = []
-    for i, filename in enumerate(sorted(txt_files), start=1):
-        item_id = i
-        txt_path = os.path.join(input_dir, filename)
-
-        with open(txt_path, "r", encoding="utf-8") as f:
-            lines = [line.strip() for line in f if line.strip()]
 
-        title = ""
-        body = ""
-        category = ""
-        keywords = ""
+def parse_txt(txt_path):
+    """1つのTXTから (title, body, tags, category, sha256) を読み取る"""
+    title = ""
+    body = ""
+    category = ""
+    keywords = ""
+    digest = hashlib.sha256()
 
-        for line in lines:
+    with open(txt_path, "r", encoding="utf-8") as f:
+        for raw in f:
+            digest.update(raw.encode("utf-8"))
+            line = raw.strip()
+            if not line:
+                continue
             if line.startswith("title:"):
                 title = line.replace("title:", "").strip()
             elif line.startswith("main:"):
@@ -318,18 +313,140 @@ def txts_to_single_csv(input_dir, output_csv="items.csv"):
             elif line.startswith("keyword:"):
                 keywords = line.replace("keyword:", "").strip()
 
-        # --- タグをセミコロン区切りに整形 ---
-        tags = ";".join([t.strip() for t in keywords.split(",") if t.strip()])
+    # --- タグをセミコロン区切りに整形 ---
+    tags = ";".join([t.strip() for t in keywords.split(",") if t.strip()])
+    return title, body, tags, category, digest.hexdigest()
+
+
+def file_sha256(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def read_item_rows(output_csv):
+    """既存の items.csv を {item_id: [title, body, tags, category]} で読む（無ければ空）"""
+    if not os.path.exists(output_csv):
+        return {}
+    with open(output_csv, "r", encoding="utf-8-sig", newline="") as f:
+        return {
+            int(row["item_id"]): [row["title"], row["body"], row["tags"], row["category"]]
+            for row in csv.DictReader(f)
+        }
+
+
+def load_id_map(id_map_path, output_csv, input_dir, filenames):
+    """item_id の固定表を読む。無ければ既存の items.csv からタイトルで引き継ぐ。"""
+    if os.path.exists(id_map_path):
+        with open(id_map_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    id_map = {"next_id": 1, "files": {}}
+    if not os.path.exists(output_csv):
+        return id_map
+
+    with open(output_csv, "r", encoding="utf-8-sig") as f:
+        id_to_title = {int(row["item_id"]): row["title"] for row in csv.DictReader(f)}
+
+    # 旧実装はソートしたファイル名の順に 1 から番号を振っていたので、その番号を引き継ぐ。
+    # タイトルが合わないファイルだけ、残った番号からタイトルで探す。
+    unmatched = []
+    for i, filename in enumerate(sorted(filenames), start=1):
+        title = parse_txt(os.path.join(input_dir, filename))[0]
+        if id_to_title.get(i) == title:
+            id_map["files"][filename] = {"item_id": i, "sha256": None}
+            del id_to_title[i]
+        else:
+            unmatched.append((filename, title))
+    title_to_id = {title: item_id for item_id, title in sorted(id_to_title.items(), reverse=True)}
+    for filename, title in unmatched:
+        if title in title_to_id:
+            id_map["files"][filename] = {"item_id": title_to_id.pop(title), "sha256": None}
+
+    used = [entry["item_id"] for entry in id_map["files"].values()] + list(id_to_title)
+    id_map["next_id"] = max([0] + used) + 1
+    return id_map
 
-        rows.append([item_id, title, body, tags, category])
 
-    # --- CSV出力 ---
-    with open(output_csv, "w", newline="", encoding="utf-8-sig") as csvfile:
+def txts_to_single_csv(input_dir, output_csv="items.csv", id_map_path=None, changes_path=None):
+    """
+    指定フォルダ内の全txtファイルを読み取り、1つのCSV (items.csv) にまとめて出力する。
+    CSVのカラムは item_id, title, body, tags, category。
+
+    item_id はファイル名ごとに固定（item_ids.json）し、削除された番号も再利用しない。
+    ファイルは1件ずつ読み書きし、追加・変更・削除された item_id を
+    items_changes.json に書き出す（配信側のインデックスはこれで差分更新できる）。
+    ハッシュが未記録のファイル（固定表を作った初回など）は、前回の items.csv の行と比べる。
+    """
+    out_dir = os.path.dirname(os.path.abspath(output_csv))
+    id_map_path = id_map_path or os.path.join(out_dir, ID_MAP_FILE)
+    changes_path = changes_path or os.path.join(out_dir, CHANGES_FILE)
+
+    txt_files = sorted(f for f in os.listdir(input_dir) if f.endswith(".txt"))
+    if not txt_files:
+        print("⚠️ 指定フォルダにtxtファイルが見つかりません。")
+        return None
+
+    id_map = load_id_map(id_map_path, output_csv, input_dir, txt_files)
+    known = id_map["files"]
+    base_checksum = file_sha256(output_csv)
+    previous_rows = read_item_rows(output_csv)
+
+    # 新規ファイルに item_id を割り当てる（既存の番号は変えない）
+    added, modified = [], []
+    for filename in txt_files:
+        if filename not in known:
+            known[filename] = {"item_id": id_map["next_id"], "sha256": None}
+            id_map["next_id"] += 1
+            added.append(known[filename]["item_id"])
+    present = set(txt_files)
+    gone = [filename for filename in known if filename not in present]
+    removed = sorted(known[filename]["item_id"] for filename in gone)
+    for filename in gone:
+        del known[filename]
+
+    # --- CSV出力（item_id 順に1件ずつ書いて最後に差し替え） ---
+    tmp_csv = output_csv + ".tmp"
+    with open(tmp_csv, "w", newline="", encoding="utf-8-sig") as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(["item_id", "title", "body", "tags", "category"])
-        writer.writerows(rows)
-
-    print(f"✅ {len(rows)}件のデータを {output_csv} にまとめました。")
+        for filename in sorted(txt_files, key=lambda name: known[name]["item_id"]):
+            entry = known[filename]
+            title, body, tags, category, digest = parse_txt(os.path.join(input_dir, filename))
+            if entry["sha256"] is not None:
+                changed = entry["sha256"] != digest
+            else:
+                previous = previous_rows.get(entry["item_id"])
+                changed = previous is not None and previous != [title, body, tags, category]
+            if changed:
+                modified.append(entry["item_id"])
+            entry["sha256"] = digest
+            writer.writerow([entry["item_id"], title, body, tags, category])
+    os.replace(tmp_csv, output_csv)
+
+    # 前回の items.csv にあってどのファイルにも対応しなくなった番号も削除扱い
+    written_ids = {entry["item_id"] for entry in known.values()}
+    removed = sorted(set(removed) | (set(previous_rows) - written_ids))
+
+    with open(id_map_path, "w", encoding="utf-8") as f:
+        json.dump(id_map, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+    changes = {
+        "base_checksum": base_checksum,
+        "checksum": file_sha256(output_csv),
+        "added": sorted(added),
+        "modified": sorted(modified),
+        "removed": removed,
+    }
+    with open(changes_path, "w", encoding="utf-8") as f:
+        json.dump(changes, f, ensure_ascii=False, indent=1)
+
+    print(
+        f"✅ {len(txt_files)}件のデータを {output_csv} にまとめました。"
+        f"（追加 {len(added)} / 変更 {len(modified)} / 削除 {len(removed)}）"
+    )
+    return changes
 
 
 # --- 実行例 ---
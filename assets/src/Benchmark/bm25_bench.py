@@ -0,0 +1,99 @@
+"""SparseBM25 と rank_bm25.BM25Okapi の一致確認とベンチマーク。
+
+    python bm25_bench.py [--sizes 90 10000 100000] [--queries 20]
+
+90件は実際の items.csv（共有トークナイザーでトークン化）、それ以外は合成コーパスを使う。
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))  # ../assets/src/Benchmark
+SRC_DIR = os.path.dirname(APP_DIR)                    # ../assets/src
+
+if SRC_DIR not in sys.path:
+    sys.path.append(SRC_DIR)
+
+from rank_bm25 import BM25Okapi
+
+from Benchmark import synthetic
+from InteresrEstimator.bm25_index import SparseBM25
+
+TOLERANCE = 1e-8
+
+
+def real_corpus():
+    from ContentManager.item_catalog import catalog
+    from InteresrEstimator.tokenizer import get_tokenizer
+
+    t = get_tokenizer()
+    data = catalog.data
+    return t.tokenize_many(data.bodies), t.tokenize_many(data.titles)
+
+
+def matches(expected, actual):
+    """rank_bm25 のスコアと一致するか（許容誤差は TOLERANCE × max(1, |expected| の最大値)）"""
+    scale = max(1.0, float(np.max(np.abs(expected)))) if len(expected) else 1.0
+    return bool(np.allclose(actual, expected, rtol=0.0, atol=TOLERANCE * scale))
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def bench(size, n_queries):
+    if size <= 90:
+        corpus, queries = real_corpus()
+    else:
+        corpus = synthetic.make_token_corpus(size)
+        queries = synthetic.make_queries(corpus, n_queries)
+    queries = queries[:n_queries]
+
+    old, old_build = timed(BM25Okapi, corpus)
+    new, new_build = timed(SparseBM25.build, corpus)
+
+    old_times, new_times, max_diff, match = [], [], 0.0, True
+    for q in queries:
+        expected, t_old = timed(old.get_scores, q)
+        actual, t_new = timed(new.get_scores, q)
+        old_times.append(t_old)
+        new_times.append(t_new)
+        max_diff = max(max_diff, float(np.max(np.abs(expected - actual))))
+        # 許容誤差はクエリごとのスコアの大きさで決める
+        match = match and matches(expected, actual)
+
+    return {
+        "docs": len(corpus),
+        "build_rank_bm25_s": old_build,
+        "build_sparse_s": new_build,
+        "query_rank_bm25_ms": 1000 * float(np.mean(old_times)),
+        "query_sparse_ms": 1000 * float(np.mean(new_times)),
+        "speedup": float(np.mean(old_times) / np.mean(new_times)),
+        "max_abs_diff": max_diff,
+        "match": match,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[90, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'docs':>8} | {'build old/new (s)':>18} | {'query old/new (ms)':>20} | {'speedup':>7} | match")
+    for size in args.sizes:
+        r = bench(size, args.queries)
+        print(
+            f"{r['docs']:>8} | {r['build_rank_bm25_s']:>8.2f} / {r['build_sparse_s']:<7.2f} | "
+            f"{r['query_rank_bm25_ms']:>9.2f} / {r['query_sparse_ms']:<8.3f} | "
+            f"{r['speedup']:>6.0f}x | {r['match']} (max diff {r['max_abs_diff']:.1e})"
+        )
+
+
+if __name__ == "__main__":
+    main()
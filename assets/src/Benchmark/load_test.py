@@ -0,0 +1,383 @@
+"""user_events.csv を再生して /log_event と /recommend に同時に負荷をかける負荷試験。
+
+    python load_test.py [--concurrency 8] [--rate 200] [--synthetic 5000] [--reads-per-event 1]
+    python load_test.py --url http://127.0.0.1:5000 --log-dir ../../logs
+
+既定ではアプリをプロセス内に読み込み、Flask のテストクライアントへ送る。
+ログ・インデックス・モデルは一時ディレクトリ（user_events.csv の複製入り）に向けるので、
+実際の assets/logs は汚れない。--url を渡すと起動済みのローカルサーバーへ送る。
+
+ワークロードは Flutter の操作と同じ順序で組み立てる:
+イベントごとに /log_event（item_id はタイトル）を送り、click / navigate の後には
+開いたページの関連記事取得として /recommend（keyword はタイトル）を続ける。
+--synthetic で user_events.csv の後ろにべき分布の合成イベントを足せる。
+
+終了後にエンドポイント別のレイテンシ分位点・エラー率と、受理された /log_event が
+user_events.csv とイベントストアに過不足なく書かれたか（イベントログの整合性）を表示する。
+"""
+import argparse
+import collections
+import csv
+import json
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))  # ../assets/src/Benchmark
+SRC_DIR = os.path.dirname(APP_DIR)                    # ../assets/src
+ASSETS_DIR = os.path.dirname(SRC_DIR)                 # ../assets
+
+if SRC_DIR not in sys.path:
+    sys.path.append(SRC_DIR)
+
+from Benchmark import synthetic
+
+# ================================
+# 🔧 設定
+# ================================
+EVENTS_CSV = os.path.join(ASSETS_DIR, "logs", "user_events.csv")
+READ_ACTIONS = ("click", "navigate")   # ページを開く操作（この後に /recommend が来る）
+ACTION_NAMES = {1: "click", 2: "bookmark", 3: "navigate"}
+HTTP_TIMEOUT_SEC = 30
+SETTLE_SEC = 1.0    # 外部サーバーのイベントライターが書き切るまで待つ時間
+MIGRATION_WAIT_SEC = 60   # 外部サーバーが user_events.csv をストアへ移し終えるのを待つ最長時間
+PERCENTILES = (50, 90, 99)
+
+
+# ============================================================
+# ワークロード
+# ============================================================
+def load_replay_events(path=EVENTS_CSV):
+    """user_events.csv を (user_id, item_id, action, from) のリストで読む"""
+    events = []
+    with open(path, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            try:
+                events.append((int(row["user_id"]), int(row["item_id"]), row["action"], row["from"] or ""))
+            except (KeyError, TypeError, ValueError):
+                continue
+    return events
+
+
+def make_synthetic_events(n_events, data, n_users, seed=0):
+    """カタログ上のアイテムに対するべき分布の合成イベント（user_events.csv の続き）"""
+    ts, users, positions, actions = synthetic.make_events(n_events, n_users, len(data), seed=seed)
+    rng = np.random.default_rng(seed + 1)
+    item_ids = data.item_ids[positions - 1]
+    sources = rng.integers(0, len(data), n_events)
+    return [
+        (int(u), int(i), ACTION_NAMES[int(a)], data.titles[s])
+        for u, i, a, s in zip(users, item_ids, actions, sources)
+    ]
+
+
+def build_workload(events, data, reads_per_event=1.0, seed=0):
+    """イベント列を送信順の [(path, payload), ...] にする"""
+    rng = np.random.default_rng(seed)
+    ops = []
+    for user_id, item_id, action, from_page in events:
+        title = data.title(item_id)
+        if not title:
+            continue
+        ops.append(("/log_event", {"user_id": user_id, "item_id": title, "action": action, "from": from_page}))
+        if action in READ_ACTIONS:
+            reads = int(reads_per_event) + int(rng.random() < reads_per_event % 1)
+            ops.extend(("/recommend", {"user_id": user_id, "keyword": title}) for _ in range(reads))
+    return ops
+
+
+# ============================================================
+# 送信先
+# ============================================================
+class TestClientTarget:
+    """プロセス内の Flask アプリ（スレッドごとにテストクライアントを持つ）"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def post(self, path, payload):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.post(path, json=payload)
+        return response.status_code
+
+
+class HttpTarget:
+    """起動済みのローカルサーバー"""
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+
+    def post(self, path, payload):
+        request = urllib.request.Request(
+            self.url + path,
+            data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=HTTP_TIMEOUT_SEC) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+# ============================================================
+# 実行
+# ============================================================
+def run(target, ops, concurrency, rate=None):
+    """ops を concurrency 本のスレッドで送る。rate（件/秒）を渡すと開始時刻を等間隔に割り当てる。
+
+    戻り値は送信順の (path, status, 所要秒, 予定からの遅れ秒)。通信エラーは status=None。
+    """
+    jobs = queue.Queue()
+    for index, op in enumerate(ops):
+        jobs.put((index, op))
+    results = [None] * len(ops)
+    started = time.perf_counter()
+
+    def worker():
+        while True:
+            try:
+                index, (path, payload) = jobs.get_nowait()
+            except queue.Empty:
+                return
+            due = started + index / rate if rate else time.perf_counter()
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            sent = time.perf_counter()
+            try:
+                status = target.post(path, payload)
+            except Exception:
+                status = None
+            results[index] = (path, status, time.perf_counter() - sent, max(0.0, sent - due))
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def summarize(results, elapsed):
+    """エンドポイント別の件数・エラー率・レイテンシ分位点"""
+    report = {"elapsed_s": elapsed, "requests": len(results),
+              "throughput_per_s": len(results) / elapsed if elapsed > 0 else None, "endpoints": {}}
+    by_path = collections.defaultdict(list)
+    for result in results:
+        by_path[result[0]].append(result)
+    for path, rows in sorted(by_path.items()):
+        latency = np.array([r[2] for r in rows])
+        lag = np.array([r[3] for r in rows])
+        statuses = collections.Counter(str(r[1]) for r in rows)
+        errors = sum(n for status, n in statuses.items() if status != "200")
+        entry = {
+            "count": len(rows),
+            "errors": errors,
+            "error_rate": errors / len(rows),
+            "statuses": dict(statuses),
+            "max_ms": 1000 * float(latency.max()),
+            "schedule_lag_p99_ms": 1000 * float(np.percentile(lag, 99)),
+        }
+        entry.update({f"p{p}_ms": 1000 * float(np.percentile(latency, p)) for p in PERCENTILES})
+        report["endpoints"][path] = entry
+    return report
+
+
+# ============================================================
+# イベントログの整合性
+# ============================================================
+def snapshot_logs(log_dir):
+    """user_events.csv の (user, item, action) 行の集計と、イベントストアの (user, item) 重み"""
+    from RelevanceCalculator import event_store as es
+
+    rows, malformed = collections.Counter(), 0
+    csv_path = os.path.join(log_dir, "user_events.csv")
+    if os.path.exists(csv_path):
+        with open(csv_path, "r", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                if len(row) != 6:
+                    malformed += 1
+                    continue
+                rows[(row[1], row[2], row[3])] += 1
+
+    weights = collections.defaultdict(float)
+    user, item, weight = es.EventStore(os.path.join(log_dir, "events")).load_triples()
+    for u, i, w in zip(user.tolist(), item.tolist(), weight.tolist()):
+        weights[(u, i)] += w
+    return rows, malformed, weights
+
+
+def wait_for_migration(target, log_dir, timeout=MIGRATION_WAIT_SEC):
+    """外部サーバーが user_events.csv をイベントストアへ移し終えるまで待つ。
+
+    移行前後で読み比べると整合性が崩れて見えるので、比較の前に済ませておく。
+    ストアはサーバーのものなので、ここでは移行せず、/recommend を1回送って
+    サーバー自身に移行させる（完了マーカーが現れるのを確認するだけ）。
+    """
+    from RelevanceCalculator import event_store as es
+
+    marker = os.path.join(log_dir, "events", es.MIGRATED_MARKER)
+    if not os.path.exists(os.path.join(log_dir, "user_events.csv")) or os.path.exists(marker):
+        return True
+    target.post("/recommend", {"user_id": 0, "keyword": ""})
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(marker):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.2)
+    return True
+
+
+def check_integrity(before, after, accepted, data):
+    """受理した /log_event が CSV に1行ずつ、イベントストアに重みとして過不足なく入ったか"""
+    from RelevanceCalculator import event_store as es
+
+    rows_before, _, weights_before = before
+    rows_after, malformed, weights_after = after
+
+    expected_rows = collections.Counter()
+    expected_weights = collections.defaultdict(float)
+    for payload in accepted:
+        item_id = data.item_id(payload["item_id"])
+        expected_rows[(str(payload["user_id"]), str(item_id), payload["action"])] += 1
+        # 重みの無い操作（unbookmark など）はイベントストアの集計に現れない
+        weight = float(es.ACTION_ID_WEIGHT[es.ACTION_IDS.get(payload["action"].lower(), 0)])
+        if weight > 0:
+            expected_weights[(int(payload["user_id"]), int(item_id))] += weight
+
+    new_rows = rows_after - rows_before
+    missing_rows = sum((expected_rows - new_rows).values())
+    extra_rows = sum((new_rows - expected_rows).values())
+
+    weight_mismatches = 0
+    for key in set(expected_weights) | set(weights_after):
+        delta = weights_after.get(key, 0.0) - weights_before.get(key, 0.0)
+        if abs(delta - expected_weights.get(key, 0.0)) > 1e-3:
+            weight_mismatches += 1
+
+    return {
+        "accepted_events": len(accepted),
+        "csv_new_rows": sum(new_rows.values()),
+        "csv_missing_rows": missing_rows,
+        "csv_unexpected_rows": extra_rows,
+        "csv_malformed_rows": malformed,
+        "store_weight_mismatches": weight_mismatches,
+        "ok": missing_rows == 0 and extra_rows == 0 and malformed == 0 and weight_mismatches == 0,
+    }
+
+
+# ============================================================
+# 表示
+# ============================================================
+def print_report(report):
+    print(f"\n=== {report['requests']} requests in {report['elapsed_s']:.2f}s "
+          f"({report['throughput_per_s']:.1f} req/s) ===")
+    print(f"{'endpoint':<12} | {'count':>6} | {'err %':>6} | {'p50 ms':>8} | {'p90 ms':>8} | "
+          f"{'p99 ms':>8} | {'max ms':>8} | {'lag p99':>8}")
+    for path, e in report["endpoints"].items():
+        print(f"{path:<12} | {e['count']:>6} | {100 * e['error_rate']:>6.2f} | {e['p50_ms']:>8.2f} | "
+              f"{e['p90_ms']:>8.2f} | {e['p99_ms']:>8.2f} | {e['max_ms']:>8.2f} | "
+              f"{e['schedule_lag_p99_ms']:>8.2f}")
+    integrity = report.get("integrity")
+    if integrity:
+        mark = "✅" if integrity["ok"] else "❌"
+        print(f"\n{mark} イベントログの整合性: " + " ".join(f"{k}={v}" for k, v in integrity.items() if k != "ok"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=None, help="起動済みサーバー（省略時はプロセス内のテストクライアント）")
+    parser.add_argument("--log-dir", default=None, help="--url のサーバーのログディレクトリ（整合性の確認用）")
+    parser.add_argument("--events-csv", default=EVENTS_CSV, help="再生するイベントログ")
+    parser.add_argument("--synthetic", type=int, default=0, help="再生の後ろに足す合成イベント数")
+    parser.add_argument("--synthetic-users", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=1, help="再生部分を繰り返す回数")
+    parser.add_argument("--reads-per-event", type=float, default=1.0,
+                        help="click / navigate 1件あたりの /recommend 数（小数は確率的に丸める）")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=None, help="送信レート（件/秒、省略時は上限なし）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="結果 JSON の保存先")
+    args = parser.parse_args()
+
+    # テストクライアントでは、アプリを読み込む前にログ類を一時ディレクトリへ向ける
+    workdir = None
+    log_dir = args.log_dir
+    if args.url is None:
+        workdir = tempfile.mkdtemp(prefix="load_test_")
+        log_dir = os.path.join(workdir, "logs")
+        os.makedirs(log_dir)
+        if os.path.exists(args.events_csv):
+            shutil.copy(args.events_csv, os.path.join(log_dir, "user_events.csv"))
+        os.environ["LEARNINGPATH_LOG_DIR"] = log_dir
+        os.environ["LEARNINGPATH_INDEX_DIR"] = os.path.join(workdir, "index")
+        os.environ["LEARNINGPATH_MODEL_DIR"] = os.path.join(workdir, "models")
+
+    from ContentManager.item_catalog import catalog
+
+    try:
+        data = catalog.data
+        events = load_replay_events(args.events_csv) * args.repeat
+        if args.synthetic:
+            events += make_synthetic_events(args.synthetic, data, args.synthetic_users, args.seed)
+        ops = build_workload(events, data, args.reads_per_event, args.seed)
+
+        if args.url is None:
+            from LearningPathManager.app import app, als_manager
+            from RelevanceCalculator import user_action as ua
+
+            ua.get_event_store()   # user_events.csv の移行を計測の前に済ませる
+            target = TestClientTarget(app)
+        else:
+            target = HttpTarget(args.url)
+            if log_dir and not wait_for_migration(target, log_dir):
+                print(f"❌ サーバーが {log_dir} のイベントストアへの移行を終えていません。"
+                      "--log-dir がサーバーの LEARNINGPATH_LOG_DIR と同じか確認してください")
+                sys.exit(2)
+
+        before = snapshot_logs(log_dir) if log_dir else None
+        print(f"🚀 {len(ops)} requests（イベント {len(events)} 件）を concurrency={args.concurrency} "
+              f"rate={args.rate or '上限なし'} で送信します")
+        results, elapsed = run(target, ops, args.concurrency, args.rate)
+
+        report = summarize(results, elapsed)
+        report["settings"] = {k: v for k, v in vars(args).items() if k != "out"}
+        if log_dir:
+            if args.url is None:
+                als_manager.stop()   # 再学習中の圧縮と読み比べが重ならないようにする
+                ua.flush_user_actions()
+            else:
+                time.sleep(SETTLE_SEC)
+            accepted = [payload for (path, payload), r in zip(ops, results)
+                        if path == "/log_event" and r[1] == 200]
+            report["integrity"] = check_integrity(before, snapshot_logs(log_dir), accepted, data)
+
+        print_report(report)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"💾 結果を保存しました: {args.out}")
+        if report.get("integrity") and not report["integrity"]["ok"]:
+            sys.exit(1)
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
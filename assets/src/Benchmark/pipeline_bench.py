@@ -0,0 +1,312 @@
+"""合成データで推薦パイプライン全体（BM25・ALS・/recommend）の規模別ベンチマーク。
+
+    python pipeline_bench.py [--scales 1k 10k] [--out bench.json] [--baseline old.json]
+    python pipeline_bench.py --items 50000 --events 2000000 --users 100000
+
+規模ごとに一時ディレクトリへ items.csv とイベントストアを生成し、
+環境変数（LEARNINGPATH_ITEMS_CSV など）でそこを指した子プロセスで計測する。
+子プロセスに分けるので、モジュールの状態もピークメモリも規模ごとに独立する。
+結果は JSON（段階ごとのスループット・p50/p99・ピーク RSS）で保存し、
+--baseline に前回の JSON を渡すと p50 / p99 / スループットの変化率を表示する。
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))  # ../assets/src/Benchmark
+SRC_DIR = os.path.dirname(APP_DIR)                    # ../assets/src
+ROOT_DIR = os.path.dirname(os.path.dirname(SRC_DIR))  # ../MyApp
+
+if SRC_DIR not in sys.path:
+    sys.path.append(SRC_DIR)
+
+from Benchmark import synthetic
+
+# ================================
+# 🔧 設定
+# ================================
+# 規模名 → (アイテム数, イベント数, ユーザー数)
+SCALES = {
+    "1k": {"items": 1_000, "events": 10_000, "users": 1_000},
+    "10k": {"items": 10_000, "events": 1_000_000, "users": 50_000},
+    "100k": {"items": 100_000, "events": 10_000_000, "users": 500_000},
+}
+DEFAULT_SCALES = ["1k", "10k"]
+
+QUERIES = 200        # BM25 の計測クエリ数
+ALS_USERS = 500      # ALS スコアの計測ユーザー数
+REQUESTS = 300       # /recommend の計測リクエスト数
+TOP_N = 50           # ALS の取得件数（/recommend の既定と同じ）
+SEED = 0
+
+
+# ============================================================
+# 計測ヘルパ
+# ============================================================
+def peak_rss_mb():
+    """このプロセスのピーク RSS（MB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(latencies):
+    """1回ごとの所要時間（秒）から件数・スループット・p50/p99 を求める"""
+    lat = np.asarray(latencies, dtype=float)
+    total = float(lat.sum())
+    return {
+        "count": int(len(lat)),
+        "total_s": total,
+        "throughput_per_s": len(lat) / total if total > 0 else None,
+        "mean_ms": 1000 * float(lat.mean()),
+        "p50_ms": 1000 * float(np.percentile(lat, 50)),
+        "p99_ms": 1000 * float(np.percentile(lat, 99)),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def measure(fn, args_list):
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+def measure_once(fn, *args):
+    """1回だけの処理（構築・学習）の所要時間とピーク RSS。戻り値も返す。"""
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    return result, {"total_s": elapsed, "peak_rss_mb": peak_rss_mb()}
+
+
+# ============================================================
+# データ生成
+# ============================================================
+def generate(workdir, items, events, users, seed=SEED):
+    """workdir に content/items.csv と logs/events（イベントストア）を作り、環境変数を返す"""
+    content_dir = os.path.join(workdir, "content")
+    log_dir = os.path.join(workdir, "logs")
+    os.makedirs(content_dir, exist_ok=True)
+    os.makedirs(log_dir, exist_ok=True)
+
+    items_csv = os.path.join(content_dir, "items.csv")
+    synthetic.write_items_csv(items_csv, synthetic.make_items(items, seed=seed))
+
+    from RelevanceCalculator import event_store as es
+
+    store = es.EventStore(os.path.join(log_dir, "events"))
+    ts, user, item, action = synthetic.make_events(events, users, items, seed=seed)
+    day_index = ts // 86_400_000
+    bounds = np.flatnonzero(np.diff(day_index)) + 1
+    for chunk in np.split(np.arange(len(ts)), bounds):
+        if len(chunk):
+            day = es._day_of(int(ts[chunk[0]]))
+            store.append(ts[chunk], user[chunk], item[chunk], action[chunk], day=day)
+
+    return {
+        "LEARNINGPATH_ITEMS_CSV": items_csv,
+        "LEARNINGPATH_LOG_DIR": log_dir,
+        "LEARNINGPATH_INDEX_DIR": os.path.join(workdir, "index"),
+        "LEARNINGPATH_MODEL_DIR": os.path.join(workdir, "models"),
+    }
+
+
+# ============================================================
+# 計測（子プロセス側: 環境変数で合成データを指した状態で import する）
+# ============================================================
+def run_scale(items, events, users, seed=SEED):
+    from ContentManager.item_catalog import catalog
+    from InteresrEstimator import related_content_finder as rcf
+    from RelevanceCalculator import user_action as ua
+    from RelevanceCalculator.candidate_table import CandidateTable
+
+    rng = np.random.default_rng(seed + 1)
+    stages = {}
+
+    # --- カタログ読み込みと BM25 インデックス構築（トークン化込み） ---
+    data, stages["catalog_load"] = measure_once(lambda: catalog.data)
+    _, stages["bm25_index_build"] = measure_once(rcf.get_bm25_index)
+
+    # --- get_bm25_scores: キャッシュ無し（毎回トークン化から）とキャッシュ有り ---
+    queries = [data.titles[pos] for pos in rng.choice(len(data), min(QUERIES, len(data)), replace=False)]
+
+    def cold_query(query):
+        rcf._score_cache.clear()
+        rcf._token_cache.clear()
+        rcf.get_bm25_scores(query)
+
+    stages["get_bm25_scores_cold"] = measure(cold_query, [(q,) for q in queries])
+    stages["get_bm25_scores_cached"] = measure(rcf.get_bm25_scores, [(q,) for q in queries])
+
+    # --- ALS: 学習行列の読み込みと学習 ---
+    matrix, stages["als_load_matrix"] = measure_once(ua.load_interaction_matrix)
+    (model, matrix), stages["train_als_model"] = measure_once(ua.train_als_model)
+
+    # --- get_als_scores（モデルで直接）と前計算の候補表 ---
+    active = np.flatnonzero(np.diff(matrix.indptr) > 0)
+    sample = rng.choice(active, min(ALS_USERS, len(active)), replace=False).tolist()
+    stages["get_als_scores"] = measure(
+        ua.get_als_scores, [(u, model, matrix, TOP_N) for u in sample]
+    )
+    table, stages["candidate_table_build"] = measure_once(CandidateTable.build, model, matrix)
+    stages["candidate_lookup"] = measure(table.lookup, [(u, TOP_N) for u in sample])
+    del table, model
+
+    # --- /recommend（テストクライアント経由。初回はモデル学習を含む） ---
+    from LearningPathManager.app import app, als_manager
+
+    client = app.test_client()
+    payloads = [
+        {"user_id": int(rng.choice(sample)), "keyword": queries[int(rng.integers(len(queries)))]}
+        for _ in range(REQUESTS)
+    ]
+
+    def post(payload):
+        response = client.post("/recommend", json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"/recommend が {response.status_code} を返しました")
+
+    _, stages["recommend_first"] = measure_once(post, payloads[0])
+    stages["recommend"] = measure(post, [(p,) for p in payloads])
+    als_manager.stop()
+
+    return {
+        "items": len(data),
+        "events": events,
+        "users": users,
+        "matrix_shape": list(matrix.shape),
+        "matrix_nnz": int(matrix.nnz),
+        "stages": stages,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+# ============================================================
+# 実行（親プロセス側）
+# ============================================================
+def bench_scale(name, items, events, users, keep=False):
+    workdir = tempfile.mkdtemp(prefix=f"pipeline_bench_{name}_")
+    try:
+        start = time.perf_counter()
+        env = dict(os.environ, **generate(workdir, items, events, users))
+        generated_s = time.perf_counter() - start
+        env["LOG_LEVEL"] = env.get("LOG_LEVEL", "WARNING")
+
+        command = [sys.executable, os.path.abspath(__file__), "--child",
+                   "--items", str(items), "--events", str(events), "--users", str(users)]
+        proc = subprocess.run(command, env=env, stdout=subprocess.PIPE, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"規模 {name} の計測に失敗しました（終了コード {proc.returncode}）")
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        result.update({"scale": name, "generate_s": generated_s})
+        return result
+    finally:
+        if keep:
+            print(f"📁 合成データを残しました: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_result(result):
+    print(f"\n=== {result['scale']}: items={result['items']} events={result['events']} "
+          f"users={result['users']} nnz={result['matrix_nnz']} peak={result['peak_rss_mb']:.0f}MB ===")
+    print(f"{'stage':<24} | {'total (s)':>9} | {'ops/s':>9} | {'p50 (ms)':>9} | {'p99 (ms)':>9} | {'peak MB':>7}")
+    for stage, s in result["stages"].items():
+        ops = f"{s['throughput_per_s']:>9.1f}" if s.get("throughput_per_s") else f"{'':>9}"
+        p50 = f"{s['p50_ms']:>9.3f}" if "p50_ms" in s else f"{'':>9}"
+        p99 = f"{s['p99_ms']:>9.3f}" if "p99_ms" in s else f"{'':>9}"
+        print(f"{stage:<24} | {s['total_s']:>9.3f} | {ops} | {p50} | {p99} | {s['peak_rss_mb']:>7.0f}")
+
+
+def compare(results, baseline_path):
+    """前回の JSON と同じ規模・段階の p50 / p99 / スループット / 所要時間の変化率を表示する"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {r["scale"]: r for r in json.load(f)["results"]}
+
+    print(f"\n=== 前回（{baseline_path}）との比較（+ は遅く / 少なくなった方向） ===")
+    for result in results:
+        old = baseline.get(result["scale"])
+        if old is None:
+            continue
+        for stage, s in result["stages"].items():
+            before = old["stages"].get(stage)
+            if before is None:
+                continue
+            changes = []
+            for key in ("p50_ms", "p99_ms", "total_s"):
+                if before.get(key) and key in s:
+                    changes.append(f"{key}={100 * (s[key] / before[key] - 1):+.1f}%")
+            if before.get("throughput_per_s") and s.get("throughput_per_s"):
+                changes.append(f"throughput={100 * (1 - s['throughput_per_s'] / before['throughput_per_s']):+.1f}%")
+            print(f"{result['scale']:>5} {stage:<24} " + " ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", nargs="+", default=DEFAULT_SCALES, choices=list(SCALES))
+    parser.add_argument("--items", type=int, help="規模を直接指定する（--events / --users と併用）")
+    parser.add_argument("--events", type=int)
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--out", default=None, help="結果 JSON の保存先（既定: bench_<日時>.json）")
+    parser.add_argument("--baseline", default=None, help="比較する前回の結果 JSON")
+    parser.add_argument("--keep-data", action="store_true", help="生成した合成データを消さない")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scale(args.items, args.events, args.users)))
+        return
+
+    if args.items:
+        events = args.events or args.items * 10
+        scales = {"custom": {"items": args.items, "events": events, "users": args.users or args.items}}
+    else:
+        scales = {name: SCALES[name] for name in args.scales}
+
+    results = []
+    for name, scale in scales.items():
+        print(f"⏱️ {name}: items={scale['items']} events={scale['events']} users={scale['users']}")
+        results.append(bench_scale(name, keep=args.keep_data, **scale))
+        print_result(results[-1])
+
+    report = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {"queries": QUERIES, "als_users": ALS_USERS, "requests": REQUESTS, "top_n": TOP_N},
+        "results": results,
+    }
+    out = args.out or f"bench_{datetime.datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 結果を保存しました: {out}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
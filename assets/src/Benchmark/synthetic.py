@@ -0,0 +1,123 @@
+import numpy as np
+
+# ================================
+# 🔧 合成データ生成の設定
+# ================================
+HIRAGANA = [chr(c) for c in range(0x3041, 0x3094)]
+KATAKANA = [chr(c) for c in range(0x30A1, 0x30F5)]
+KANJI = [chr(c) for c in range(0x4E00, 0x4E00 + 2000)]
+
+
+def make_vocab(size, seed=0):
+    """漢字・カタカナ・ひらがなを混ぜた日本語らしい語彙を作る"""
+    rng = np.random.default_rng(seed)
+    vocab, seen = [], set()
+    while len(vocab) < size:
+        kind = rng.random()
+        if kind < 0.6:      # 漢語（漢字2〜3文字）
+            word = "".join(rng.choice(KANJI, rng.integers(2, 4)))
+        elif kind < 0.85:   # 外来語（カタカナ3〜6文字）
+            word = "".join(rng.choice(KATAKANA, rng.integers(3, 7)))
+        else:               # 和語（ひらがな2〜4文字）
+            word = "".join(rng.choice(HIRAGANA, rng.integers(2, 5)))
+        if word not in seen:
+            seen.add(word)
+            vocab.append(word)
+    return vocab
+
+
+def make_token_corpus(n_docs, vocab_size=20000, mean_len=120, zipf_a=1.1, seed=0):
+    """語の出現頻度が Zipf 分布に従うトークン列コーパスを作る"""
+    rng = np.random.default_rng(seed)
+    vocab = np.array(make_vocab(vocab_size, seed), dtype=object)
+    lengths = np.clip(rng.poisson(mean_len, n_docs), 10, None)
+    ranks = rng.zipf(zipf_a, int(lengths.sum())) - 1
+    ranks = ranks % vocab_size
+    tokens = vocab[ranks]
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    return [tokens[bounds[i]:bounds[i + 1]].tolist() for i in range(n_docs)]
+
+
+def make_queries(corpus, n_queries=50, terms=(2, 6), seed=1):
+    """コーパス内の文書から語を抜き出してクエリを作る（記事タイトル相当）"""
+    rng = np.random.default_rng(seed)
+    queries = []
+    for d in rng.integers(0, len(corpus), n_queries):
+        doc = corpus[d]
+        k = min(len(doc), int(rng.integers(*terms)))
+        queries.append([doc[i] for i in rng.choice(len(doc), k, replace=False)])
+    return queries
+
+
+# ============================================================
+# アイテム本文（items.csv 相当）
+# ============================================================
+PARTICLES = ["の", "は", "が", "を", "に", "で", "と", "も"]
+CATEGORIES = ["技術", "健康", "歴史", "社会", "科学", "生活", "経済", "文化"]
+ITEMS_HEADER = ["item_id", "title", "body", "tags", "category"]
+
+
+def make_items(n_items, vocab_size=20000, mean_len=45, zipf_a=1.1, seed=0):
+    """助詞でつないだ語の文からなる items.csv 相当の行（dict）を作る。
+
+    本文は make_token_corpus と同じ Zipf 分布の語を6〜12語ごとに「。」で区切る。
+    タイトルは本文の語を2〜4個つないだもの（重複しないよう連番を付ける）。
+    """
+    rng = np.random.default_rng(seed)
+    corpus = make_token_corpus(n_items, vocab_size, mean_len, zipf_a, seed)
+    rows = []
+    for i, words in enumerate(corpus):
+        particles = rng.choice(PARTICLES, len(words))
+        ends = set(np.cumsum(rng.integers(6, 13, len(words))).tolist())
+        body = "".join(
+            word + ("。" if j + 1 in ends or j + 1 == len(words) else particle)
+            for j, (word, particle) in enumerate(zip(words, particles))
+        )
+        picked = rng.choice(len(words), min(len(words), int(rng.integers(2, 5))), replace=False)
+        title = "の".join(words[j] for j in picked) + f"{i + 1}"
+        tags = ";".join(dict.fromkeys(words[:10]))
+        rows.append({
+            "item_id": i + 1,
+            "title": title,
+            "body": body,
+            "tags": tags,
+            "category": CATEGORIES[int(rng.integers(len(CATEGORIES)))],
+        })
+    return rows
+
+
+def write_items_csv(path, rows):
+    """make_items の行を items.csv と同じ形式（BOM 付き UTF-8）で書く"""
+    import csv
+
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=ITEMS_HEADER)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+# ============================================================
+# ユーザーイベント（イベントストア相当）
+# ============================================================
+ACTION_PROBS = {1: 0.7, 3: 0.2, 2: 0.1}   # action_id → 割合（click / navigate / bookmark）
+
+
+def make_events(n_events, n_users, n_items, user_a=1.3, item_a=1.2, days=30, seed=0):
+    """ユーザーの活動量とアイテムの人気がべき分布に従うイベント列を作る。
+
+    戻り値は (ts[ms], user_id, item_id, action_id) の配列（時刻順）。
+    user_id は 1..n_users、item_id は 1..n_items（0 は使わない）。
+    人気順位は乱数で並べ替えるので、人気アイテムが id の小さい側に偏らない。
+    """
+    rng = np.random.default_rng(seed)
+    user_rank = (rng.zipf(user_a, n_events) - 1) % n_users
+    item_rank = (rng.zipf(item_a, n_events) - 1) % n_items
+    users = (rng.permutation(n_users)[user_rank] + 1).astype(np.int32)
+    items = (rng.permutation(n_items)[item_rank] + 1).astype(np.int32)
+
+    action_ids = np.array(list(ACTION_PROBS), dtype=np.int8)
+    actions = rng.choice(action_ids, n_events, p=list(ACTION_PROBS.values()))
+
+    end_ms = 1_700_000_000_000
+    ts = np.sort(rng.integers(end_ms - days * 86_400_000, end_ms, n_events, dtype=np.int64))
+    return ts, users, items, actions
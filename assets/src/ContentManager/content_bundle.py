@@ -0,0 +1,240 @@
+"""学習パス記事（LearningPath*/Path*-*.txt と PathTitle.txt）を1つにまとめたコンテンツバンドル。
+
+    python content_bundle.py        # assets/content/bundle/ にバンドルを書き出す
+
+バンドルは全パス・全記事と「パス → 記事」の索引を持つ JSON で、gzip 版も並べて保存する
+（/content/bundle はこの gzip をそのまま返す）。version とパスごとの etag は内容の sha256 で、
+バンドルには作成時刻などを入れないので、中身が同じなら何度作ってもバイト列まで同じになる。
+/content/* はこの値を ETag に使い、クライアントは変わったものだけを取り直せる。
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))  # ../assets/src/ContentManager
+SRC_DIR = os.path.dirname(APP_DIR)                    # ../assets/src
+ASSETS_DIR = os.path.dirname(SRC_DIR)                 # ../assets
+
+if SRC_DIR not in sys.path:
+    sys.path.append(SRC_DIR)
+
+from Monitoring.log import get_logger
+
+log = get_logger("content")
+
+# ================================
+# 🔧 設定
+# ================================
+CONTENT_DIR = os.path.join(ASSETS_DIR, "content")
+BUNDLE_DIR = os.path.join(CONTENT_DIR, "bundle")
+BUNDLE_FILE = "content_bundle.json"
+FORMAT_VERSION = 1          # バンドルの形式を変えたら上げる
+CHECK_INTERVAL_SEC = 1.0    # バンドルファイルの mtime を確認する最短間隔
+
+PATH_DIR_RE = re.compile(r"^LearningPath(\d+)$")
+ARTICLE_RE = re.compile(r"^Path\d+-(\d+)\.txt$")
+PATH_TITLE_FILE = "PathTitle.txt"
+
+# 配信用の本文（gzip 済みも持つ）と ETag
+Payload = namedtuple("Payload", ["body", "gzipped", "etag"])
+
+
+def parse_key_value(text):
+    """「key: value」形式の行を辞書にする（キーは小文字。Flutter の parseKeyValue と同じ）"""
+    result = {}
+    for line in text.split("\n"):
+        key, sep, value = line.partition(":")
+        if sep:
+            result[key.strip().lower()] = value.strip()
+    return result
+
+
+def _digest(obj):
+    return hashlib.sha256(_dumps(obj)).hexdigest()
+
+
+def _dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+# ============================================================
+# コンパイル
+# ============================================================
+def compile_bundle(content_dir=CONTENT_DIR):
+    """LearningPath* フォルダを読み、バンドル（dict）を作る。
+
+    paths[i]    : {"path", "title", "type", "articles": [記事キー...], "etag"}（パス番号順）
+    articles[k] : {"title", "main", "keywords"}（k は "LearningPath1/Path1-1.txt" 形式）
+    """
+    folders = []
+    for name in os.listdir(content_dir):
+        match = PATH_DIR_RE.match(name)
+        if match and os.path.isdir(os.path.join(content_dir, name)):
+            folders.append((int(match.group(1)), name))
+
+    paths, articles = [], {}
+    for number, folder in sorted(folders):
+        folder_dir = os.path.join(content_dir, folder)
+        header = {}
+        title_path = os.path.join(folder_dir, PATH_TITLE_FILE)
+        if os.path.exists(title_path):
+            with open(title_path, "r", encoding="utf-8") as f:
+                header = parse_key_value(f.read())
+
+        steps = []
+        for filename in os.listdir(folder_dir):
+            match = ARTICLE_RE.match(filename)
+            if match:
+                steps.append((int(match.group(1)), filename))
+
+        keys = []
+        for _, filename in sorted(steps):
+            with open(os.path.join(folder_dir, filename), "r", encoding="utf-8") as f:
+                fields = parse_key_value(f.read())
+            key = f"{folder}/{filename}"
+            articles[key] = {
+                "title": fields.get("title", ""),
+                "main": fields.get("main", ""),
+                "keywords": [k.strip() for k in fields.get("keyword", "").split(",") if k.strip()],
+            }
+            keys.append(key)
+
+        entry = {
+            "path": number,
+            "title": header.get("title", folder),
+            "type": header.get("type", ""),
+            "articles": keys,
+        }
+        entry["etag"] = _digest([entry, [articles[k] for k in keys]])[:16]
+        paths.append(entry)
+
+    body = {"format": FORMAT_VERSION, "paths": paths, "articles": articles}
+    return {"version": _digest(body)[:16], **body}
+
+
+def write_bundle(bundle, out_dir=BUNDLE_DIR):
+    """バンドルを JSON と gzip で書き出し、JSON のパスを返す（読み手は常に完全なファイルを見る）"""
+    os.makedirs(out_dir, exist_ok=True)
+    target = os.path.join(out_dir, BUNDLE_FILE)
+    raw = _dumps(bundle)
+    for path, data in ((target + ".gz", gzip.compress(raw, mtime=0)), (target, raw)):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return target
+
+
+# ============================================================
+# 配信用に読み込んだバンドル
+# ============================================================
+def _payload(obj, etag, body=None, gzipped=None):
+    body = _dumps(obj) if body is None else body
+    return Payload(body, gzip.compress(body, mtime=0) if gzipped is None else gzipped, f'"{etag}"')
+
+
+class LoadedBundle:
+    """バンドル1版分の配信用データ（全体・索引・パスごとの本文と gzip を前計算しておく）
+
+    raw / gzipped にバンドルファイルのバイト列を渡すと、全体はそれをそのまま配信する。
+    """
+
+    def __init__(self, bundle, mtime=None, raw=None, gzipped=None):
+        self.bundle = bundle
+        self.mtime = mtime
+        self.version = bundle["version"]
+        self.full = _payload(bundle, self.version, raw, gzipped)
+
+        # 索引: パスごとの etag と記事キーだけ（クライアントは etag が変わったパスだけ取り直す）
+        self.index = _payload({"version": self.version, "paths": bundle["paths"]}, self.version)
+
+        articles = bundle["articles"]
+        self.paths = {
+            entry["path"]: _payload(
+                {**entry, "articles": [{"key": key, **articles[key]} for key in entry["articles"]]},
+                entry["etag"],
+            )
+            for entry in bundle["paths"]
+        }
+
+
+class ContentBundleStore:
+    """バンドルファイルを読み込んで保持し、mtime が変われば読み直す。
+
+    ファイルが無ければソースの TXT からコンパイルして書き出す。
+    """
+
+    def __init__(self, bundle_dir=BUNDLE_DIR, content_dir=CONTENT_DIR, check_interval=CHECK_INTERVAL_SEC):
+        self.path = os.path.join(bundle_dir, BUNDLE_FILE)
+        self.bundle_dir = bundle_dir
+        self.content_dir = content_dir
+        self.check_interval = check_interval
+        self._loaded = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        """最新の LoadedBundle を返す（必要なら読み直す）"""
+        now = time.monotonic()
+        if self._loaded is None or now - self._checked_at >= self.check_interval:
+            self.refresh()
+        return self._loaded
+
+    def refresh(self, force=False):
+        """バンドルファイルの mtime が変わっていれば読み直す。読み直したら True。"""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                if self._loaded is not None and not force:
+                    return False
+                log.info("📦 コンテンツバンドルが無いので作成します", path=self.path)
+                write_bundle(compile_bundle(self.content_dir), self.bundle_dir)
+                mtime = os.stat(self.path).st_mtime_ns
+
+            if not force and self._loaded is not None and self._loaded.mtime == mtime:
+                return False
+            with open(self.path, "rb") as f:
+                raw = f.read()
+            bundle = json.loads(raw)
+            if bundle.get("format") != FORMAT_VERSION:
+                log.warning("⚠️ バンドルの形式が古いので作り直します", format=bundle.get("format"))
+                bundle = compile_bundle(self.content_dir)
+                write_bundle(bundle, self.bundle_dir)
+                mtime = os.stat(self.path).st_mtime_ns
+                raw = _dumps(bundle)
+            self._loaded = LoadedBundle(bundle, mtime, raw, self._read_gzipped(raw))
+            return True
+
+    def _read_gzipped(self, raw):
+        """書き出し済みの gzip を読む（無い・JSON と中身が違うなら None で圧縮し直させる）"""
+        try:
+            with open(self.path + ".gz", "rb") as f:
+                gzipped = f.read()
+            if gzip.decompress(gzipped) == raw:
+                return gzipped
+        except (OSError, EOFError, zlib.error) as e:
+            log.warning("⚠️ バンドルの gzip を読めません", path=self.path + ".gz", error=e)
+            return None
+        log.warning("⚠️ バンドルの gzip が JSON と一致しないので圧縮し直します", path=self.path + ".gz")
+        return None
+
+
+# プロセス内で共有するバンドル
+content_bundle = ContentBundleStore()
+
+
+if __name__ == "__main__":
+    bundle = compile_bundle()
+    path = write_bundle(bundle)
+    print(f"📦 コンテンツバンドルを作成しました: {path} "
+          f"(version={bundle['version']}, paths={len(bundle['paths'])}, articles={len(bundle['articles'])})")
@@ -0,0 +1,207 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from Monitoring.log import get_logger
+
+log = get_logger("catalog")
+
+# ================================
+# 🔧 設定
+# ================================
+APP_DIR = os.path.dirname(os.path.abspath(__file__))  # ../assets/src/ContentManager
+SRC_DIR = os.path.dirname(APP_DIR)                    # ../assets/src
+ASSETS_DIR = os.path.dirname(SRC_DIR)                 # ../assets
+
+CONTENT_DIR = os.path.join(ASSETS_DIR, "content")
+# ベンチマーク・負荷試験では環境変数で別の items.csv を指せる
+ITEMS_CSV = os.environ.get("LEARNINGPATH_ITEMS_CSV", os.path.join(CONTENT_DIR, "items.csv"))
+CHANGES_JSON = os.path.join(os.path.dirname(ITEMS_CSV), "items_changes.json")   # make_path.py が書く差分
+
+CHECK_INTERVAL_SEC = 1.0   # items.csv の mtime を確認する最短間隔
+
+
+# ============================================================
+# 読み込み済みカタログ（差し替え単位なので読み取り専用で扱う）
+# ============================================================
+class CatalogData:
+    """items.csv 1回分の内容と索引。
+
+    item_ids / titles / bodies / categories は items.csv の行順に並ぶ。
+    pos_by_id[item_id] はその行位置（存在しなければ -1）。
+    """
+
+    def __init__(self, rows, mtime=None, version=0, checksum=None):
+        self.mtime = mtime
+        self.version = version
+        self.checksum = checksum   # items.csv の sha256（インデックスのスナップショット照合用）
+
+        self.item_ids = np.array([r[0] for r in rows], dtype=np.int64)
+        self.titles = [r[1] for r in rows]
+        self.bodies = [r[2] for r in rows]
+        self.tags = [r[3] for r in rows]
+        self.categories = [r[4] for r in rows]
+
+        size = int(self.item_ids.max()) + 1 if len(rows) else 0
+        self.pos_by_id = np.full(size, -1, dtype=np.int64)
+        self.pos_by_id[self.item_ids] = np.arange(len(rows))
+
+        # 重複タイトルは先に出た行を優先する
+        self.title_to_id = {}
+        self._title_positions = {}
+        for pos, (item_id, title) in enumerate(zip(self.item_ids.tolist(), self.titles)):
+            self.title_to_id.setdefault(title, item_id)
+            self._title_positions.setdefault(title, []).append(pos)
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    def position(self, item_id):
+        try:
+            item_id = int(item_id)
+        except (TypeError, ValueError):
+            return -1
+        if 0 <= item_id < len(self.pos_by_id):
+            return int(self.pos_by_id[item_id])
+        return -1
+
+    def positions(self, item_ids):
+        """item_id 配列 → 行位置配列（範囲外・未登録は -1）"""
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        valid = (item_ids >= 0) & (item_ids < len(self.pos_by_id))
+        out = np.full(len(item_ids), -1, dtype=np.int64)
+        out[valid] = self.pos_by_id[item_ids[valid]]
+        return out
+
+    def title_positions(self, title):
+        """同じタイトルを持つすべての行位置"""
+        if title is None:
+            return []
+        return self._title_positions.get(str(title).strip(), [])
+
+    def title(self, item_id):
+        pos = self.position(item_id)
+        return (self.titles[pos] or None) if pos >= 0 else None
+
+    def category(self, item_id):
+        pos = self.position(item_id)
+        return (self.categories[pos] or None) if pos >= 0 else None
+
+    def item_id(self, title):
+        if title is None:
+            return None
+        return self.title_to_id.get(str(title).strip())
+
+
+def parse_items_csv(text):
+    """items.csv の内容を (item_id, title, body, tags, category) の行リストにする"""
+    rows = []
+    for row in csv.DictReader(io.StringIO(text, newline="")):
+        try:
+            item_id = int(row["item_id"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        rows.append((
+            item_id,
+            (row.get("title") or "").strip(),
+            row.get("body") or "",
+            row.get("tags") or "",
+            (row.get("category") or "").strip(),
+        ))
+    return rows
+
+
+def read_items_csv(path):
+    """items.csv を読み、(行リスト, sha256) を返す"""
+    with open(path, "rb") as f:
+        raw = f.read()
+    return parse_items_csv(raw.decode("utf-8-sig")), hashlib.sha256(raw).hexdigest()
+
+
+def load_change_set(base_checksum, checksum, path=CHANGES_JSON):
+    """base_checksum → checksum の items.csv 差分を返す。
+
+    make_path.py が最後のビルドで書いた差分がこの2版の間のものなら
+    {"added", "modified", "removed"}（item_id の集合）を、そうでなければ None を返す。
+    """
+    if not base_checksum or not checksum:
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            changes = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if changes.get("base_checksum") != base_checksum or changes.get("checksum") != checksum:
+        return None
+    return {key: set(changes.get(key, [])) for key in ("added", "modified", "removed")}
+
+
+# ============================================================
+# 共有アイテムカタログ
+# ============================================================
+class ItemCatalog:
+    """items.csv をメモリに保持し、mtime が変わったときだけ読み直す。
+
+    id→title / title→id / id→category を O(1) で引ける。
+    読み直しは CatalogData ごと差し替えるので、data を一度受け取れば
+    リクエスト中は一貫した内容を参照できる。version は読み直しのたびに増える。
+    """
+
+    def __init__(self, path=ITEMS_CSV, check_interval=CHECK_INTERVAL_SEC):
+        self.path = path
+        self.check_interval = check_interval
+        self._data = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def data(self):
+        """最新の CatalogData を返す（必要なら読み直す）"""
+        now = time.monotonic()
+        if self._data is None or now - self._checked_at >= self.check_interval:
+            self.refresh()
+        return self._data
+
+    @property
+    def version(self):
+        return self.data.version
+
+    def refresh(self, force=False):
+        """items.csv の mtime が変わっていれば読み直す。読み直したら True。"""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                if self._data is None:
+                    log.warning("⚠️ items.csv が存在しません。カタログは空です。", path=self.path)
+                    self._data = CatalogData([], None, 1)
+                return False
+
+            if not force and self._data is not None and self._data.mtime == mtime:
+                return False
+
+            version = self._data.version + 1 if self._data is not None else 1
+            rows, checksum = read_items_csv(self.path)
+            self._data = CatalogData(rows, mtime, version, checksum)
+            return True
+
+    # ---------- よく使う参照の近道 ----------
+    def title(self, item_id):
+        return self.data.title(item_id)
+
+    def item_id(self, title):
+        return self.data.item_id(title)
+
+    def category(self, item_id):
+        return self.data.category(item_id)
+
+
+# プロセス内で共有するカタログ
+catalog = ItemCatalog()
@@ -0,0 +1,136 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# ================================
+# 🔧 BM25 パラメータ（rank_bm25.BM25Okapi と同じ既定値）
+# ================================
+K1 = 1.5
+B = 0.75
+EPSILON = 0.25
+
+# 正規化モード
+NORMALIZE_MINMAX = "minmax"   # Min-Max（全件同点なら 0）
+NORMALIZE_MAX = "max"         # 最大値で割る（最大値が 0 以下なら 0）
+NORMALIZE_NONE = "none"       # 生スコア
+
+
+def normalize(scores, mode=NORMALIZE_MINMAX):
+    """スコアを正規化する。ゼロ除算は起こさない。"""
+    if mode == NORMALIZE_NONE or len(scores) == 0:
+        return scores
+    if mode == NORMALIZE_MAX:
+        top = np.max(scores)
+        return scores / top if top > 0 else np.zeros_like(scores)
+    if mode == NORMALIZE_MINMAX:
+        low, high = np.min(scores), np.max(scores)
+        return (scores - low) / (high - low) if high > low else np.zeros_like(scores)
+    raise ValueError(f"未知の正規化モード: {mode}")
+
+
+# ============================================================
+# 疎行列 BM25 インデックス
+# ============================================================
+class SparseBM25:
+    """BM25Okapi の重みを (語 × 文書) の疎行列に前計算したインデックス。
+
+    weights[t, d] = idf(t) * tf(t,d) * (k1 + 1) / (tf(t,d) + k1 * (1 - b + b * |d| / avgdl))
+
+    クエリのスコアは、クエリに現れる語の行を足し合わせるだけで求まる
+    （文書数ぶんの Python ループをしない）。idf の下限処理は rank_bm25 と同じ。
+    """
+
+    def __init__(self, vocab, weights, doc_len, idf, k1=K1, b=B):
+        self.vocab = vocab          # 語 → 行番号
+        self.weights = weights      # csr_matrix (語数 × 文書数)
+        self.doc_len = doc_len
+        self.idf = idf
+        self.k1 = k1
+        self.b = b
+
+    @property
+    def corpus_size(self):
+        return self.weights.shape[1]
+
+    # ---------- 構築 ----------
+    @classmethod
+    def build(cls, corpus, k1=K1, b=B, epsilon=EPSILON):
+        """トークン列のリストからインデックスを作る"""
+        vocab = {}
+        term_ids, doc_ids = [], []
+        doc_len = np.zeros(len(corpus), dtype=np.float64)
+        for d, tokens in enumerate(corpus):
+            doc_len[d] = len(tokens)
+            for token in tokens:
+                term_ids.append(vocab.setdefault(token, len(vocab)))
+            doc_ids.extend([d] * len(tokens))
+
+        n_docs, n_terms = len(corpus), len(vocab)
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+
+        # 語ごとの出現回数 tf（重複は csr 化で合算される）
+        tf = csr_matrix(
+            (np.ones(len(term_ids), dtype=np.float64), (term_ids, doc_ids)),
+            shape=(n_terms, n_docs),
+        )
+        tf.sum_duplicates()
+
+        # idf（rank_bm25 と同じく負の idf は epsilon * 平均idf に置き換える）
+        df = np.diff(tf.indptr).astype(np.float64)
+        idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+        if n_terms:
+            idf[idf < 0] = epsilon * idf.mean()
+
+        avgdl = doc_len.mean() if n_docs else 0.0
+        norm = k1 * (1 - b + b * doc_len / avgdl) if avgdl > 0 else np.full(n_docs, k1)
+        data = tf.data * (k1 + 1) / (tf.data + norm[tf.indices])
+        data *= np.repeat(idf, np.diff(tf.indptr))
+
+        weights = csr_matrix((data, tf.indices, tf.indptr), shape=(n_terms, n_docs))
+        return cls(vocab, weights, doc_len, idf, k1=k1, b=b)
+
+    # ---------- 検索 ----------
+    def query_vector(self, query_tokens):
+        """クエリを (語の行番号, 出現回数) に変換する。未知語は無視。"""
+        ids = [self.vocab[t] for t in query_tokens if t in self.vocab]
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        term_ids, counts = np.unique(ids, return_counts=True)
+        return term_ids, counts.astype(np.float64)
+
+    def get_scores(self, query_tokens):
+        """全文書の BM25 生スコア（rank_bm25.BM25Okapi.get_scores と同値）"""
+        term_ids, counts = self.query_vector(query_tokens)
+        if len(term_ids) == 0:
+            return np.zeros(self.corpus_size)
+
+        indptr, indices, data = self.weights.indptr, self.weights.indices, self.weights.data
+        starts, ends = indptr[term_ids], indptr[term_ids + 1]
+        lengths = ends - starts
+        rows = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+        return np.bincount(
+            indices[rows],
+            weights=data[rows] * np.repeat(counts, lengths),
+            minlength=self.corpus_size,
+        )
+
+    def get_scores_batch(self, queries):
+        """複数クエリの BM25 生スコアを (クエリ数 × 文書数) の行列で返す。
+
+        クエリを (クエリ × 語) の疎行列にまとめ、重み行列との積1回で全件を求める。
+        各行は get_scores(query) と同値。
+        """
+        rows, cols, counts = [], [], []
+        for q, query_tokens in enumerate(queries):
+            term_ids, term_counts = self.query_vector(query_tokens)
+            rows.extend([q] * len(term_ids))
+            cols.extend(term_ids.tolist())
+            counts.extend(term_counts.tolist())
+        query_matrix = csr_matrix(
+            (np.asarray(counts, dtype=np.float64), (rows, cols)),
+            shape=(len(queries), len(self.vocab)),
+        )
+        return np.asarray((query_matrix @ self.weights).todense())
+
+    def get_normalized_scores(self, query_tokens, mode=NORMALIZE_MINMAX):
+        return normalize(self.get_scores(query_tokens), mode)
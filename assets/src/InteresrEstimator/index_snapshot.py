@@ -0,0 +1,239 @@
+"""BM25 インデックスのスナップショット（ディスク保存と mmap 読み込み）。
+
+    python index_snapshot.py        # 現在の items.csv からスナップショットを作る
+
+スナップショットは items.csv の sha256・トークナイザー（バックエンド・辞書・
+トークン化方針の署名）・形式バージョンごとに別ディレクトリへ保存し、起動時は配列を
+mmap で開くだけにする。items.csv もトークン化方針も変わっていなければ、
+トークン化もインデックス構築もしない。
+"""
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))  # ../assets/src/InteresrEstimator
+SRC_DIR = os.path.dirname(APP_DIR)                    # ../assets/src
+ASSETS_DIR = os.path.dirname(SRC_DIR)                 # ../assets
+
+if SRC_DIR not in sys.path:
+    sys.path.append(SRC_DIR)
+
+from InteresrEstimator.bm25_index import SparseBM25
+from ContentManager.item_catalog import load_change_set
+from Monitoring import metrics
+from Monitoring.log import get_logger
+
+log = get_logger("index")
+
+# ================================
+# 🔧 設定
+# ================================
+INDEX_DIR = os.environ.get("LEARNINGPATH_INDEX_DIR", os.path.join(ASSETS_DIR, "index"))
+FORMAT_VERSION = 1      # 保存形式を変えたら上げる（古いスナップショットは使わない）
+KEEP_SNAPSHOTS = 3      # 残しておく古いスナップショットの数
+
+ARRAYS = ("weights_data", "weights_indices", "weights_indptr", "idf", "doc_len",
+          "tokens", "token_offsets")
+
+
+def snapshot_name(checksum, tokenizer):
+    return (f"bm25-v{FORMAT_VERSION}-{tokenizer.name}-{tokenizer.dictionary}"
+            f"-{tokenizer.search_signature()[:8]}-{checksum[:16]}")
+
+
+# ============================================================
+# 保存
+# ============================================================
+def save_snapshot(index, tokenized, checksum, tokenizer, root=INDEX_DIR):
+    """インデックスとトークン化済みコーパスを保存し、保存先を返す"""
+    name = snapshot_name(checksum, tokenizer)
+    target = os.path.join(root, name)
+    tmp = os.path.join(root, f".{name}.{os.getpid()}.tmp")
+    os.makedirs(tmp, exist_ok=True)
+
+    # トークン化済みコーパスは (語ID の平坦な列, 文書ごとの開始位置) で持つ
+    lengths = np.array([len(doc) for doc in tokenized], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    tokens = np.array(
+        [index.vocab[token] for doc in tokenized for token in doc], dtype=np.int32
+    )
+
+    arrays = {
+        "weights_data": index.weights.data,
+        "weights_indices": index.weights.indices,
+        "weights_indptr": index.weights.indptr,
+        "idf": index.idf,
+        "doc_len": index.doc_len,
+        "tokens": tokens,
+        "token_offsets": offsets,
+    }
+    for key, array in arrays.items():
+        np.save(os.path.join(tmp, f"{key}.npy"), np.ascontiguousarray(array))
+
+    terms = [None] * len(index.vocab)
+    for term, row in index.vocab.items():
+        terms[row] = term
+    with open(os.path.join(tmp, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(terms, f, ensure_ascii=False)
+
+    meta = {
+        "format": FORMAT_VERSION,
+        "items_sha256": checksum,
+        "tokenizer": tokenizer.name,
+        "dictionary": tokenizer.dictionary,
+        "tokenizer_signature": tokenizer.search_signature(),
+        "k1": index.k1,
+        "b": index.b,
+        "n_docs": int(index.corpus_size),
+        "n_terms": len(terms),
+        "created_at": time.time(),
+    }
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    # ディレクトリごと差し替える（読み手が書きかけを見ないように）
+    if os.path.exists(target):
+        shutil.rmtree(tmp)
+    else:
+        os.replace(tmp, target)
+    _prune(root, keep=name)
+    return target
+
+
+def _prune(root, keep):
+    snapshots = sorted(
+        (os.path.getmtime(os.path.join(root, n)), n)
+        for n in os.listdir(root)
+        if n.startswith("bm25-") and n != keep
+    )
+    for _, name in snapshots[:max(0, len(snapshots) - (KEEP_SNAPSHOTS - 1))]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+# ============================================================
+# 読み込み
+# ============================================================
+def load_snapshot(checksum, tokenizer, root=INDEX_DIR):
+    """一致するスナップショットを mmap で開き (SparseBM25, tokenized) を返す。無ければ None。
+
+    items.csv かトークン化方針（辞書・正規化・除外語など）が違うものは使わない。
+    """
+    path = os.path.join(root, snapshot_name(checksum, tokenizer))
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        return None
+    try:
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        expected = {
+            "format": FORMAT_VERSION,
+            "items_sha256": checksum,
+            "tokenizer": tokenizer.name,
+            "dictionary": tokenizer.dictionary,
+            "tokenizer_signature": tokenizer.search_signature(),
+        }
+        mismatched = [key for key, value in expected.items() if meta.get(key) != value]
+        if mismatched:
+            log.warning("⚠️ インデックスのスナップショットがトークン化方針と合わないので作り直します",
+                        path=path, mismatched=mismatched)
+            return None
+        arrays = {key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode="r") for key in ARRAYS}
+        with open(os.path.join(path, "vocab.json"), "r", encoding="utf-8") as f:
+            terms = json.load(f)
+    except (OSError, ValueError) as e:
+        log.warning("⚠️ インデックスのスナップショットを読み込めません", path=path, error=e)
+        return None
+
+    vocab = {term: row for row, term in enumerate(terms)}
+    weights = csr_matrix(
+        (arrays["weights_data"], arrays["weights_indices"], arrays["weights_indptr"]),
+        shape=(meta["n_terms"], meta["n_docs"]),
+        copy=False,
+    )
+    index = SparseBM25(vocab, weights, arrays["doc_len"], arrays["idf"], k1=meta["k1"], b=meta["b"])
+    tokenized = MappedCorpus(arrays["tokens"], arrays["token_offsets"], terms)
+    return index, tokenized
+
+
+class MappedCorpus:
+    """mmap したトークン化済みコーパス。corpus[i] で i 番目の文書のトークン列を返す。"""
+
+    def __init__(self, tokens, offsets, terms):
+        self.tokens = tokens
+        self.offsets = offsets
+        self.terms = terms
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        ids = self.tokens[self.offsets[i]:self.offsets[i + 1]]
+        return [self.terms[t] for t in ids.tolist()]
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+# ============================================================
+# 読み込み or 構築
+# ============================================================
+def tokenize_incremental(data, tokenizer, previous=None):
+    """コーパスをトークン化する。
+
+    previous=(前回の CatalogData, そのトークン化済みコーパス) が渡され、
+    items_changes.json がその版からの差分なら、変わっていない item_id の
+    トークン列は使い回し、追加・変更された本文だけをトークン化する。
+    """
+    if previous is not None:
+        prev_data, prev_tokenized = previous
+        changes = load_change_set(prev_data.checksum, data.checksum)
+        if changes is not None and prev_tokenized is not None:
+            dirty = changes["added"] | changes["modified"]
+            prev_pos = prev_data.positions(data.item_ids)
+            todo = [
+                pos for pos, (item_id, old) in enumerate(zip(data.item_ids.tolist(), prev_pos.tolist()))
+                if old < 0 or item_id in dirty
+            ]
+            fresh = dict(zip(todo, tokenizer.tokenize_many([data.bodies[pos] for pos in todo])))
+            tokenized = [
+                fresh[pos] if pos in fresh else prev_tokenized[old]
+                for pos, old in enumerate(prev_pos.tolist())
+            ]
+            log.info("♻️ 差分トークン化", tokenized=len(todo), total=len(data))
+            return tokenized
+    return tokenizer.tokenize_many(data.bodies)
+
+
+def load_or_build(data, tokenizer, root=INDEX_DIR, previous=None):
+    """items.csv の checksum が一致すれば mmap で読み込み、違えば構築して保存する"""
+    if data.checksum:
+        loaded = load_snapshot(data.checksum, tokenizer, root)
+        if loaded is not None and loaded[0].corpus_size == len(data):
+            return loaded
+
+    with metrics.stage("index_build"):
+        tokenized = tokenize_incremental(data, tokenizer, previous)
+        index = SparseBM25.build(tokenized)
+    if data.checksum:
+        try:
+            save_snapshot(index, tokenized, data.checksum, tokenizer, root)
+        except OSError as e:
+            log.warning("⚠️ インデックスのスナップショットを保存できません", error=e)
+    return index, tokenized
+
+
+if __name__ == "__main__":
+    from ContentManager.item_catalog import catalog
+    from InteresrEstimator.tokenizer import get_tokenizer
+
+    data = catalog.data
+    t = get_tokenizer()
+    start = time.perf_counter()
+    tokenized = t.tokenize_many(data.bodies)
+    index = SparseBM25.build(tokenized)
+    path = save_snapshot(index, tokenized, data.checksum, t)
+    print(f"✅ {len(data)} 件のインデックスを {path} に保存しました ({time.perf_counter() - start:.2f}s)")
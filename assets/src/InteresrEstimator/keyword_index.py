@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# ================================
+# 🔧 設定
+# ================================
+CHECK_INTERVAL_SEC = 1.0   # コンテンツファイルの更新を確認する最短間隔
+GRAPH_WEIGHT = 0.1         # グラフ近接スコアの重み
+
+
+def read_keyword_line(path):
+    """ファイルの最初の keyword: 行をリストで返す（無ければ None）"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("keyword:"):
+                return line[len("keyword:"):].strip().split(", ")
+    return None
+
+
+def scan_files(folder):
+    """folder 以下の .txt を (path, mtime_ns, size) で列挙する（os.walk 順）"""
+    files = []
+    for root, _, names in os.walk(folder):
+        for name in names:
+            if name.endswith(".txt"):
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                files.append((path, st.st_mtime_ns, st.st_size))
+    return files
+
+
+# ============================================================
+# キーワード転置インデックス＋共起行列
+# ============================================================
+class KeywordIndex:
+    """keyword: 行をまとめた (文書 × キーワード) 行列と (キーワード × キーワード) 共起行列。
+
+    doc_kw[d, k]  : 文書 d の keyword: 行に k が出現する回数
+    adjacency[a,b]: a と b が同じ文書に載っていれば 1（同一文書で重複した語は自己ループ）
+    """
+
+    def __init__(self, paths, vocab, doc_kw, adjacency, signature=None):
+        self.paths = paths
+        self.vocab = vocab
+        self.doc_kw = doc_kw.tocsr()
+        self.doc_kw_csc = doc_kw.tocsc()
+        self.doc_sets = (self.doc_kw > 0).astype(np.float64).tocsr()
+        self.doc_sizes = np.asarray(self.doc_sets.sum(axis=1)).ravel()
+        self.adjacency = adjacency.tocsr()
+        self.signature = signature
+        # 同点の並びは元の実装（(score, path) の降順ソート）に合わせる
+        self.path_rank = np.argsort(np.argsort(np.array(paths, dtype=object), kind="stable"))
+
+    @classmethod
+    def build(cls, folder):
+        files = scan_files(folder)
+        paths, rows, cols, vocab = [], [], [], {}
+        self_loops = set()
+        for path, _, _ in files:
+            keywords = read_keyword_line(path)
+            if keywords is None:
+                continue
+            d = len(paths)
+            paths.append(path)
+            seen = set()
+            for kw in keywords:
+                k = vocab.setdefault(kw, len(vocab))
+                rows.append(d)
+                cols.append(k)
+                if k in seen:
+                    self_loops.add(k)
+                seen.add(k)
+
+        n_docs, n_kws = len(paths), len(vocab)
+        doc_kw = csr_matrix(
+            (np.ones(len(rows)), (rows, cols)), shape=(n_docs, n_kws)
+        )
+        doc_kw.sum_duplicates()
+
+        # 共起 = 同じ文書に載っている語の組（自己ループは重複した語だけ）
+        binary = (doc_kw > 0).astype(np.float64)
+        adjacency = (binary.T @ binary).tolil()
+        adjacency.setdiag(0)
+        for k in self_loops:
+            adjacency[k, k] = 1
+        adjacency = (adjacency.tocsr() > 0).astype(np.float64)
+
+        return cls(paths, vocab, doc_kw, adjacency, signature=tuple(files))
+
+    # ---------- スコア計算 ----------
+    def scores(self, input_keywords):
+        """候補文書の (文書番号配列, スコア配列) を返す。候補外の文書は 0 点。"""
+        n_kws = len(self.vocab)
+        known = [self.vocab[kw] for kw in input_keywords if kw in self.vocab]
+        if not known:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        # クエリベクトル（グラフ点は重複も数えるので回数、Jaccard は集合）
+        q_counts = np.bincount(known, minlength=n_kws).astype(np.float64)
+        q_set = (q_counts > 0).astype(np.float64)
+        neighbours = self.adjacency @ q_counts
+
+        # 入力語か、その隣接語を含む文書だけが候補
+        touched = np.flatnonzero((q_set > 0) | (neighbours > 0))
+        candidates = np.unique(self.doc_kw_csc[:, touched].indices)
+        if len(candidates) == 0:
+            return candidates, np.empty(0)
+
+        sets = self.doc_sets[candidates]
+        intersection = sets @ q_set
+        union = len(set(input_keywords)) + self.doc_sizes[candidates] - intersection
+        jaccard = np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+        graph_score = self.doc_kw[candidates] @ neighbours
+        return candidates, jaccard + GRAPH_WEIGHT * graph_score
+
+    def top(self, input_keywords, top_n=3):
+        """スコア上位の (score, path) を返す"""
+        candidates, scores = self.scores(input_keywords)
+        total = np.zeros(len(self.paths))
+        total[candidates] = scores
+        # スコア降順、同点はパス降順
+        order = np.lexsort((-self.path_rank, -total))[:top_n]
+        return [(float(total[d]), self.paths[d]) for d in order]
+
+
+# ============================================================
+# 更新を検知して作り直す共有インデックス
+# ============================================================
+class KeywordIndexCache:
+    """folder ごとの KeywordIndex を保持し、ファイルが変わったら作り直す"""
+
+    def __init__(self, check_interval=CHECK_INTERVAL_SEC):
+        self.check_interval = check_interval
+        self._indexes = {}   # folder → (KeywordIndex, checked_at)
+        self._lock = threading.Lock()
+
+    def get(self, folder):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._indexes.get(folder)
+            if entry is not None and now - entry[1] < self.check_interval:
+                return entry[0]
+            index = entry[0] if entry is not None else None
+            if index is None or index.signature != tuple(scan_files(folder)):
+                index = KeywordIndex.build(folder)
+            self._indexes[folder] = (index, now)
+            return index
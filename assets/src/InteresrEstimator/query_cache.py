@@ -0,0 +1,130 @@
+import multiprocessing
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+_MISSING = object()
+
+# generation を数えるスロット数（group はハッシュでスロットに割り当てる）
+GENERATION_SLOTS = 4096
+
+
+# ============================================================
+# LRU + TTL キャッシュ
+# ============================================================
+class LRUCache:
+    """件数上限つきの LRU キャッシュ。ttl 秒を過ぎたエントリは無効。
+
+    ヒット・ミス・追い出し数を数えるので、stats() を見て maxsize を決められる。
+    put(key, value, group=...) で入れたエントリは invalidate(group) でまとめて消せる。
+    group ごとの generation() は invalidate のたびに増えるので、キーに含めておけば
+    無効化と並行して計算された古い結果が後から入っても引かれない。
+
+    generation は group のハッシュで固定数のスロットに数えるので、group がいくら増えても
+    大きくならない（同じスロットの group は巻き添えで一度外れるだけで、古い結果は返さない）。
+    shared=True なら fork 前に共有メモリに確保し、prefork の全ワーカーで generation を共有する。
+    そのとき他のワーカーでの invalidate も generation 経由で効く（エントリ自体は LRU・TTL で消える）。
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, generation_slots=GENERATION_SLOTS, shared=False):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key → (値, 期限, group)
+        self._groups = {}               # group → そのグループのキー集合
+        self._generations = (multiprocessing.Array("q", generation_slots, lock=False) if shared
+                             else [0] * generation_slots)   # スロット → 無効化した回数
+        self._shared_lock = multiprocessing.Lock() if shared else None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, group=None):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, group)
+            if group is not None:
+                self._groups.setdefault(group, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, _, group = self._entries.pop(key)
+        if group is not None:
+            keys = self._groups[group]
+            keys.discard(key)
+            if not keys:
+                del self._groups[group]
+
+    def invalidate(self, group):
+        """group のエントリをすべて消し、その generation を進める。消した件数を返す。"""
+        slot = self._slot(group)
+        with self._lock:
+            if self._shared_lock is not None:
+                with self._shared_lock:
+                    self._generations[slot] += 1
+            else:
+                self._generations[slot] += 1
+            keys = self._groups.pop(group, ())
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def generation(self, group):
+        return self._generations[self._slot(group)]
+
+    def _slot(self, group):
+        # hash() は文字列だとプロセスごとに変わるので、ワーカー間で揃う crc32 を使う
+        return zlib.crc32(repr(group).encode("utf-8")) % len(self._generations)
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -1,9 +1,9 @@
 import os
+import sys
+import threading
 import networkx as nx
+import numpy as np
 
-from rank_bm25 import BM25Okapi
-from janome.tokenizer import Tokenizer
-import numpy as np, pandas as pd
 
 APP_DIR = os.path.dirname(os.path.abspath(__file__))  # ../assets/src/LearningPathManager
 SRC_DIR = os.path.dirname(APP_DIR)                    # ../assets/src
@@ -14,10 +14,58 @@ CONTENT_DIR = os.path.join(ASSETS_DIR, "content")
 ITEMS_CSV = os.path.join(CONTENT_DIR, "items.csv")
 EXTRA_CONTENTS_DIR = os.path.join(CONTENT_DIR, "ExtraContents")
 
-docs = pd.read_csv(ITEMS_CSV)
-t = Tokenizer()
-tokenized = [[token.surface for token in t.tokenize(text)] for text in docs['body']]
-bm25 = BM25Okapi(tokenized)
+if SRC_DIR not in sys.path:
+    sys.path.append(SRC_DIR)
+
+from ContentManager.item_catalog import catalog
+from Monitoring import metrics
+from Monitoring.log import get_logger
+from InteresrEstimator import index_snapshot
+from InteresrEstimator.bm25_index import normalize, NORMALIZE_MINMAX
+from InteresrEstimator.keyword_index import KeywordIndexCache
+from InteresrEstimator.query_cache import LRUCache
+from InteresrEstimator.tokenizer import get_tokenizer
+
+log = get_logger("search")
+
+BM25_NORMALIZE = NORMALIZE_MINMAX   # スコア正規化モード（minmax / max / none）
+
+# クエリ結果キャッシュ（Flutter は記事タイトルをそのまま keyword に送るので同じクエリが多い）
+TOKEN_CACHE_SIZE = 4096
+SCORE_CACHE_SIZE = 1024
+SCORE_CACHE_TTL_SEC = 600
+
+_token_cache = LRUCache(TOKEN_CACHE_SIZE)                         # query → トークン列
+_score_cache = LRUCache(SCORE_CACHE_SIZE, SCORE_CACHE_TTL_SEC)    # query → 正規化済みスコア
+
+TOKENIZER_BACKEND = "auto"   # mecab / janome / auto（使える中で最速）
+
+t = get_tokenizer(TOKENIZER_BACKEND)
+
+# BM25 インデックス（カタログの version が変わったら読み込み直す）
+_bm25_index = None       # (catalog_data, SparseBM25)
+_bm25_tokenized = None   # インデックスを作ったトークン化済みコーパス
+_bm25_lock = threading.Lock()
+
+def get_bm25_index():
+    """現在のカタログに対応する (CatalogData, SparseBM25) を返す
+
+    items.csv の checksum が同じスナップショットがあれば mmap で開くだけで済む。
+    """
+    global _bm25_index, _bm25_tokenized
+    data = catalog.data
+    if _bm25_index is None or _bm25_index[0] is not data:
+        with _bm25_lock:
+            if _bm25_index is None or _bm25_index[0] is not data:
+                # 前回のトークン列を渡し、items.csv の差分だけトークン化し直す
+                previous = (_bm25_index[0], _bm25_tokenized) if _bm25_index is not None else None
+                index, _bm25_tokenized = index_snapshot.load_or_build(data, t, previous=previous)
+                _bm25_index = (data, index)
+                # コーパスが変わったのでスコアのキャッシュは無効
+                _score_cache.clear()
+    return _bm25_index
+
+_keyword_indexes = KeywordIndexCache()
 
 def build_keyword_graph(folder=EXTRA_CONTENTS_DIR):
     G = nx.Graph()
@@ -41,57 +89,81 @@ def build_keyword_graph(folder=EXTRA_CONTENTS_DIR):
     return G
 
 def estimate_relevance_graph(input_keywords, folder=EXTRA_CONTENTS_DIR, top_n=3):
-    G = build_keyword_graph(folder)
-    relevance_scores = []
-
-    for root, _, files in os.walk(folder):
-        for file in files:
-            if file.endswith(".txt"):
-                path = os.path.join(root, file)
-                with open(path, "r", encoding="utf-8") as f:
-                    lines = f.readlines()
-
-                for line in lines:
-                    if line.startswith("keyword:"):
-                        file_keywords = line[len("keyword:"):].strip().split(", ")
-                        union = set(input_keywords) | set(file_keywords)
-                        intersection = set(input_keywords) & set(file_keywords)
-
-                        # 類似度スコア（Jaccard係数）
-                        score = len(intersection) / len(union) if union else 0
-
-                        # グラフ上の接続も加味（近接ノード数）
-                        graph_score = sum(1 for kw in input_keywords for fk in file_keywords if G.has_edge(kw, fk))
-                        total_score = score + 0.1 * graph_score  # 重み調整
-
-                        relevance_scores.append((total_score, path))
-                        break
-    relevance_scores.sort(reverse=True)
-    print("relevance_scores:", relevance_scores[:10])  # デバッグ用に上位10件を表示
+    # keyword: 行は転置インデックス＋共起行列として一度だけ読み込む（ファイル更新時は作り直す）
+    index = _keyword_indexes.get(folder)
+    relevance_scores = index.top(input_keywords, top_n=max(top_n, 10))
+    log.debug("relevance_scores", top10=relevance_scores[:10])  # デバッグ用に上位10件
     return [path for score, path in relevance_scores[:top_n]]
 
+def tokenize_query(query):
+    """クエリのトークン列（キャッシュあり）"""
+    return _token_cache.get_or_compute(query, lambda: _tokenize_timed(query))
+
+def _tokenize_timed(query):
+    with metrics.stage("tokenize"):
+        return tuple(t.tokenize(query))
+
+def get_bm25_score_array(query):
+    """(CatalogData, カタログ行順の正規化済みスコア配列) を返す
+
+    結果はキャッシュで共有するので、返した配列は書き換え不可にしてある。
+    """
+    data, bm25 = get_bm25_index()
+    cached = _score_cache.get(query)
+    if cached is not None and cached[0] is data:
+        return cached
+
+    # 正規化（全件同点でもゼロ除算しない）
+    tokens = tokenize_query(query)
+    with metrics.stage("bm25"):
+        norm = normalize(bm25.get_scores(tokens), BM25_NORMALIZE)
+    norm.flags.writeable = False
+    _score_cache.put(query, (data, norm))
+    return data, norm
+
+def get_bm25_score_arrays(queries):
+    """(CatalogData, (クエリ数 × カタログ行数) の正規化済みスコア行列) を返す
+
+    重複したクエリは1回だけ計算し、キャッシュに無いクエリは BM25 を1パスでまとめて求める。
+    各行は get_bm25_score_array(query) と同じ値。
+    """
+    data, bm25 = get_bm25_index()
+    unique = list(dict.fromkeys(queries))
+    rows = {}
+    missing = []
+    for query in unique:
+        cached = _score_cache.get(query)
+        if cached is not None and cached[0] is data:
+            rows[query] = cached[1]
+        else:
+            missing.append(query)
+
+    if missing:
+        tokens = [tokenize_query(query) for query in missing]
+        with metrics.stage("bm25_batch"):
+            raw = bm25.get_scores_batch(tokens)
+            for query, scores in zip(missing, raw):
+                norm = normalize(scores, BM25_NORMALIZE)
+                norm.flags.writeable = False
+                _score_cache.put(query, (data, norm))
+                rows[query] = norm
+
+    matrix = np.empty((len(queries), len(data)), dtype=np.float64)
+    for i, query in enumerate(queries):
+        matrix[i] = rows[query]
+    return data, matrix
+
+def get_cache_stats():
+    """クエリキャッシュのヒット・ミス数など（トークナイザーの処理量も含む）"""
+    return {"tokens": _token_cache.stats(), "scores": _score_cache.stats(), "tokenizer": t.stats()}
+
 def get_bm25_scores(query):
-    q = [token.surface for token in t.tokenize(query)]
-    scores = bm25.get_scores(q)
-    # Min-Max 正規化
-    norm = (scores - np.min(scores)) / (np.max(scores) - np.min(scores))
-    return dict(zip(docs['item_id'], norm))
+    data, norm = get_bm25_score_array(query)
+    return dict(zip(data.item_ids.tolist(), norm))
 
 def get_item_title(item_id):
-    # item_id が文字列の場合は数値変換を試みる
-    try:
-        key = int(item_id)
-    except Exception:
-        try:
-            key = int(str(item_id))
-        except Exception:
-            key = item_id
-
-    matched = docs[docs['item_id'] == key]
-    if matched.empty:
-        return None
-    title = matched['title'].values[0]
-    return title if title else None
+    # カタログの索引から O(1) で引く（文字列の item_id も可）
+    return catalog.title(item_id)
 
 if __name__ == "__main__":
     # input_keywords = ["生成", "登場", "教育", "あり方", "家庭", "教師", "生徒", "一人ひとり", "理解", "興味"]
@@ -0,0 +1,212 @@
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+
+from Monitoring.log import get_logger
+
+log = get_logger("tokenizer")
+
+# ================================
+# 🔧 共通の正規化・ストップワード方針
+# ================================
+# ストップワード（助詞・接続詞など）
+STOPWORDS = frozenset([
+    "こと", "もの", "それ", "これ", "ため", "よう", "など", "に", "の", "が", "を", "と", "は", "も", "で", "から", "まで", "より",
+    "そして", "しかし", "また", "さらに", "です", "ます", "する", "ある", "いる", "なる", "できる", "思う", "考える"
+])
+
+# 検索トークンから落とす品詞（記号・助詞・助動詞。IPADIC / UniDic の両方）
+SKIP_POS = ("記号", "補助記号", "空白", "助詞", "助動詞", "BOS/EOS")
+
+# キーワード抽出で残す品詞と、その中で落とす細分類（数: IPADIC / 数詞: UniDic）
+KEYWORD_POS = ("名詞",)
+KEYWORD_SKIP_DETAIL = ("数", "数詞")
+
+# 検索用の正規化（全角英数の半角化と英字の小文字化）
+NORMALIZE_FORM = "NFKC"
+NORMALIZE_LOWER = True
+
+MECAB_ARGS = ""   # 辞書は環境の既定（IPADIC / UniDic どちらでも可）
+MECAB_UNK_NODE = 1  # MeCab の node.stat: 未知語
+
+
+def normalize_text(text):
+    """全角英数の半角化（NFKC）と英字の小文字化"""
+    text = unicodedata.normalize(NORMALIZE_FORM, text or "")
+    return text.lower() if NORMALIZE_LOWER else text
+
+
+# ============================================================
+# トークナイザー共通インターフェース
+# ============================================================
+class BaseTokenizer:
+    """検索用トークン化とキーワード抽出を同じ方針で行う。
+
+    サブクラスは _analyze(text) で (表層形, 原形, 品詞, 品詞細分類1, 辞書にある語か) を返すだけでよい。
+    tokenize_many() は処理量を記録するので、stats() でスループットを確認できる。
+    """
+
+    name = "base"
+    dictionary = "unknown"   # 形態素解析辞書（"ipadic" / "unidic"）。分かち書きと原形が辞書で変わる
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self.docs = 0
+        self.chars = 0
+        self.seconds = 0.0
+
+    def _analyze(self, text):
+        raise NotImplementedError
+
+    def tokenize(self, text):
+        """検索用トークン（正規化済みの原形。記号とストップワードは除く）"""
+        tokens = []
+        for surface, base, pos, _, _ in self._analyze(normalize_text(text)):
+            if pos in SKIP_POS or base in STOPWORDS or not base.strip():
+                continue
+            tokens.append(base)
+        return tokens
+
+    def tokenize_many(self, texts):
+        """複数文書をまとめてトークン化する"""
+        start = time.perf_counter()
+        result = [self.tokenize(text) for text in texts]
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self.docs += len(result)
+            self.chars += sum(len(text or "") for text in texts)
+            self.seconds += elapsed
+        return result
+
+    def keywords(self, text, top_n=10):
+        """名詞の原形を出現順に重複なく返す（数・未知語・ストップワード・1文字語は除く）
+
+        keyword: 行は人が読む値なので、検索用と違い大文字小文字・全角半角は元の表記のまま。
+        未知語（原形が辞書に無い語）を除くのは元の -Ochasen 抽出と同じ結果にするため。
+        """
+        keywords = []
+        for surface, base, pos, detail, known in self._analyze(text or ""):
+            if (pos in KEYWORD_POS and known and detail not in KEYWORD_SKIP_DETAIL
+                    and base not in STOPWORDS and len(base) > 1):
+                keywords.append(base)
+        return list(dict.fromkeys(keywords))[:top_n]
+
+    def search_signature(self):
+        """検索用トークン化の方針（バックエンド・辞書・正規化・除外語・除外品詞）の署名。
+
+        これが変わると同じ本文でもトークン列が変わるので、保存済みのインデックスは使えない。
+        """
+        policy = json.dumps([self.name, self.dictionary, NORMALIZE_FORM, NORMALIZE_LOWER,
+                             sorted(STOPWORDS), SKIP_POS], ensure_ascii=False)
+        return hashlib.sha256(policy.encode("utf-8")).hexdigest()[:16]
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "dictionary": self.dictionary,
+            "docs": self.docs,
+            "chars": self.chars,
+            "seconds": self.seconds,
+            "docs_per_sec": self.docs / self.seconds if self.seconds else 0.0,
+            "chars_per_sec": self.chars / self.seconds if self.seconds else 0.0,
+        }
+
+
+# ============================================================
+# MeCab バックエンド（C実装で高速）
+# ============================================================
+class MeCabTokenizer(BaseTokenizer):
+    name = "mecab"
+
+    def __init__(self, args=MECAB_ARGS):
+        import MeCab  # 未インストールなら ImportError
+
+        super().__init__()
+        self._mecab = MeCab
+        self._args = args
+        self._local = threading.local()   # Tagger はスレッドごとに持つ
+        self._tagger()
+        # UniDic は素性が20項目以上、IPADIC は9項目
+        features = self._tagger().parseToNode("辞書").next.feature.split(",")
+        self.dictionary = "unidic" if len(features) > 20 else "ipadic"
+
+    def _tagger(self):
+        tagger = getattr(self._local, "tagger", None)
+        if tagger is None:
+            tagger = self._mecab.Tagger(self._args)
+            tagger.parse("")  # バグ回避
+            self._local.tagger = tagger
+        return tagger
+
+    def _analyze(self, text):
+        node = self._tagger().parseToNode(text)
+        result = []
+        while node:
+            surface = node.surface
+            features = node.feature.split(",")
+            pos = features[0]
+            detail = features[1] if len(features) > 1 else "*"
+            # 原形: UniDic は書字形基本形(10)、IPADIC は原形(6)
+            index = 10 if len(features) > 20 else 6
+            base = features[index] if len(features) > index and features[index] != "*" else surface
+            result.append((surface, base or surface, pos, detail, node.stat != MECAB_UNK_NODE))
+            node = node.next
+        return result
+
+
+# ============================================================
+# Janome バックエンド（純Python。MeCab が無い環境用）
+# ============================================================
+class JanomeTokenizer(BaseTokenizer):
+    name = "janome"
+    dictionary = "ipadic"   # Janome は mecab-ipadic を内蔵している
+
+    def __init__(self):
+        from janome.tokenizer import Tokenizer
+
+        super().__init__()
+        self._tokenizer = Tokenizer()
+
+    def _analyze(self, text):
+        result = []
+        for token in self._tokenizer.tokenize(text):
+            pos, detail = (token.part_of_speech.split(",") + ["*"])[:2]
+            base = token.base_form if token.base_form != "*" else token.surface
+            result.append((token.surface, base, pos, detail, token.node_type != "UNKNOWN"))
+        return result
+
+
+BACKENDS = {
+    "mecab": MeCabTokenizer,
+    "janome": JanomeTokenizer,
+}
+PREFERRED_ORDER = ("mecab", "janome")
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_tokenizer(backend="auto", dictionary=None):
+    """トークナイザーを返す。auto なら使える中で最速のものを選ぶ。
+
+    dictionary（"ipadic" など）を指定すると、その辞書を使うバックエンドだけから選ぶ。
+    """
+    names = PREFERRED_ORDER if backend == "auto" else (backend,)
+    with _instances_lock:
+        for name in names:
+            if name not in _instances:
+                try:
+                    _instances[name] = BACKENDS[name]()
+                except (ImportError, RuntimeError) as e:
+                    if backend != "auto":
+                        raise
+                    log.warning("⚠️ トークナイザーが使えません", backend=name, error=e)
+                    continue
+            if dictionary is None or _instances[name].dictionary == dictionary:
+                return _instances[name]
+    raise RuntimeError(
+        "利用できるトークナイザーがありません（MeCab か Janome をインストールしてください）"
+        + (f": 辞書 {dictionary}" if dictionary else "")
+    )
@@ -1,7 +1,9 @@
+import logging
 import os
 import sys
+import time
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 
 APP_DIR = os.path.dirname(os.path.abspath(__file__))  # ../assets/src/LearningPathManager
 SRC_DIR = os.path.dirname(APP_DIR)                    # ../assets/src
@@ -16,75 +18,194 @@ if SRC_DIR not in sys.path:
 
 #　関連モジュールのインポート
 from RelevanceCalculator import user_action as ua
+from RelevanceCalculator import model_manager as mm
 from InteresrEstimator import related_content_finder as rcf
+from InteresrEstimator.query_cache import LRUCache
+from LearningPathManager import score_fusion as fusion
+from ContentManager.item_catalog import catalog
+from ContentManager.content_bundle import content_bundle
+from Monitoring import metrics
+from Monitoring.log import get_logger
+
+log = get_logger("app")
 
 app = Flask(__name__)
 
+# リクエスト単位の計測値
+REQUESTS = metrics.counter("http_requests_total", "エンドポイント・ステータス別のリクエスト数", ("endpoint", "status"))
+REQUEST_SECONDS = metrics.histogram("http_request_seconds", "エンドポイント別の応答時間（秒）", ("endpoint",))
+EVENTS = metrics.counter("events_logged_total", "受け付けたユーザーイベント数（未知の action は other）", ("action",))
+CACHE_EVENTS = metrics.counter("query_cache_events_total", "クエリ・応答キャッシュの累計（hits / misses など）", ("cache", "kind"))
+CACHE_HIT_RATIO = metrics.gauge("query_cache_hit_ratio", "クエリ・応答キャッシュのヒット率", ("cache",))
+
+# prefork 配信（gunicorn.conf.py）では ALS モデルを全ワーカーで共有する
+SHARED_MODEL = os.environ.get("ALS_SHARED_MODEL") == "1"
+
+# /recommend の応答キャッシュ（記事画面を行き来すると同じ問い合わせが繰り返される）
+# キーはモデル・カタログの版とユーザーの generation を含むので、/log_event で
+# そのユーザーのエントリを消せば、新しい行動を反映した結果だけが返る。
+# prefork 配信では generation を全ワーカーで共有し、どのワーカーが受けた /log_event でも外れる
+RECOMMEND_CACHE_SIZE = 4096
+RECOMMEND_CACHE_TTL_SEC = 600
+_recommend_cache = LRUCache(RECOMMEND_CACHE_SIZE, RECOMMEND_CACHE_TTL_SEC, shared=SHARED_MODEL)
+
+# /log_events が1リクエストで受け付けるイベント数の上限
+MAX_BATCH_EVENTS = 500
+
+# ALSモデルはプロセス内で保持し、バックグラウンドで再学習する
+als_manager = mm.ALSModelManager(shared=SHARED_MODEL)
+
+# 検索インデックスは起動時にスナップショットから読み込む（無ければ構築して保存）
+rcf.get_bm25_index()
+
+@app.before_request
+def _start_timer():
+    g.started_at = time.perf_counter()
+
+@app.after_request
+def _record_request(response):
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    if "started_at" in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.started_at, endpoint=endpoint)
+    REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    return response
+
 @app.route('/recommend', methods=['POST'])
 def recommend():
     data = request.get_json()
     user_id = int(data.get('user_id', 0))
-    keyword = data.get('keyword', '')
-    print(f"📩 受信: user_id={user_id}, keyword='{keyword}'")
-
-    # ===== 固定パラメータ =====
-    w1 = 0.7      # BM25重み
-    w2 = 0.3      # ALS重み
-    top_n = 3     # 最終出力数
-    # ==========================
-
-    # --- BM25 スコア取得 ---
-    bm25_scores = rcf.get_bm25_scores(keyword)
-    # print(f"📘 BM25スコア取得完了 ({len(bm25_scores)} 件)")
-
-    # --- BM25上位10件を表示 ---
-    bm25_top = sorted(bm25_scores.items(), key=lambda x: x[1], reverse=True)[:10]
-    print("🔹 BM25 上位10件:")
-    for i, (item_id, score) in enumerate(bm25_top, 1):
-        title = rcf.get_item_title(item_id)
-        print(f"   {i:2d}. ID={item_id:>3} | BM25={score:.4f} | {title}")
-
-    # --- ALS スコア取得 ---
-    model, matrix = ua.train_als_model()
-    als_scores = ua.get_als_scores(user_id, model, matrix, top_n=50)
-    als_scores_dict = dict(als_scores) if als_scores else {}
-    # print(f"🎯 ALSスコア取得完了 ({len(als_scores_dict)} 件)")
-
-    # --- ALS上位10件を表示 ---
-    als_top = sorted(als_scores_dict.items(), key=lambda x: x[1], reverse=True)[:10]
-    print("🔸 ALS 上位10件:")
-    for i, (item_id, score) in enumerate(als_top, 1):
-        title = rcf.get_item_title(item_id)
-        print(f"   {i:2d}. ID={item_id:>3} | ALS={score:.6f} | {title}")
-
-    # --- スコア統合 ---
-    all_items = set(bm25_scores.keys()) | set(als_scores_dict.keys())
-    hybrid_scores = {}
-    for item_id in all_items:
-        bm25_val = bm25_scores.get(item_id, 0)
-        als_val = als_scores_dict.get(item_id, 0)
-        hybrid_scores[item_id] = w1 * bm25_val + w2 * als_val 
-
-    # --- 上位 n 件を選出（keywordと完全一致するタイトルは除外） ---
-    filtered_items = [
-        (item_id, score)
-        for item_id, score in sorted(hybrid_scores.items(), key=lambda x: x[1], reverse=True)
-        if rcf.get_item_title(item_id) != keyword
-    ]
-
-    top_items = filtered_items[:top_n]
-    print("🔝 ハイブリッド推薦結果:")
-    for i, (item_id, score) in enumerate(top_items, 1):
-        title = rcf.get_item_title(item_id)
-        print(f"   {i:2d}. ID={item_id:>3} | Hybrid={score:.6f} | {title}")
-
-    # --- item_id のみ返す ---
-    return jsonify([str(i) for i, _ in top_items])
+    keyword = fusion.normalize_keyword(data.get('keyword', ''))
+    log.debug("📩 受信", user_id=user_id, keyword=keyword)
+
+    # ===== パラメータ（w1: BM25重み, w2: ALS重み, top_n: 最終出力数） =====
+    try:
+        w1, w2, top_n = fusion.parse_params(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    # --- 応答キャッシュ（同じ版のモデル・カタログで同じ問い合わせなら再計算しない） ---
+    snapshot = als_manager.get()
+    catalog_version = catalog.version
+    key = (user_id, keyword, w1, w2, top_n, snapshot.version, catalog_version,
+           _recommend_cache.generation(user_id))
+    cached = _recommend_cache.get(key)
+    if cached is not None:
+        return _recommend_response(cached, snapshot.version, "hit")
+
+    # --- BM25 スコア取得（カタログ行順の配列。リクエスト中はこの items を参照） ---
+    items, bm25_scores = rcf.get_bm25_score_array(keyword)
+
+    # --- BM25上位10件（DEBUG のときだけ組み立てる） ---
+    debug = log.isEnabledFor(logging.DEBUG)
+    if debug:
+        top10 = fusion.top_k(bm25_scores, 10)
+        log.debug("🔹 BM25 上位10件", results=[
+            (int(items.item_ids[pos]), round(float(bm25_scores[pos]), 4), items.titles[pos]) for pos in top10
+        ])
+
+    # --- ALS スコア取得（キャッシュ済みモデルを使用） ---
+    als_scores = als_manager.get_als_scores(user_id, snapshot, top_n=50)
+    als_array = fusion.als_scores_to_array(als_scores, items)
+
+    # --- ALS上位10件 ---
+    if debug:
+        log.debug("🔸 ALS 上位10件", results=[
+            (int(item_id), round(float(score), 6), items.title(item_id)) for item_id, score in als_scores[:10]
+        ])
+
+    # --- スコア統合 → 上位 n 件を選出（keywordと完全一致するタイトルは除外） ---
+    top, top_scores = fusion.recommend_positions(
+        bm25_scores, als_array, items, keyword, w1=w1, w2=w2, top_n=top_n
+    )
+    top_ids = items.item_ids[top].tolist()
+
+    if debug:
+        log.debug("🔝 ハイブリッド推薦結果", results=[
+            (int(items.item_ids[pos]), round(float(score), 6), items.titles[pos]) for pos, score in zip(top, top_scores)
+        ])
+
+    result = [str(i) for i in top_ids]
+    # 計算中にカタログが読み直されていたら、キーの版と結果が食い違うので入れない
+    if items.version == catalog_version:
+        _recommend_cache.put(key, result, group=user_id)
+    return _recommend_response(result, snapshot.version, "miss")
+
+def _recommend_response(result, model_version, cache_status):
+    """item_id のみ返す（応答元のモデル版とキャッシュの当否はヘッダーで返す）"""
+    response = jsonify(result)
+    response.headers["X-Model-Version"] = str(model_version)
+    response.headers["X-Cache"] = cache_status
+    return response
+
+@app.route('/recommend_batch', methods=['POST'])
+def recommend_batch():
+    """(user_id, keyword) の組をまとめて推薦する（/recommend と同じ統合方法）"""
+    data = request.get_json() or {}
+    try:
+        w1, w2, top_n = fusion.parse_params(data)
+        pairs = fusion.parse_batch(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    log.debug("📩 バッチ受信", pairs=len(pairs))
+
+    # --- BM25: 全キーワードを1パスで（行 i が pairs[i] に対応） ---
+    keywords = [keyword for _, keyword in pairs]
+    items, bm25_matrix = rcf.get_bm25_score_arrays(keywords)
+
+    # --- ALS: 全ユーザーを1回の行列積で（同じユーザーは1回だけ） ---
+    snapshot = als_manager.get()
+    user_ids = list(dict.fromkeys(user_id for user_id, _ in pairs))
+    als_lists = als_manager.get_als_scores_batch(user_ids, snapshot, top_n=50)
+    als_arrays = {
+        user_id: fusion.als_scores_to_array(scores, items)
+        for user_id, scores in zip(user_ids, als_lists)
+    }
+
+    # --- スコア統合 → 組ごとに上位 n 件 ---
+    results = []
+    for (user_id, keyword), bm25_scores in zip(pairs, bm25_matrix):
+        top, _ = fusion.recommend_positions(
+            bm25_scores, als_arrays[user_id], items, keyword, w1=w1, w2=w2, top_n=top_n
+        )
+        results.append([str(i) for i in items.item_ids[top].tolist()])
+
+    response = jsonify({"results": results, "model_version": snapshot.version})
+    response.headers["X-Model-Version"] = str(snapshot.version)
+    return response
+
+@app.route('/similar_items', methods=['POST'])
+def similar_items():
+    """ALS のアイテム因子で似ているアイテムを返す（ユーザー不要）"""
+    data = request.get_json() or {}
+    try:
+        top_n = int(data.get("top_n", fusion.DEFAULT_TOP_N))
+    except (TypeError, ValueError):
+        return jsonify({"error": "top_n は整数で指定してください"}), 400
+    if not 1 <= top_n <= fusion.MAX_TOP_N:
+        return jsonify({"error": f"top_n は 1〜{fusion.MAX_TOP_N} で指定してください"}), 400
+
+    # item_id か、Flutter から送られるタイトルで指定する
+    items = catalog.data
+    item_id = data.get("item_id")
+    if item_id is None:
+        item_id = items.item_id(data.get("title"))
+    if item_id is None or items.position(item_id) < 0:
+        return jsonify({"error": "item not found"}), 404
+
+    # 近傍表はモデルの版ごとに作り直してある。カタログから消えたアイテムは除く
+    snapshot = als_manager.get()
+    neighbors = als_manager.similar_items(item_id, snapshot, top_n=top_n + 10)
+    similar = [i for i, _ in neighbors if items.position(i) >= 0][:top_n]
+
+    response = jsonify([str(i) for i in similar])
+    response.headers["X-Model-Version"] = str(snapshot.version)
+    return response
 
 @app.route("/log_event", methods=["POST"])
 def log_event():
-    data = request.get_json()
-    user_id = data.get("user_id", 1)
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "invalid json"}), 400
     title = data.get("item_id")  # Flutterから送られるタイトル
     action = data.get("action")
     from_page = data.get("from", "")
@@ -92,20 +213,159 @@ def log_event():
 
     if not title or not action:
         return jsonify({"error": "missing fields"}), 400
+    # 記録してから失敗すると、クライアントの再送で同じイベントが重複するので先に弾く
+    if not isinstance(title, str) or not isinstance(action, str):
+        return jsonify({"error": "item_id and action must be strings"}), 400
+    try:
+        user_id = int(data.get("user_id", 1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "user_id must be an integer"}), 400
 
     # --- タイトル → item_id 解決 ---
     item_id = ua.title_to_item_id(title)
 
     # --- ユーザーアクションログ ---
     ua.log_user_action(user_id, item_id, action, from_page, timestamp)
+    als_manager.notify_events()
+    EVENTS.inc(action=_action_label(action))
+
+    # --- ユーザー因子へ即時反映（fold-in）し、そのユーザーの応答キャッシュを捨てる ---
+    # 記録済みなので fold-in が失敗しても 200 を返す（5xx だとクライアントの再送で重複する）
+    try:
+        als_manager.fold_in(user_id, item_id, action)
+    except Exception as e:
+        log.exception("❌ fold-in に失敗しました（イベントは記録済み）", error=e)
+    _recommend_cache.invalidate(user_id)
 
     return jsonify({
         "status": "ok",
+        "model_version": als_manager.version,
     })
 
+@app.route("/log_events", methods=["POST"])
+def log_events():
+    """/log_event と同じ形のイベントを {"events": [...]} でまとめて受け付ける。
+
+    タイトルはカタログの同じ版で一度に解決し、イベントライターへ一度に積む。
+    必須項目の欠けた・型の合わないイベントは飛ばし、その添字を rejected で返す。
+    クライアントは 5xx でバッチごと再送するので、検査はすべて積む前に済ませ、
+    積んだ後の fold-in が失敗しても 200 を返す（再送で記録が重複しないように）。
+    """
+    data = request.get_json(silent=True) or {}
+    events = data.get("events") if isinstance(data, dict) else None
+    if not isinstance(events, list):
+        return jsonify({"error": "events must be a list"}), 400
+    if len(events) > MAX_BATCH_EVENTS:
+        return jsonify({"error": f"too many events (max {MAX_BATCH_EVENTS})"}), 413
+
+    accepted, user_ids, rejected = [], [], []
+    for index, event in enumerate(events):
+        user_id = _event_user_id(event)
+        if user_id is None:
+            rejected.append(index)
+        else:
+            accepted.append(event)
+            user_ids.append(user_id)
+
+    if accepted:
+        # --- タイトル → item_id 解決（まとめて） ---
+        item_ids = ua.titles_to_item_ids([event["item_id"] for event in accepted])
+        rows = [
+            (user_id, item_id, event["action"], event.get("from", ""), event.get("timestamp"))
+            for event, user_id, item_id in zip(accepted, user_ids, item_ids)
+        ]
+
+        # --- ユーザーアクションログ（1回で積む） ---
+        ua.log_user_actions(rows)
+        als_manager.notify_events(len(rows))
+        for row in rows:
+            EVENTS.inc(action=_action_label(row[2]))
+
+        # --- ユーザー因子へ即時反映し、関係するユーザーの応答キャッシュを捨てる ---
+        try:
+            als_manager.fold_in_many([(user_id, item_id, action) for user_id, item_id, action, _, _ in rows])
+        except Exception as e:
+            log.exception("❌ fold-in に失敗しました（イベントは記録済み）", error=e)
+        for user_id in set(user_ids):
+            _recommend_cache.invalidate(user_id)
+
+    return jsonify({
+        "status": "ok",
+        "accepted": len(accepted),
+        "rejected": rejected,
+        "model_version": als_manager.version,
+    })
+
+def _action_label(action):
+    """メトリクスのラベル用の action（クライアントの値で系列が増えないよう既知の値だけ）"""
+    action = action.lower()
+    return action if action in ua.ACTION_MAP else "other"
+
+def _event_user_id(event):
+    """/log_events の1イベントを検査し、受け付けるなら user_id（int）、弾くなら None を返す"""
+    if not isinstance(event, dict):
+        return None
+    title, action = event.get("item_id"), event.get("action")
+    if not title or not action or not isinstance(title, str) or not isinstance(action, str):
+        return None
+    try:
+        return int(event.get("user_id", 1))
+    except (TypeError, ValueError):
+        return None
+
+# ============================================================
+# 学習パス記事の配信（コンテンツバンドル）
+# ============================================================
+def _send_payload(payload):
+    """If-None-Match が一致すれば 304、gzip を受け付けるなら圧縮済みの本文を返す
+
+    プロキシが W/"..." に書き換えた ETag でも一致とみなす（If-None-Match は弱い比較）。
+    """
+    if request.if_none_match.contains_weak(payload.etag.strip('"')):
+        response = Response(status=304)
+    elif request.accept_encodings["gzip"]:
+        response = Response(payload.gzipped, content_type="application/json; charset=utf-8")
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response = Response(payload.body, content_type="application/json; charset=utf-8")
+    response.headers["ETag"] = payload.etag
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = "no-cache"   # 毎回 ETag で確認させる
+    return response
+
+@app.route("/content/index", methods=["GET"])
+def content_index():
+    """パス一覧（タイトル・ジャンル・記事キー・パスごとの etag）"""
+    return _send_payload(content_bundle.loaded.index)
+
+@app.route("/content/bundle", methods=["GET"])
+def content_bundle_all():
+    """全パス・全記事をまとめたバンドル"""
+    return _send_payload(content_bundle.loaded.full)
+
+@app.route("/content/paths/<int:path_number>", methods=["GET"])
+def content_path(path_number):
+    """1パス分の記事（本文込み）"""
+    payload = content_bundle.loaded.paths.get(path_number)
+    if payload is None:
+        return jsonify({"error": "unknown path"}), 404
+    return _send_payload(payload)
+
+@app.route("/cache_stats", methods=["GET"])
+def cache_stats():
+    return jsonify({"bm25": rcf.get_cache_stats(), "recommend": _recommend_cache.stats()})
 
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """処理段階ごとのヒストグラムとカウンタ（Prometheus テキスト形式）"""
+    stats = dict(rcf.get_cache_stats(), recommend=_recommend_cache.stats())
+    for cache in ("tokens", "scores", "recommend"):
+        for kind in ("hits", "misses", "evictions", "expirations", "invalidations"):
+            CACHE_EVENTS.set_total(stats[cache].get(kind, 0), cache=cache, kind=kind)
+        CACHE_HIT_RATIO.set(stats[cache]["hit_rate"], cache=cache)
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 
 if __name__ == "__main__":
-    print("🚀 Flask サーバーを起動します… http://127.0.0.1:5000")
+    log.info("🚀 Flask サーバーを起動します… http://127.0.0.1:5000")
     app.run(host="0.0.0.0", port=5000, debug=True)
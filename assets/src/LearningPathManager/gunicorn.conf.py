@@ -0,0 +1,19 @@
+# ================================
+# 🚀 本番用 prefork 配信設定
+# ================================
+#   cd assets/src/LearningPathManager
+#   gunicorn -c gunicorn.conf.py app:app
+#
+# preload_app でカタログと BM25 インデックス（mmap）をマスターで一度だけ読み込み、
+# fork したワーカーはそれを共有する。ALS モデルは学習担当のワーカーが
+# assets/models に公開し、ほかのワーカーは mmap で開いて自動で切り替える。
+import multiprocessing
+import os
+
+os.environ.setdefault("ALS_SHARED_MODEL", "1")
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+threads = int(os.environ.get("THREADS", 2))
+preload_app = True
+timeout = 120   # 初回学習（学習担当のワーカー）を待てるように長めにする
@@ -1,59 +1,157 @@
+import argparse
+import hashlib
+import json
 import os
-import MeCab
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-# ストップワード（助詞・接続詞など）
-STOPWORDS = set([
-    "こと", "もの", "それ", "これ", "ため", "よう", "など", "に", "の", "が", "を", "と", "は", "も", "で", "から", "まで", "より",
-    "そして", "しかし", "また", "さらに", "です", "ます", "する", "ある", "いる", "なる", "できる", "思う", "考える"
-])
+APP_DIR = os.path.dirname(os.path.abspath(__file__))  # ../assets/src/LearningPathManager
+SRC_DIR = os.path.dirname(APP_DIR)                    # ../assets/src
+ASSETS_DIR = os.path.dirname(SRC_DIR)                 # ../assets
+CONTENT_DIR = os.path.join(ASSETS_DIR, "content")
 
-# MeCab初期化
-tagger = MeCab.Tagger("-Ochasen")
-tagger.parse("")  # バグ回避
+if SRC_DIR not in sys.path:
+    sys.path.append(SRC_DIR)
+
+from InteresrEstimator.tokenizer import get_tokenizer, STOPWORDS, KEYWORD_POS, KEYWORD_SKIP_DETAIL
+
+# 対象フォルダ
+folders = [os.path.join(CONTENT_DIR, "LearningPath" + str(i)) for i in range(1, 11)] + [
+    os.path.join(CONTENT_DIR, "ExtraContents")
+]
+
+# main: の内容ハッシュを記録するマニフェスト（変更の無いファイルは抽出しない）
+MANIFEST_FILE = os.path.join(CONTENT_DIR, ".keyword_manifest.json")
+
+TOKENIZER_BACKEND = "auto"
+# keyword: 行は IPADIC の分かち書きで作ってある（UniDic だと語の区切りが変わり全ファイルが書き換わる）
+TOKENIZER_DICTIONARY = "ipadic"
+TOP_N = 10
+PARALLEL_MIN_FILES = 32   # これ未満ならプロセスを起こさずその場で処理する
+
+# ================================
+# 🧵 ワーカー（プロセスごとに Tagger を1つ持つ）
+# ================================
+_tokenizer = None
+
+def _init_worker(backend):
+    global _tokenizer
+    _tokenizer = get_tokenizer(backend, TOKENIZER_DICTIONARY)
 
 # キーワード抽出関数
-def extract_keywords(text, top_n=10):
-    node = tagger.parseToNode(text)
-    keywords = []
+def extract_keywords(text, top_n=TOP_N):
+    if _tokenizer is None:
+        _init_worker(TOKENIZER_BACKEND)
+    return _tokenizer.keywords(text, top_n=top_n)
 
-    while node:
-        features = node.feature.split(",")
-        surface = node.surface
-        pos = features[0]
-        base = features[6] if len(features) > 6 else surface
+def _extract_job(job):
+    path, text = job
+    return path, extract_keywords(text) if text is not None else []
 
-        if pos == "名詞" and base not in STOPWORDS and len(base) > 1:
-            keywords.append(base)
-        node = node.next
+# ================================
+# 📄 ファイル読み書き
+# ================================
+def list_files():
+    for folder in folders:
+        for root, _, files in os.walk(folder):
+            for file in sorted(files):
+                if file.endswith(".txt") and file != "PathTitle.txt":
+                    yield os.path.join(root, file)
 
-    return list(dict.fromkeys(keywords))[:top_n]
+def read_main(lines):
+    """main: の行の本文（無ければ None）"""
+    for line in lines:
+        if line.startswith("main:"):
+            return line[len("main:"):].strip()
+    return None
 
-# 対象フォルダ
-folders = ["../content/LearningPath" + str(i) for i in range(1, 11)] + ["../content/ExtraContents"]
-
-# ファイル処理
-for folder in folders:
-    for root, _, files in os.walk(folder):
-        for file in files:
-            if file.endswith(".txt") and file != "PathTitle.txt":
-                path = os.path.join(root, file)
-                with open(path, "r", encoding="utf-8") as f:
-                    lines = f.readlines()
-
-                # main: の行を探してキーワード抽出
-                for line in lines:
-                    if line.startswith("main:"):
-                        text = line[len("main:"):].strip()
-                        keywords = extract_keywords(text)
-                        break
-                else:
-                    keywords = []
-
-                # keyword: を追記（すでにある場合は上書き）
-                new_lines = [line for line in lines if not line.startswith("keyword:")]
-                new_lines.append(f"keyword: {', '.join(keywords)}\n")
-
-                with open(path, "w", encoding="utf-8") as f:
-                    f.writelines(new_lines)
-
-print("🌊 キーワード抽出＆追記完了！")
+def write_keywords(path, lines, keywords):
+    """keyword: を追記（すでにある場合は上書き）。内容が同じなら書かない。"""
+    new_lines = [line for line in lines if not line.startswith("keyword:")]
+    new_lines.append(f"keyword: {', '.join(keywords)}\n")
+    if new_lines == lines:
+        return False
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(new_lines)
+    return True
+
+def extractor_signature(backend):
+    """抽出方針が変わったら全ファイルを作り直すための署名"""
+    policy = json.dumps([backend, TOKENIZER_DICTIONARY, TOP_N, sorted(STOPWORDS), KEYWORD_POS, KEYWORD_SKIP_DETAIL],
+                        ensure_ascii=False)
+    return hashlib.sha256(policy.encode("utf-8")).hexdigest()[:16]
+
+def content_hash(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+def load_manifest(signature):
+    try:
+        with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("extractor") != signature:
+        return {}
+    return manifest.get("files", {})
+
+def save_manifest(signature, files):
+    tmp = MANIFEST_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"extractor": signature, "files": files}, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, MANIFEST_FILE)
+
+# ================================
+# 🌊 キーワード抽出（差分のみ・並列）
+# ================================
+def run(workers=None, force=False):
+    start = time.perf_counter()
+    backend = get_tokenizer(TOKENIZER_BACKEND, TOKENIZER_DICTIONARY).name
+    signature = extractor_signature(backend)
+    manifest = {} if force else load_manifest(signature)
+
+    files, jobs, skipped = {}, [], 0
+    new_manifest = {}
+    for path in list_files():
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        text = read_main(lines)
+        key = os.path.relpath(path, CONTENT_DIR)
+        digest = content_hash(text)
+        new_manifest[key] = digest
+
+        has_keywords = any(line.startswith("keyword:") for line in lines)
+        if manifest.get(key) == digest and has_keywords:
+            skipped += 1
+            continue
+        files[path] = lines
+        jobs.append((path, text))
+
+    if len(jobs) >= PARALLEL_MIN_FILES and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(backend,)) as pool:
+            results = list(pool.map(_extract_job, jobs, chunksize=16))
+    else:
+        _init_worker(backend)
+        results = [_extract_job(job) for job in jobs]
+
+    written = 0
+    for path, keywords in results:
+        if write_keywords(path, files[path], keywords):
+            written += 1
+
+    save_manifest(signature, new_manifest)
+    elapsed = time.perf_counter() - start
+    print(
+        f"🌊 キーワード抽出＆追記完了！ 抽出 {len(jobs)} 件 / スキップ {skipped} 件 / "
+        f"書き換え {written} 件 / {elapsed:.2f}s（{backend}）"
+    )
+    return {"processed": len(jobs), "skipped": skipped, "written": written, "seconds": elapsed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="main: からキーワードを抽出して keyword: 行を更新する")
+    parser.add_argument("--workers", type=int, default=None, help="並列プロセス数（既定: CPU数）")
+    parser.add_argument("--force", action="store_true", help="マニフェストを無視して全ファイルを抽出する")
+    args = parser.parse_args()
+    run(workers=args.workers, force=args.force)
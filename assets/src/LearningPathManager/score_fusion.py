@@ -0,0 +1,112 @@
+import numpy as np
+
+from Monitoring import metrics
+
+# ================================
+# 🔧 既定パラメータ（リクエストで上書き可能）
+# ================================
+DEFAULT_W1 = 0.7      # BM25重み
+DEFAULT_W2 = 0.3      # ALS重み
+DEFAULT_TOP_N = 3     # 最終出力数
+MAX_TOP_N = 100
+MAX_BATCH_SIZE = 500  # /recommend_batch の1回あたりの最大件数
+
+
+# ============================================================
+# ALS の (item_id, score) リスト → カタログ行順の密ベクトル
+# ============================================================
+def als_scores_to_array(als_scores, items):
+    """カタログに無い item_id は推薦対象にできないので捨てる"""
+    dense = np.zeros(len(items), dtype=np.float64)
+    if not als_scores:
+        return dense
+    ids, scores = zip(*als_scores)
+    positions = items.positions(ids)
+    valid = positions >= 0
+    dense[positions[valid]] = np.asarray(scores, dtype=np.float64)[valid]
+    return dense
+
+
+# ============================================================
+# 完全一致タイトルの除外マスク
+# ============================================================
+def title_exclusion_mask(items, keyword):
+    """keyword と同じタイトルの行を True にする"""
+    mask = np.zeros(len(items), dtype=bool)
+    mask[items.title_positions(keyword)] = True
+    return mask
+
+
+# ============================================================
+# 上位 k 件の部分選択
+# ============================================================
+def top_k(scores, k, exclude=None):
+    """スコア降順の上位 k 件の行位置を返す（全体ソートはしない）"""
+    if exclude is not None and exclude.any():
+        scores = np.where(exclude, -np.inf, scores)
+        k = min(k, int((~exclude).sum()))
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+# ============================================================
+# ハイブリッドスコア
+# ============================================================
+def fuse(bm25_scores, als_scores, w1=DEFAULT_W1, w2=DEFAULT_W2):
+    return w1 * bm25_scores + w2 * als_scores
+
+
+def recommend_positions(bm25_scores, als_scores, items, keyword,
+                        w1=DEFAULT_W1, w2=DEFAULT_W2, top_n=DEFAULT_TOP_N):
+    """(行位置, ハイブリッドスコア) を返す。keyword と同じタイトルは除外する。"""
+    with metrics.stage("fusion"):
+        hybrid = fuse(bm25_scores, als_scores, w1, w2)
+    with metrics.stage("filter"):
+        top = top_k(hybrid, top_n, title_exclusion_mask(items, keyword))
+    return top, hybrid[top]
+
+
+# ============================================================
+# リクエストパラメータの解釈
+# ============================================================
+def normalize_keyword(keyword):
+    """前後と連続する空白を詰める（トークン列もタイトル一致も変わらない範囲の正規化）"""
+    return " ".join(str(keyword or "").split())
+
+
+def parse_params(data):
+    """w1 / w2 / top_n を取り出す。不正値は ValueError。"""
+    w1 = float(data.get("w1", DEFAULT_W1))
+    w2 = float(data.get("w2", DEFAULT_W2))
+    top_n = int(data.get("top_n", DEFAULT_TOP_N))
+    if not (np.isfinite(w1) and np.isfinite(w2)):
+        raise ValueError("w1 / w2 は有限の数値で指定してください")
+    if not 1 <= top_n <= MAX_TOP_N:
+        raise ValueError(f"top_n は 1〜{MAX_TOP_N} で指定してください")
+    return w1, w2, top_n
+
+
+def parse_batch(data):
+    """/recommend_batch の [(user_id, keyword), ...] を取り出す。不正値は ValueError。
+
+    keyword は /recommend と同じく normalize_keyword を通す（同じ問い合わせは同じ結果になる）。
+    """
+    pairs = data.get("requests")
+    if not isinstance(pairs, list) or not pairs:
+        raise ValueError("requests は (user_id, keyword) の空でないリストで指定してください")
+    if len(pairs) > MAX_BATCH_SIZE:
+        raise ValueError(f"requests は {MAX_BATCH_SIZE} 件以内で指定してください")
+
+    parsed = []
+    for pair in pairs:
+        if isinstance(pair, dict):
+            user_id, keyword = pair.get("user_id", 0), pair.get("keyword", "")
+        elif isinstance(pair, (list, tuple)) and len(pair) == 2:
+            user_id, keyword = pair
+        else:
+            raise ValueError("requests の各要素は {user_id, keyword} か [user_id, keyword] で指定してください")
+        parsed.append((int(user_id), normalize_keyword(keyword)))
+    return parsed
@@ -0,0 +1,88 @@
+"""レベルで絞れる構造化ログ。
+
+    from Monitoring.log import get_logger
+    log = get_logger("als")
+    log.info("🧠 ALSモデルを学習しました", version=3, users=120)
+
+キーワード引数は key=value（LOG_FORMAT=json なら JSON の1行）で出力する。
+重い値を組み立てる DEBUG ログは log.isEnabledFor(logging.DEBUG) で囲む。
+"""
+import json
+import logging
+import os
+import sys
+import threading
+
+# ================================
+# 🔧 設定（環境変数で上書き可能）
+# ================================
+ROOT_LOGGER = "learningpath"
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")   # text | json
+
+_RESERVED = ("exc_info", "stack_info", "stacklevel", "extra")
+_configured = False
+_configure_lock = threading.Lock()
+
+
+class StructuredFormatter(logging.Formatter):
+    """メッセージの後ろに key=value を並べる（json なら1行の JSON）"""
+
+    def __init__(self, fmt=LOG_FORMAT):
+        super().__init__()
+        self.json = fmt == "json"
+
+    def format(self, record):
+        fields = getattr(record, "fields", {})
+        timestamp = self.formatTime(record, "%Y-%m-%dT%H:%M:%S")
+        if self.json:
+            entry = {
+                "ts": timestamp,
+                "level": record.levelname,
+                "logger": record.name,
+                "msg": record.getMessage(),
+                **fields,
+            }
+            if record.exc_info:
+                entry["exc"] = self.formatException(record.exc_info)
+            return json.dumps(entry, ensure_ascii=False, default=str)
+
+        text = f"{timestamp} {record.levelname:<7} {record.name} {record.getMessage()}"
+        if fields:
+            text += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """log.info("...", key=value) のキーワード引数を構造化フィールドにする"""
+
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in _RESERVED}
+        extra = dict(kwargs.pop("extra", None) or {})
+        extra["fields"] = fields
+        kwargs["extra"] = extra
+        return msg, kwargs
+
+
+def configure(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+    """learningpath.* のロガーに出力先とレベルを設定する（何度呼んでもよい）"""
+    global _configured
+    with _configure_lock:
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(level)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(StructuredFormatter(fmt))
+        root.addHandler(handler)
+        root.propagate = False
+        _configured = True
+
+
+def get_logger(name):
+    """learningpath.<name> の構造化ロガーを返す（初回に既定の設定を行う）"""
+    if not _configured:
+        configure()
+    return StructuredLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"), {})
@@ -0,0 +1,69 @@
+import time
+
+import numpy as np
+
+from RelevanceCalculator import user_action as ua
+
+# ================================
+# 🔧 設定
+# ================================
+CANDIDATE_TOP_N = 50     # ユーザーごとに前計算する ALS 候補数（/recommend の top_n=50 と同じ）
+BUILD_BATCH_USERS = 1024 # 一度の行列積で扱うユーザー数（メモリ量の上限）
+
+
+# ============================================================
+# ユーザー別 ALS 候補表
+# ============================================================
+class CandidateTable:
+    """学習済みユーザーの ALS 上位候補を配列で持つ表。
+
+    items[u, :counts[u]]  : user_id = u の候補 item_id（スコア降順、既読は除外済み）
+    scores[u, :counts[u]] : その生スコア（正規化は引くときに上位 top_n の範囲で行う）
+
+    行番号がそのまま user_id なので、引くのは配列の添字アクセスだけで済む。
+    """
+
+    def __init__(self, items, scores, counts, built_at=None):
+        self.items = items
+        self.scores = scores
+        self.counts = counts
+        self.built_at = built_at
+
+    @property
+    def top_n(self):
+        return self.items.shape[1]
+
+    def __len__(self):
+        return self.items.shape[0]
+
+    @classmethod
+    def build(cls, model, matrix, top_n=CANDIDATE_TOP_N, batch_size=BUILD_BATCH_USERS):
+        """全ユーザーの上位 top_n を行列積でまとめて計算する"""
+        num_users = matrix.shape[0]
+        items = np.zeros((num_users, top_n), dtype=np.int32)
+        scores = np.full((num_users, top_n), -np.inf, dtype=np.float32)
+        indptr, indices = matrix.indptr, matrix.indices
+
+        for start in range(0, num_users, batch_size):
+            end = min(start + batch_size, num_users)
+            liked = [indices[indptr[u]:indptr[u + 1]] for u in range(start, end)]
+            top, top_scores = ua.als_top_n_batch(
+                model.user_factors[start:end], model.item_factors, liked, top_n=top_n
+            )
+            items[start:end, :top.shape[1]] = top
+            scores[start:end, :top.shape[1]] = top_scores
+
+        counts = np.isfinite(scores).sum(axis=1).astype(np.int32)
+        return cls(items, scores, counts, built_at=time.time())
+
+    def arrays(self):
+        """保存用の配列"""
+        return {"items": self.items, "scores": self.scores, "counts": self.counts}
+
+    def lookup(self, user_id, top_n=CANDIDATE_TOP_N):
+        """[(item_id, score), ...] を返す。表に無いユーザー・表より多い top_n は None。"""
+        if not 0 <= user_id < len(self) or top_n > self.top_n:
+            return None
+        n = min(top_n, int(self.counts[user_id]))
+        raw = np.asarray(self.scores[user_id, :n], dtype=float)
+        return list(zip(self.items[user_id, :n].tolist(), ua._minmax_normalize(raw)))
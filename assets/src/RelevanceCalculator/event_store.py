@@ -0,0 +1,311 @@
+import csv
+import datetime
+import fcntl
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from Monitoring.log import get_logger
+
+log = get_logger("event_store")
+
+# ================================
+# 🔧 設定
+# ================================
+APP_DIR = os.path.dirname(os.path.abspath(__file__))  # ../assets/src/RelevanceCalculator
+SRC_DIR = os.path.dirname(APP_DIR)                    # ../assets/src
+ASSETS_DIR = os.path.dirname(SRC_DIR)                 # ../assets
+
+STORE_DIR = os.path.join(os.environ.get("LEARNINGPATH_LOG_DIR", os.path.join(ASSETS_DIR, "logs")), "events")
+SEGMENTS_DIR = "segments"    # 生イベント（日付パーティション / 書き込みプロセスごと）
+COMPACT_DIR = "compact"      # 集約済み (user, item, weight)
+MIGRATED_MARKER = ".migrated_from_csv"   # 移行が最後まで終わったら作る
+MIGRATE_LOCK = ".migrate.lock"           # 移行中はこのファイルを flock する
+MIGRATE_WRITER = "migrated-csv"          # 移行したイベントの書き込み先（やり直すときは消して書き直す）
+
+COMPACT_GRACE_DAYS = 1       # 今日と前日のパーティションは書き込み中とみなして圧縮しない
+
+# 列名 → 型（1列1ファイルの追記専用バイナリ）
+COLUMNS = {
+    "ts": np.int64,       # イベント時刻（エポックミリ秒）
+    "user": np.int32,
+    "item": np.int32,
+    "action": np.int8,    # ACTION_MAP の action_id（不明は 0）
+}
+
+# action_id → 重み（user_action.ACTION_MAP / ACTIONS_WEIGHT と対応）
+ACTION_ID_WEIGHT = np.zeros(256, dtype=np.float32)
+ACTION_ID_WEIGHT[1] = 1.0   # click
+ACTION_ID_WEIGHT[2] = 3.0   # bookmark
+ACTION_ID_WEIGHT[3] = 2.0   # navigate
+
+ACTION_IDS = {"click": 1, "bookmark": 2, "navigate": 3}
+
+
+def _day_of(ts_ms):
+    return datetime.date.fromtimestamp(ts_ms / 1000).strftime("%Y%m%d")
+
+
+def parse_timestamp(value):
+    """ISO8601 文字列をエポックミリ秒に変換する（不正なら現在時刻）"""
+    try:
+        return int(datetime.datetime.fromisoformat(str(value)).timestamp() * 1000)
+    except (TypeError, ValueError):
+        return int(time.time() * 1000)
+
+
+def aggregate(user, item, action):
+    """生イベント列を (user, item, weight) の三つ組に集約する。"""
+    weight = ACTION_ID_WEIGHT[action.astype(np.uint8)]
+    keep = (weight > 0) & (user >= 0) & (item >= 0)
+    user, item, weight = user[keep], item[keep], weight[keep]
+    if len(user) == 0:
+        return (np.empty(0, np.int32), np.empty(0, np.int32), np.empty(0, np.float32))
+
+    keys = (user.astype(np.int64) << 32) | item.astype(np.int64)
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    summed = np.bincount(inverse, weights=weight).astype(np.float32)
+    return (
+        (unique_keys >> 32).astype(np.int32),
+        (unique_keys & 0xFFFFFFFF).astype(np.int32),
+        summed,
+    )
+
+
+# ============================================================
+# 列指向イベントストア
+# ============================================================
+class EventStore:
+    """user_events を日付ごとの追記専用バイナリ列セグメントとして保存する。
+
+    segments/<YYYYMMDD>/<writer>/<列>.bin に追記し、古い日付は
+    compact/<YYYYMMDD>.npz の (user, item, weight) に集約する。
+    読み出しはテキストを解析せずに直接 CSR 行列を組み立てる。
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self.segments_dir = os.path.join(root, SEGMENTS_DIR)
+        self.compact_dir = os.path.join(root, COMPACT_DIR)
+        # 1プロセス = 1書き込み先（クラッシュ後の再起動は新しいセグメントになる）
+        self.writer_id = f"{os.getpid()}-{int(time.time() * 1000)}"
+        self._lock = threading.Lock()
+
+    # ---------- 書き込み ----------
+    def append(self, ts, user, item, action, day=None, writer=None):
+        """イベント列を1グループとして追記する。day 省略時は書き込み日のパーティション。"""
+        columns = {
+            "ts": np.asarray(ts, dtype=COLUMNS["ts"]),
+            "user": np.asarray(user, dtype=COLUMNS["user"]),
+            "item": np.asarray(item, dtype=COLUMNS["item"]),
+            "action": np.asarray(action, dtype=COLUMNS["action"]),
+        }
+        if len(columns["ts"]) == 0:
+            return
+        day = day or datetime.date.today().strftime("%Y%m%d")
+        segment = os.path.join(self.segments_dir, day, writer or self.writer_id)
+
+        with self._lock:
+            os.makedirs(segment, exist_ok=True)
+            # action を最後に書くので、途中で落ちても action の長さまでは揃っている
+            for name in COLUMNS:
+                with open(os.path.join(segment, f"{name}.bin"), "ab") as f:
+                    f.write(columns[name].tobytes())
+
+    def append_rows(self, rows):
+        """user_events 形式の行 [timestamp, user_id, item_id, action, action_id, from] を追記する。
+
+        整数にできない行はその行だけ飛ばす（同じグループのほかの行は書く）。
+        """
+        events = []
+        for r in rows:
+            try:
+                events.append((parse_timestamp(r[0]), int(r[1]), int(r[2]), int(r[4])))
+            except (IndexError, TypeError, ValueError):
+                log.warning("⚠️ 不正なイベント行を飛ばしました", row=r)
+        if events:
+            self.append(*zip(*events))
+
+    # ---------- 読み出し ----------
+    def _days(self, subdir, suffix=""):
+        path = os.path.join(self.root, subdir)
+        if not os.path.isdir(path):
+            return []
+        return sorted(
+            name[:len(name) - len(suffix)] if suffix else name
+            for name in os.listdir(path)
+            if name.endswith(suffix) and not name.startswith(".")
+        )
+
+    def segment_writers(self, day):
+        day_dir = os.path.join(self.segments_dir, day)
+        return sorted(os.listdir(day_dir)) if os.path.isdir(day_dir) else []
+
+    def read_segment_day(self, day, writers=None):
+        """1日分（writers 指定時はその書き込み先だけ）の生イベント列を読み込む。
+
+        列の長さは短い方に揃える。
+        """
+        day_dir = os.path.join(self.segments_dir, day)
+        parts = {name: [] for name in COLUMNS}
+        for writer in (self.segment_writers(day) if writers is None else writers):
+            segment = os.path.join(day_dir, writer)
+            cols = {
+                name: np.fromfile(os.path.join(segment, f"{name}.bin"), dtype=dtype)
+                if os.path.exists(os.path.join(segment, f"{name}.bin"))
+                else np.empty(0, dtype)
+                for name, dtype in COLUMNS.items()
+            }
+            n = min(len(c) for c in cols.values())
+            for name in COLUMNS:
+                parts[name].append(cols[name][:n])
+        return {name: np.concatenate(parts[name]) if parts[name] else np.empty(0, COLUMNS[name])
+                for name in COLUMNS}
+
+    def read_compact_day(self, day):
+        with np.load(os.path.join(self.compact_dir, f"{day}.npz")) as data:
+            return data["user"], data["item"], data["weight"]
+
+    def compacted_writers(self, day):
+        """集約ファイルに取り込み済みの書き込み先（無ければ空）"""
+        path = os.path.join(self.compact_dir, f"{day}.npz")
+        if not os.path.exists(path):
+            return set()
+        with np.load(path) as data:
+            return set(data["sources"].tolist()) if "sources" in data.files else set()
+
+    def load_triples(self, window_days=None):
+        """学習ウィンドウ内の (user, item, weight) を返す（日付単位で絞り込む）。"""
+        since = None
+        if window_days is not None:
+            since = (datetime.date.today() - datetime.timedelta(days=window_days)).strftime("%Y%m%d")
+
+        users, items, weights = [], [], []
+        for day in self._days(COMPACT_DIR, ".npz"):
+            if since is None or day >= since:
+                u, i, w = self.read_compact_day(day)
+                users.append(u)
+                items.append(i)
+                weights.append(w)
+        for day in self._days(SEGMENTS_DIR):
+            if since is None or day >= since:
+                # 集約済みなのに消し損ねたセグメント（compact の途中で落ちた）は数えない
+                done = self.compacted_writers(day)
+                writers = [w for w in self.segment_writers(day) if w not in done]
+                cols = self.read_segment_day(day, writers)
+                u, i, w = aggregate(cols["user"], cols["item"], cols["action"])
+                users.append(u)
+                items.append(i)
+                weights.append(w)
+
+        if not users:
+            return np.empty(0, np.int32), np.empty(0, np.int32), np.empty(0, np.float32)
+        return np.concatenate(users), np.concatenate(items), np.concatenate(weights)
+
+    def load_matrix(self, window_days=None):
+        """学習ウィンドウのイベントから (users × items) の CSR 行列を作る。空なら None。"""
+        user, item, weight = self.load_triples(window_days)
+        if len(user) == 0:
+            return None
+        shape = (int(user.max()) + 1, int(item.max()) + 1)
+        matrix = csr_matrix((weight, (user, item)), shape=shape, dtype=np.float32)
+        matrix.sum_duplicates()
+        return matrix
+
+    def is_empty(self):
+        return not self._days(SEGMENTS_DIR) and not self._days(COMPACT_DIR, ".npz")
+
+    # ---------- 圧縮 ----------
+    def compact(self, grace_days=COMPACT_GRACE_DAYS):
+        """書き込みの終わった日付のセグメントを集約ファイルにまとめる。
+
+        集約ファイルには取り込んだ書き込み先（sources）も記録する。集約ファイルの
+        差し替え後・セグメント削除前に落ちても、次回は取り込み済みの分を足し直さない。
+        """
+        cutoff = (datetime.date.today() - datetime.timedelta(days=grace_days)).strftime("%Y%m%d")
+        compacted = []
+        os.makedirs(self.compact_dir, exist_ok=True)
+
+        for day in self._days(SEGMENTS_DIR):
+            if day >= cutoff:
+                continue
+            done = self.compacted_writers(day)
+            writers = [w for w in self.segment_writers(day) if w not in done]
+            if writers:
+                self._compact_day(day, writers, done)
+            shutil.rmtree(os.path.join(self.segments_dir, day))
+            compacted.append(day)
+        return compacted
+
+    def _compact_day(self, day, writers, done):
+        cols = self.read_segment_day(day, writers)
+        user, item, weight = aggregate(cols["user"], cols["item"], cols["action"])
+
+        # 既存の集約ファイルがあれば合算する
+        target = os.path.join(self.compact_dir, f"{day}.npz")
+        n_events = len(cols["ts"])
+        if os.path.exists(target):
+            u, i, w = self.read_compact_day(day)
+            with np.load(target) as data:
+                n_events += int(data["n_events"])
+            merged = csr_matrix(
+                (np.concatenate([w, weight]), (np.concatenate([u, user]), np.concatenate([i, item])))
+            ).tocoo()
+            user, item, weight = merged.row.astype(np.int32), merged.col.astype(np.int32), merged.data.astype(np.float32)
+
+        tmp = os.path.join(self.compact_dir, f".{day}.tmp.npz")
+        np.savez(tmp, user=user, item=item, weight=weight, n_events=np.int64(n_events),
+                 sources=np.array(sorted(done | set(writers)), dtype=str))
+        os.replace(tmp, target)
+
+    # ---------- 移行 ----------
+    def migrate_from_csv(self, csv_path):
+        """既存の user_events.csv をイベント時刻の日付パーティションへ一度だけ移す。
+
+        移行はロックファイルを取ったプロセスだけが行い、ほかのプロセスは終わるまで待つ。
+        完了マーカーは全セグメントを書き終えてから作るので、途中で落ちたら次の起動で
+        MIGRATE_WRITER の書きかけを消してやり直す。
+        """
+        if not os.path.exists(csv_path):
+            return 0
+        os.makedirs(self.root, exist_ok=True)
+        marker = os.path.join(self.root, MIGRATED_MARKER)
+        with open(os.path.join(self.root, MIGRATE_LOCK), "a") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                if os.path.exists(marker):
+                    return 0
+                return self._migrate(csv_path, marker)
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _migrate(self, csv_path, marker):
+        for day in self._days(SEGMENTS_DIR):
+            shutil.rmtree(os.path.join(self.segments_dir, day, MIGRATE_WRITER), ignore_errors=True)
+
+        by_day = {}
+        with open(csv_path, "r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                try:
+                    user, item = int(row["user_id"]), int(row["item_id"])
+                except (TypeError, ValueError):
+                    continue
+                ts = parse_timestamp(row.get("timestamp"))
+                action = ACTION_IDS.get((row.get("action") or "").lower(), 0)
+                by_day.setdefault(_day_of(ts), []).append((ts, user, item, action))
+
+        count = 0
+        for day, events in sorted(by_day.items()):
+            ts, user, item, action = zip(*events)
+            self.append(ts, user, item, action, day=day, writer=MIGRATE_WRITER)
+            count += len(events)
+
+        tmp = f"{marker}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(f"{csv_path}\n{count}\n")
+        os.replace(tmp, marker)
+        return count
@@ -0,0 +1,264 @@
+import atexit
+import csv
+import os
+import queue
+import threading
+import time
+
+from Monitoring import metrics
+from Monitoring.log import get_logger
+
+log = get_logger("event_writer")
+
+# ================================
+# 🔧 設定
+# ================================
+BATCH_SIZE = 256          # 1回のコミットでまとめて書く最大件数
+FLUSH_INTERVAL_SEC = 0.2  # 最初のイベントから書き込みまでの最大待ち時間
+MAX_QUEUE = 10000         # キューの上限（超えたら submit がブロック）
+COMMIT_RETRY_SEC = 1.0    # on_commit に失敗したグループを再試行する間隔
+MAX_COMMIT_BACKLOG = MAX_QUEUE  # on_commit の再試行待ちに持つ最大行数（超えたら古い順に捨てる）
+
+# 永続性モード
+DURABILITY_NONE = "none"    # 書き込みはOSバッファ任せ（最速）
+DURABILITY_FLUSH = "flush"  # グループごとに flush（プロセス異常終了に強い）
+DURABILITY_FSYNC = "fsync"  # グループごとに fsync（OSクラッシュにも強い）
+DURABILITIES = (DURABILITY_NONE, DURABILITY_FLUSH, DURABILITY_FSYNC)
+
+_STOP = object()
+
+COMMIT_FAILURES = metrics.counter("event_commit_failures_total", "on_commit（イベントストアへの追記）の失敗回数")
+COMMIT_BACKLOG = metrics.gauge("event_commit_backlog", "on_commit の再試行待ちの行数")
+COMMIT_DROPPED = metrics.counter("event_commit_dropped_total", "on_commit に渡せないまま捨てた行数")
+
+
+# ============================================================
+# グループコミット方式のイベントライター
+# ============================================================
+class EventWriter:
+    """イベント行をキューに積み、単一のフラッシュスレッドがまとめて追記する。
+
+    - ファイルはフラッシュスレッドが開きっぱなしにするので、1件ごとの
+      open/close や存在チェックが発生しない
+    - 書き込みは1スレッドだけが行うため、Flask の並行スレッドの行が混ざらない
+    - BATCH_SIZE 件たまるか FLUSH_INTERVAL_SEC 経過で1グループとしてコミット
+    - on_commit を渡すと、コミットしたグループを同じスレッドで受け取れる
+      （path=None ならCSVには書かず on_commit だけを呼ぶ）。失敗したグループは
+      順番を保ったまま再試行待ちに残し、次のグループの前か retry_interval ごとに渡し直す。
+      MAX_COMMIT_BACKLOG 行を超えた分と、クローズまでに渡せなかった分は dropped に数える
+    - validate を渡すと submit 時に1行ずつ検査・型変換する。不正な行は
+      ValueError でキューに入る前に弾くので、グループ全体を巻き込まない
+    """
+
+    def __init__(self, path, header=None, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL_SEC, max_queue=MAX_QUEUE,
+                 durability=DURABILITY_FLUSH, on_commit=None, validate=None,
+                 retry_interval=COMMIT_RETRY_SEC):
+        if durability not in DURABILITIES:
+            raise ValueError(f"durability は {DURABILITIES} のいずれか: {durability}")
+
+        self.path = path
+        self.header = header
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.on_commit = on_commit
+        self.validate = validate
+        self.retry_interval = retry_interval
+        self.error = None  # フラッシュスレッドが止まった原因（ファイルを開けないなど）
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._lock = threading.Lock()
+        self.written = 0   # 書き込み済みイベント数
+        self.batches = 0   # コミット回数
+        self.dropped = 0   # on_commit に渡せずに捨てた行数
+        self._backlog = []        # on_commit の再試行待ちのグループ（フラッシュスレッドだけが触る）
+        self._backlog_rows = 0
+        self._commit_failing = False   # on_commit が失敗し続けている（ログは最初の1回だけ）
+
+        self._thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+        self._thread.start()
+
+    # ---------- 公開API ----------
+    def submit(self, row, timeout=None):
+        """1行をキューに積む。キューが満杯なら空くまで待つ。"""
+        self.submit_many([row], timeout)
+
+    def submit_many(self, rows, timeout=None):
+        """複数行をキューに積む（同じグループでコミットされやすい）。
+
+        validate があれば全行を先に検査するので、1行でも不正なら1行も積まない。
+        """
+        if self.validate is not None:
+            rows = [self.validate(row) for row in rows]
+        self._check_alive()
+        for row in rows:
+            self._queue.put(row, timeout=timeout)
+
+    def flush(self):
+        """ここまでに積まれたイベントがすべて書き込まれるまで待つ。
+
+        none モードではファイルへの反映は Python のバッファ次第になる。
+        フラッシュスレッドが止まっていれば待たずに RuntimeError を送出する。
+        """
+        if self._closed:
+            return
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                self._check_alive()
+                self._queue.all_tasks_done.wait(FLUSH_INTERVAL_SEC)
+
+    @property
+    def commit_backlog(self):
+        """on_commit の再試行待ちの行数"""
+        return self._backlog_rows
+
+    def _check_alive(self):
+        if self._closed:
+            raise RuntimeError("EventWriter はクローズ済みです")
+        if not self._thread.is_alive():
+            raise RuntimeError(f"EventWriter のフラッシュスレッドが停止しています: {self.error}")
+
+    def close(self):
+        """残りを書き切ってからフラッシュスレッドを止める。"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+        self._thread.join()
+
+    # ---------- フラッシュスレッド ----------
+    def _run(self):
+        f = writer = None
+        if self.path:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                f = open(self.path, "a", newline="", encoding="utf-8")
+                writer = csv.writer(f)
+                if self.header and f.tell() == 0:
+                    writer.writerow(self.header)
+                    f.flush()
+            except OSError as e:
+                # 待っている flush / submit は _check_alive で失敗に気づく
+                self.error = e
+                log.error("❌ イベントログを開けません", path=self.path, error=e)
+                if f is not None:
+                    f.close()
+                return
+
+        try:
+            stopping = False
+            while not stopping:
+                batch, stopping = self._collect()
+                if batch:
+                    self._write(f, writer, batch)
+                elif self._backlog:
+                    self._deliver()
+                for _ in range(len(batch) + (1 if stopping else 0)):
+                    self._queue.task_done()
+        finally:
+            if f is not None:
+                f.close()
+            if self._backlog:
+                self._deliver()   # 最後にもう一度だけ渡してみる
+            if self._backlog:
+                self._drop(self._backlog_rows, "クローズまでに on_commit へ渡せなかったイベントを捨てました")
+                self._backlog.clear()
+                self._backlog_rows = 0
+                COMMIT_BACKLOG.set(0)
+
+    def _write(self, f, writer, batch):
+        # CSV と on_commit は別々に扱う（片方の失敗でもう片方の行を失わない）。
+        # どちらの失敗でもフラッシュスレッドは止めない
+        with metrics.stage("log_write"):
+            if writer is not None:
+                try:
+                    writer.writerows(batch)
+                    self._commit(f)
+                    self.written += len(batch)
+                    self.batches += 1
+                except Exception as e:
+                    log.error("❌ イベントの書き込みに失敗", events=len(batch), error=e)
+            if self.on_commit is not None:
+                self._backlog.append(batch)
+                self._backlog_rows += len(batch)
+                self._deliver()
+
+    def _deliver(self):
+        """再試行待ちのグループを古い順に on_commit へ渡す（失敗したらそこで止めて次回に回す）"""
+        while self._backlog:
+            batch = self._backlog[0]
+            try:
+                self.on_commit(batch)
+            except Exception as e:
+                COMMIT_FAILURES.inc()
+                if not self._commit_failing:
+                    log.error("❌ コミット後の処理に失敗（再試行します）", events=self._backlog_rows, error=e)
+                self._commit_failing = True
+                break
+            self._backlog.pop(0)
+            self._backlog_rows -= len(batch)
+            if self.path is None:
+                self.written += len(batch)
+                self.batches += 1
+        if self._commit_failing and not self._backlog:
+            self._commit_failing = False
+            log.info("✅ コミット後の処理を再試行で完了しました")
+
+        overflow = 0
+        while self._backlog_rows > MAX_COMMIT_BACKLOG:
+            batch = self._backlog.pop(0)
+            self._backlog_rows -= len(batch)
+            overflow += len(batch)
+        if overflow:
+            self._drop(overflow, "on_commit の再試行待ちがあふれたので古いイベントを捨てました")
+        COMMIT_BACKLOG.set(self._backlog_rows)
+
+    def _drop(self, rows, message):
+        self.dropped += rows
+        COMMIT_DROPPED.inc(rows)
+        log.error(f"❌ {message}", events=rows)
+
+    def _collect(self):
+        """最初の1件を待ち、期限内に batch_size 件まで追加で取り出す。
+
+        on_commit の再試行待ちがあれば retry_interval で待つのをやめ、空のグループを返す。
+        """
+        try:
+            first = self._queue.get(timeout=self.retry_interval if self._backlog else None)
+        except queue.Empty:
+            return [], False
+        if first is _STOP:
+            return [], True
+
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                row = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if row is _STOP:
+                return batch, True
+            batch.append(row)
+        return batch, False
+
+    def _commit(self, f):
+        if self.durability == DURABILITY_NONE:
+            return
+        f.flush()
+        if self.durability == DURABILITY_FSYNC:
+            os.fsync(f.fileno())
+
+
+def open_event_writer(path, header=None, **kwargs):
+    """EventWriter を作成し、プロセス終了時に残りを書き切るよう登録する。"""
+    writer = EventWriter(path, header=header, **kwargs)
+    atexit.register(writer.close)
+    return writer
@@ -0,0 +1,161 @@
+import time
+
+import numpy as np
+
+# ================================
+# 🔧 設定
+# ================================
+NEIGHBOR_TOP_K = 20          # アイテムごとに前計算する近傍数
+EXACT_MAX_ITEMS = 20000      # これ以下のアイテム数なら全件の内積で厳密に求める
+BUILD_BATCH_ITEMS = 1024     # 一度の内積で扱う行数（メモリ量の上限）
+
+# 近似モード（ランダム超平面 LSH）のパラメータ
+LSH_TABLES = 16              # ハッシュ表の数（増やすほど取りこぼしが減る）
+LSH_BITS = 12                # 1表あたりのビット数（増やすほどバケットが細かくなる）
+LSH_SEED = 0
+
+MODE_EXACT = "exact"
+MODE_LSH = "lsh"
+
+
+def normalize_rows(factors):
+    """行ごとに L2 正規化した float32 行列（ノルム 0 の行は 0 のまま）"""
+    factors = np.asarray(factors, dtype=np.float32)
+    norms = np.linalg.norm(factors, axis=1, keepdims=True)
+    return np.divide(factors, norms, out=np.zeros_like(factors), where=norms > 0)
+
+
+# ============================================================
+# アイテム近傍表
+# ============================================================
+class ItemNeighbors:
+    """ALS のアイテム因子から作る、コサイン類似度の近傍表。
+
+    items[i, :counts[i]] : item_id = i に似たアイテム（類似度降順、自分自身は除く）
+    sims[i, :counts[i]]  : そのコサイン類似度
+
+    モデルの版ごとに build() で作り直し、オンラインでは配列を引くだけにする。
+    build は全件の内積で求める厳密モードと、LSH で候補を絞ってから
+    内積で並べ直す近似モードを持つ（大きなカタログ向け）。
+    """
+
+    def __init__(self, items, sims, counts, mode=MODE_EXACT, built_at=None):
+        self.items = items
+        self.sims = sims
+        self.counts = counts
+        self.mode = mode
+        self.built_at = built_at
+
+    def __len__(self):
+        return self.items.shape[0]
+
+    @property
+    def top_k(self):
+        return self.items.shape[1]
+
+    @classmethod
+    def build(cls, item_factors, k=NEIGHBOR_TOP_K, mode=None):
+        """mode を省略するとアイテム数で厳密 / 近似を選ぶ"""
+        normed = normalize_rows(item_factors)
+        if mode is None:
+            mode = MODE_EXACT if len(normed) <= EXACT_MAX_ITEMS else MODE_LSH
+        if mode == MODE_EXACT:
+            items, sims = _build_exact(normed, k)
+        elif mode == MODE_LSH:
+            items, sims = _build_lsh(normed, k)
+        else:
+            raise ValueError(f"未知の近傍モード: {mode}")
+        counts = np.isfinite(sims).sum(axis=1).astype(np.int32)
+        return cls(items, sims, counts, mode=mode, built_at=time.time())
+
+    def arrays(self):
+        """保存用の配列"""
+        return {"items": self.items, "sims": self.sims, "counts": self.counts}
+
+    def similar(self, item_id, top_n=NEIGHBOR_TOP_K):
+        """[(item_id, 類似度), ...] を返す（因子の無いアイテムは空）"""
+        if not 0 <= item_id < len(self):
+            return []
+        n = min(top_n, int(self.counts[item_id]))
+        return list(zip(self.items[item_id, :n].tolist(), self.sims[item_id, :n].tolist()))
+
+
+# ============================================================
+# 構築（厳密）
+# ============================================================
+def _select_top(scores, k):
+    """行ごとの上位 k 件（降順）。足りない分は -inf。"""
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def _empty_table(num_items, k):
+    return (np.zeros((num_items, k), dtype=np.int32),
+            np.full((num_items, k), -np.inf, dtype=np.float32))
+
+
+def _build_exact(normed, k):
+    num_items = len(normed)
+    items, sims = _empty_table(num_items, k)
+    if num_items < 2:
+        return items, sims
+    valid = np.linalg.norm(normed, axis=1) > 0
+    for start in range(0, num_items, BUILD_BATCH_ITEMS):
+        end = min(start + BUILD_BATCH_ITEMS, num_items)
+        scores = normed[start:end] @ normed.T
+        scores[:, ~valid] = -np.inf                                   # 因子の無いアイテムは候補外
+        scores[np.arange(end - start), np.arange(start, end)] = -np.inf  # 自分自身
+        scores[~valid[start:end]] = -np.inf
+        top, top_scores = _select_top(scores, k)
+        items[start:end, :top.shape[1]] = top
+        sims[start:end, :top.shape[1]] = top_scores
+    return items, sims
+
+
+# ============================================================
+# 構築（近似: ランダム超平面 LSH）
+# ============================================================
+def _build_lsh(normed, k, tables=LSH_TABLES, bits=LSH_BITS, seed=LSH_SEED):
+    """同じバケットに入ったアイテム同士だけ内積を取り、表ごとに上位 k 件へ併合する"""
+    num_items, dim = normed.shape
+    items, sims = _empty_table(num_items, k)
+    valid = np.flatnonzero(np.linalg.norm(normed, axis=1) > 0)
+    if len(valid) < 2:
+        return items, sims
+
+    rng = np.random.default_rng(seed)
+    weights = (1 << np.arange(bits)).astype(np.int64)
+    for _ in range(tables):
+        planes = rng.standard_normal((dim, bits)).astype(np.float32)
+        codes = ((normed[valid] @ planes) > 0).astype(np.int64) @ weights
+        order = np.argsort(codes, kind="stable")
+        _, starts = np.unique(codes[order], return_index=True)
+        for members in np.split(valid[order], starts[1:]):
+            if len(members) < 2:
+                continue
+            for start in range(0, len(members), BUILD_BATCH_ITEMS):
+                block = members[start:start + BUILD_BATCH_ITEMS]
+                scores = normed[block] @ normed[members].T
+                scores[np.arange(len(block)), np.arange(start, start + len(block))] = -np.inf
+                _merge_top(items, sims, block, members, scores)
+    return items, sims
+
+
+def _merge_top(items, sims, block, candidates, scores):
+    """block 各行の現在の上位 k 件に候補を足して上位 k 件を選び直す（重複は1つにする）"""
+    k = items.shape[1]
+    cand_ids = np.concatenate([items[block], np.broadcast_to(candidates, scores.shape)], axis=1)
+    cand_sims = np.concatenate([sims[block], scores], axis=1)
+
+    # id 昇順・同じ id なら類似度の高い方を先に並べ、2つ目以降を捨てる
+    order = np.lexsort((-cand_sims, cand_ids), axis=1)
+    cand_ids = np.take_along_axis(cand_ids, order, axis=1)
+    cand_sims = np.take_along_axis(cand_sims, order, axis=1)
+    cand_sims[:, 1:][cand_ids[:, 1:] == cand_ids[:, :-1]] = -np.inf
+
+    top, top_sims = _select_top(cand_sims, k)
+    items[block] = np.take_along_axis(cand_ids, top, axis=1)
+    sims[block] = top_sims
@@ -0,0 +1,575 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import namedtuple
+
+from RelevanceCalculator import user_action as ua
+from RelevanceCalculator import shared_model as sm
+from RelevanceCalculator import model_registry as mr
+from RelevanceCalculator import candidate_table as ct
+from RelevanceCalculator import item_neighbors as inb
+from Monitoring import metrics
+from Monitoring.log import get_logger
+
+log = get_logger("als")
+
+MODEL_VERSION = metrics.gauge("als_model_version", "配信中の ALS モデルの版")
+FOLDED_USERS = metrics.gauge("als_folded_users", "fold-in で因子を持っているユーザー数（ワーカーごと）")
+FOLD_FEED_DROPPED = metrics.counter("als_fold_feed_dropped_total",
+                                    "共有モード: 読む前に上書きされ、このワーカーに反映できなかった fold-in イベント数")
+TRAININGS = metrics.counter("als_trainings_total", "ALS の学習回数（mode=warm|cold）", ["mode"])
+
+# ================================
+# 🔧 設定
+# ================================
+RETRAIN_INTERVAL_SEC = 300     # 定期再学習の間隔（秒）
+RETRAIN_AFTER_EVENTS = 20      # この件数の新規イベントで再学習
+SYNC_INTERVAL_SEC = 1.0        # 共有モード: 公開済みモデル・共有カウンタを確認する間隔
+FIRST_MODEL_WAIT_SEC = 30      # 共有モード: 学習担当の初回公開を待つ最長時間
+COLD_START_RETRY_SEC = 10      # モデルが無いとき、学習をやり直す最短間隔（新規イベントがある場合のみ）
+WARM_START_ITERATIONS = 5      # 前の版の因子から始める再学習の反復回数
+COLD_START_EVERY = 10          # ウォームスタートがこの回数続いたら一度ランダム初期値から学習し直す
+FOLD_FEED_SIZE = 65536         # 共有モード: ワーカー間で配る fold-in イベントの保持件数（リングバッファ）
+
+# 推薦に使うモデル一式（version で応答元のモデルを識別する）
+# candidates / neighbors は学習後に前計算したユーザー別候補表とアイテム近傍表
+ModelSnapshot = namedtuple(
+    "ModelSnapshot", ["model", "matrix", "version", "trained_at", "candidates", "neighbors"],
+    defaults=[None, None],
+)
+
+EMPTY_SNAPSHOT = ModelSnapshot(None, None, 0, None)
+
+# fold-in 済みユーザーの状態（version はベクトルを計算したモデルの版）
+FoldedUser = namedtuple("FoldedUser", ["vector", "liked", "version", "updated_at"])
+
+
+# ============================================================
+# ALSモデル管理クラス
+# ============================================================
+class ALSModelManager:
+    """ALSモデルを一度だけ学習してメモリに保持し、バックグラウンドで再学習する。
+
+    - get() は常に学習済みのスナップショットを返す（リクエスト中に学習しない）
+    - 再学習は新規イベントが RETRAIN_AFTER_EVENTS 件たまった時点、または
+      RETRAIN_INTERVAL_SEC ごと（新規イベントがある場合のみ）にワーカースレッドが行う
+    - 新しいモデルはスナップショットごと差し替えるので、読み手は常に
+      (model, matrix) の整合した組を受け取る
+    - fold_in() は新規イベントをそのユーザーの因子だけに即時反映する
+      （新規ユーザーもその場で行を追加する）
+
+    shared=True（prefork 配信）では、ファイルロックを取れたワーカーだけが学習し、
+    モデルを model_dir に公開する。ほかのワーカーは公開済みモデルを mmap で開き、
+    SYNC_INTERVAL_SEC ごとに新しい版へ切り替える。新規イベント数と再学習要求は
+    fork 前に作る共有メモリのカウンタで学習担当に伝わる（gunicorn の preload_app 前提）。
+
+    fold-in の状態（ユーザー行とベクトル）はプロセスごとに持つ。共有モードでは fold-in した
+    イベントを共有メモリのリングバッファ（_FoldFeed）にも積み、ほかのワーカーは get() のたびに
+    まだ読んでいない分を自分の fold-in に反映する。どのワーカーが /log_event を受けても、
+    次の /recommend はどのワーカーでもそのイベントを反映した因子で答える。
+
+    persist=True（既定）では学習した版を model_registry に保存し、起動時は保存済みの
+    CURRENT を開いて配信を始める（再起動で学習し直さない）。再学習は前の版の因子から
+    WARM_START_ITERATIONS 回だけ回し、CURRENT がロールバックで固定されている間は行わない。
+    """
+
+    def __init__(self, csv_path=None, retrain_interval=RETRAIN_INTERVAL_SEC,
+                 retrain_after_events=RETRAIN_AFTER_EVENTS, shared=False,
+                 model_dir=mr.MODEL_DIR, persist=True, **train_kwargs):
+        self.csv_path = csv_path
+        self.retrain_interval = retrain_interval
+        self.retrain_after_events = retrain_after_events
+        self.train_kwargs = train_kwargs
+        self.shared = shared
+        self.persist = persist or shared   # 共有モードは保存した版でワーカー間を同期する
+        self.model_dir = model_dir
+
+        self._snapshot = EMPTY_SNAPSHOT
+        self._lock = threading.Lock()          # スナップショット差し替え用
+        self._train_lock = threading.RLock()   # 同時学習の防止用
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._started = threading.Event()     # 初回の起動処理（読み込み・学習）が終わった
+        self._worker = None
+        self._failed_at = None                 # 学習データが無く学習できなかった時刻
+
+        # 新規イベント数と再学習要求（共有モードではワーカー間で共有する）
+        if shared:
+            self._pending = multiprocessing.Value("q", 0)
+            self._force_flag = multiprocessing.Value("b", 0)
+            self._leader = sm.LeaderLock(model_dir)
+            self._feed = _FoldFeed()
+        else:
+            self._pending = _LocalValue(0)
+            self._force_flag = _LocalValue(0)
+            self._leader = None
+            self._feed = None
+
+        # fold-in 用: user_id → {item_id: weight} と計算済みベクトル（プロセスごと）
+        self._fold_lock = threading.Lock()
+        self._folded_rows = {}
+        self._folded = {}
+        self._feed_cursor = 0          # 共有モード: _FoldFeed のどこまで反映したか
+        self._trained_from = 0.0       # 配信中のモデルの学習開始時刻（これより前のイベントは学習済み）
+
+    # ---------- 公開API ----------
+    def get(self):
+        """現在のスナップショットを返す。未起動なら初回学習を同期実行する。
+
+        初回学習でモデルを作れなかった（イベントが無いなど）場合は空のスナップショットを返し、
+        学習のやり直しはワーカーに任せる（リクエストごとに学習し直さない）。
+        """
+        if self._snapshot.version == 0:
+            self.start()
+        if self._feed is not None and self._feed.head != self._feed_cursor:
+            self._catch_up()
+        return self._snapshot
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    @property
+    def is_trainer(self):
+        """このプロセスが学習を担当しているか"""
+        return not self.shared or self._leader.held
+
+    def start(self):
+        """初回学習を行い、再学習ワーカーを起動する（多重起動しない）。
+
+        2回目以降の呼び出しは初回の起動処理が終わるのを待つだけで、学習はしない。
+        """
+        with self._lock:
+            need_worker = self._worker is None
+            if need_worker:
+                self._worker = threading.Thread(
+                    target=self._run, name="als-retrainer", daemon=True
+                )
+        if not need_worker:
+            self._started.wait()
+            return
+        try:
+            self._first_start()
+        finally:
+            self._started.set()
+            self._worker.start()
+
+    def _first_start(self):
+        if self.shared and not self._leader.try_acquire():
+            # 学習担当ではない: 公開済みモデルを開く（まだ無ければ初回公開を待つ）
+            deadline = time.monotonic() + FIRST_MODEL_WAIT_SEC
+            while not self.sync() and self._snapshot.version == 0 and time.monotonic() < deadline:
+                if self._leader.try_acquire():
+                    break
+                time.sleep(SYNC_INTERVAL_SEC / 4)
+        with self._train_lock:
+            if self._snapshot.version == 0 and self.sync() and self.is_trainer:
+                # 保存済みモデルで配信を始め、最新イベントでの学習はワーカーに任せる
+                self._force_flag.value = 1
+            if self._snapshot.version == 0 and self.is_trainer:
+                self.retrain()
+
+    def stop(self, timeout=None):
+        """再学習ワーカーを停止する。"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+
+    def notify_events(self, n=1):
+        """新規イベント数を通知する。閾値に達したら再学習を起こす。"""
+        with self._pending.get_lock():
+            self._pending.value += n
+            reached = self._pending.value >= self.retrain_after_events
+        if reached or self._snapshot.version == 0:
+            self._wakeup.set()
+
+    def request_retrain(self):
+        """次のワーカー周期を待たずに再学習を要求する。"""
+        self._force_flag.value = 1
+        self._wakeup.set()
+
+    def sync(self):
+        """CURRENT が配信中と違う版（新しい版・ロールバック先）なら切り替える。切り替えたら True。"""
+        if not self.persist:
+            return False
+        pointer = mr.current(self.model_dir)
+        if pointer is None or pointer["version"] == self._snapshot.version:
+            return False
+        loaded = mr.load(pointer["name"], self.model_dir)
+        if loaded is None:
+            return False
+        model, matrix, candidates, neighbors, meta = loaded
+        self._install(model, matrix, meta["version"], meta["started_at"], meta["trained_at"],
+                      candidates, neighbors)
+        log.info("🔄 保存済み ALSモデルに切り替えました", version=meta["version"],
+                 pinned=bool(pointer.get("pinned")))
+        return True
+
+    def fold_in(self, user_id, item_id, action):
+        """1件のイベントをユーザー因子に反映する（アイテム因子は固定）。"""
+        return self.fold_in_many([(user_id, item_id, action)]).get(int(user_id))
+
+    def fold_in_many(self, events):
+        """(user_id, item_id, action) の並びをまとめて反映し、{user_id: FoldedUser} を返す。
+
+        ユーザーごとに行をまとめてから因子を計算するので、再計算は1人1回で済む。
+        """
+        snapshot = self.get()
+        if snapshot.model is None:
+            return {}
+
+        updates = {}
+        for user_id, item_id, action in events:
+            weight = ua.ACTIONS_WEIGHT.get(str(action).lower())
+            if weight is not None:
+                updates.setdefault(int(user_id), []).append((int(item_id), weight))
+
+        if self._feed is not None:
+            self._feed.publish(updates, time.time())
+        return self._apply_fold_ins(snapshot, updates)
+
+    def _apply_fold_ins(self, snapshot, updates, updated_at=None):
+        """{user_id: [(item_id, weight)]} を行に足して因子を計算し直す。
+
+        updated_at（{user_id: イベントの時刻}）を省くと今の時刻で記録する。
+        """
+        folded = {}
+        with metrics.stage("als_fold_in"), self._fold_lock:
+            for user_id, weights in updates.items():
+                row = self._folded_rows.get(user_id)
+                if row is None:
+                    row = self._base_row(snapshot, user_id)
+                for item_id, weight in weights:
+                    row[item_id] = row.get(item_id, 0.0) + weight
+                self._folded_rows[user_id] = row
+                folded[user_id] = self._refold(user_id, row, snapshot, touched=True,
+                                               updated_at=(updated_at or {}).get(user_id))
+        return folded
+
+    def _catch_up(self):
+        """共有モード: ほかのワーカーが fold-in したイベントのうち未反映の分を反映する"""
+        with self._fold_lock:
+            cursor = self._feed_cursor
+            updates, updated_at, self._feed_cursor, dropped = self._feed.read(cursor, self._trained_from)
+        if dropped:
+            FOLD_FEED_DROPPED.inc(dropped)
+            log.warning("⚠️ fold-in イベントの一部をほかのワーカーから受け取れませんでした", dropped=dropped)
+        snapshot = self._snapshot
+        if updates and snapshot.model is not None:
+            # 次の再学習で学習済みの分を捨てられるよう、受け取った時刻ではなくイベントの時刻で記録する
+            self._apply_fold_ins(snapshot, updates, updated_at)
+
+    def get_als_scores(self, user_id, snapshot=None, top_n=50):
+        """fold-in 済みならそのベクトルで、そうでなければ候補表（無ければモデル）でスコアを返す。"""
+        snapshot = snapshot or self.get()
+        with metrics.stage("als_score"):
+            return self._score_user(int(user_id), snapshot, top_n)
+
+    def _score_user(self, user_id, snapshot, top_n):
+        if snapshot.model is None:
+            return []
+
+        folded = self._folded.get(user_id)
+        if folded is not None and folded.version != snapshot.version:
+            with self._fold_lock:
+                row = self._folded_rows.get(user_id)
+                folded = self._refold(user_id, row, snapshot) if row else None
+        if folded is not None:
+            return ua.get_als_scores_from_vector(
+                folded.vector, snapshot.model.item_factors, folded.liked, top_n=top_n
+            )
+        if snapshot.candidates is not None:
+            scores = snapshot.candidates.lookup(user_id, top_n)
+            if scores is not None:
+                return scores
+        return ua.get_als_scores(user_id, snapshot.model, snapshot.matrix, top_n=top_n)
+
+    def get_als_scores_batch(self, user_ids, snapshot=None, top_n=50):
+        """複数ユーザーの ALS スコアを1回の行列積でまとめて返す（get_als_scores と同じ結果）。"""
+        snapshot = snapshot or self.get()
+        with metrics.stage("als_score_batch"):
+            return self._score_users(user_ids, snapshot, top_n)
+
+    def _score_users(self, user_ids, snapshot, top_n):
+        user_ids = [int(u) for u in user_ids]
+        results = [[] for _ in user_ids]
+        model, matrix = snapshot.model, snapshot.matrix
+        if model is None or matrix is None:
+            return results
+        if matrix.shape[1] != model.item_factors.shape[0]:
+            log.error("❌ モデルと行列の列数不一致", model=model.item_factors.shape[0], matrix=matrix.shape[1])
+            return results
+
+        # fold-in 済みならそのベクトル、学習済みユーザーなら候補表かモデルの因子を使う
+        slots, vectors, liked = [], [], []
+        for slot, user_id in enumerate(user_ids):
+            folded = self._folded.get(user_id)
+            if folded is not None and folded.version != snapshot.version:
+                with self._fold_lock:
+                    row = self._folded_rows.get(user_id)
+                    folded = self._refold(user_id, row, snapshot) if row else None
+            if folded is None and snapshot.candidates is not None:
+                scores = snapshot.candidates.lookup(user_id, top_n)
+                if scores is not None:
+                    results[slot] = scores
+                    continue
+            if folded is not None:
+                vectors.append(folded.vector)
+                liked.append(folded.liked)
+            elif 0 <= user_id < matrix.shape[0]:
+                vectors.append(model.user_factors[user_id])
+                liked.append(matrix[user_id].indices.tolist())
+            else:
+                continue
+            slots.append(slot)
+
+        if slots:
+            scored = ua.get_als_scores_batch(vectors, model.item_factors, liked, top_n=top_n)
+            for slot, scores in zip(slots, scored):
+                results[slot] = scores
+        return results
+
+    def similar_items(self, item_id, snapshot=None, top_n=10):
+        """ALS のアイテム因子でコサイン類似度の高いアイテム [(item_id, 類似度), ...] を返す。"""
+        snapshot = snapshot or self.get()
+        if snapshot.neighbors is None:
+            return []
+        return snapshot.neighbors.similar(int(item_id), top_n)
+
+    @property
+    def pinned(self):
+        """ロールバックで CURRENT が固定されているか（固定中は再学習しない）"""
+        if not self.persist:
+            return False
+        pointer = mr.current(self.model_dir)
+        return bool(pointer and pointer.get("pinned"))
+
+    def retrain(self):
+        """モデルを学習し、成功したらスナップショットを差し替える。"""
+        with self._train_lock:
+            if self._snapshot.version and self.pinned:
+                log.info("📌 ロールバックで固定中のため再学習しません", version=self._snapshot.version)
+                return self._snapshot
+            consumed = self._pending.value
+            started_at = time.time()
+            ua.flush_user_actions()
+            if self.csv_path is None:
+                ua.get_event_store().compact()
+
+            kwargs = dict(self.train_kwargs)
+            warm = self._warm_start()
+            if warm is not None:
+                kwargs.update(initial_factors=warm[:4], iterations=WARM_START_ITERATIONS)
+            with metrics.stage("als_train"):
+                model, matrix = ua.train_als_model(self.csv_path, **kwargs)
+            if model is None:
+                self._failed_at = time.monotonic()
+                return self._snapshot
+            self._failed_at = None
+            TRAININGS.inc(mode="warm" if warm is not None else "cold")
+
+            with self._pending.get_lock():
+                self._pending.value = max(0, self._pending.value - consumed)
+
+            # 学習済みユーザー全員の上位候補をまとめて前計算する（オンラインは表を引くだけ）
+            with metrics.stage("als_precompute"):
+                candidates = ct.CandidateTable.build(model, matrix)
+                neighbors = inb.ItemNeighbors.build(model.item_factors)
+
+            version = self._snapshot.version + 1
+            if self.persist:
+                # 版番号は保存済みの続き（ロールバック中の古い版からでも番号を戻さない）
+                version = max(version, mr.latest_version(self.model_dir) + 1)
+                meta = {
+                    "warm_start_from": warm[4]["version"] if warm is not None else None,
+                    "warm_chain": warm[4].get("warm_chain", 0) + 1 if warm is not None else 0,
+                    "train_seconds": round(time.time() - started_at, 3),
+                }
+                published = mr.publish(model, matrix, version, started_at, self.model_dir,
+                                       candidates, neighbors, meta=meta)
+                if published is None:
+                    # 学習中にロールバックされた（固定した版を配信し続ける）
+                    self.sync()
+                    return self._snapshot
+            snapshot = self._install(
+                model, matrix, version, started_at, time.time(), candidates, neighbors
+            )
+        log.info("🧠 ALSモデルを学習しました", version=snapshot.version, shape=matrix.shape,
+                 warm_start=warm is not None, seconds=round(time.time() - started_at, 3))
+        return snapshot
+
+    def _warm_start(self):
+        """配信中の版の因子を (user_ids, user_factors, item_ids, item_factors, meta) で返す。
+
+        保存していない・因子数が違う・ウォームスタートが COLD_START_EVERY 回続いた場合は
+        None（ランダム初期値から学習する）。
+        """
+        if not self.persist or self._snapshot.version == 0:
+            return None
+        loaded = mr.load_factors(mr.model_name(self._snapshot.version), self.model_dir)
+        if loaded is None:
+            return None
+        meta = loaded[4]
+        if meta["factors"] != self.train_kwargs.get("factors", meta["factors"]):
+            return None
+        if meta.get("warm_chain", 0) + 1 >= COLD_START_EVERY:
+            return None
+        return loaded
+
+    def _install(self, model, matrix, version, started_at, trained_at,
+                 candidates=None, neighbors=None):
+        """スナップショットを差し替える。学習開始前の fold-in は新しいモデルに含まれるので破棄する。"""
+        with self._fold_lock:
+            for user_id in [u for u, f in self._folded.items() if f.updated_at < started_at]:
+                del self._folded[user_id]
+                self._folded_rows.pop(user_id, None)
+            FOLDED_USERS.set(len(self._folded))
+        with self._lock:
+            self._trained_from = started_at
+            self._snapshot = ModelSnapshot(
+                model, matrix, version, trained_at, candidates, neighbors
+            )
+            MODEL_VERSION.set(version)
+            return self._snapshot
+
+    # ---------- fold-in 内部処理 ----------
+    @staticmethod
+    def _base_row(snapshot, user_id):
+        """学習済み行列にあるユーザーの行を {item_id: weight} で返す。"""
+        matrix = snapshot.matrix
+        if matrix is None or user_id >= matrix.shape[0]:
+            return {}
+        row = matrix[user_id]
+        return dict(zip(row.indices.tolist(), row.data.tolist()))
+
+    def _refold(self, user_id, row, snapshot, touched=False, updated_at=None):
+        vector, user_row = ua.fold_in_user(snapshot.model, row)
+        previous = self._folded.get(user_id)
+        if not touched and previous is not None:
+            updated_at = previous.updated_at
+        elif previous is not None and updated_at is not None:
+            updated_at = max(updated_at, previous.updated_at)
+        folded = FoldedUser(
+            vector,
+            user_row.indices.tolist(),
+            snapshot.version,
+            time.time() if updated_at is None else updated_at,
+        )
+        self._folded[user_id] = folded
+        FOLDED_USERS.set(len(self._folded))
+        return folded
+
+    # ---------- ワーカー ----------
+    def _run(self):
+        last_trained = time.monotonic()
+        while not self._stop.is_set():
+            timeout = max(0.0, self.retrain_interval - (time.monotonic() - last_trained))
+            if self.persist:
+                # 他ワーカーからの通知・ロールバックは共有カウンタと CURRENT で届くので短い周期で確認する
+                timeout = min(timeout, SYNC_INTERVAL_SEC)
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+
+            if not self.is_trainer:
+                # 学習担当ではない: 新しい版を取り込み、担当が落ちていれば引き継ぐ
+                self.sync()
+                if self._leader.try_acquire():
+                    log.info("👑 ALSモデルの学習担当を引き継ぎました")
+                    self.sync()
+                    last_trained = time.monotonic()
+                continue
+
+            # ロールバックされていればその版へ切り替え、固定中は学習しない
+            self.sync()
+            if self.pinned:
+                continue
+            pending = self._pending.value
+            # まだモデルが無い: 新規イベントが届いたら（間隔を空けて）学習をやり直す
+            cold_retry = (
+                self._snapshot.version == 0 and pending > 0
+                and (self._failed_at is None
+                     or time.monotonic() - self._failed_at >= COLD_START_RETRY_SEC)
+            )
+            due = (
+                self._force_flag.value
+                or cold_retry
+                or pending >= self.retrain_after_events
+                or (time.monotonic() - last_trained >= self.retrain_interval
+                    and pending > 0)
+            )
+            if not due:
+                if time.monotonic() - last_trained >= self.retrain_interval:
+                    last_trained = time.monotonic()
+                continue
+            self._force_flag.value = 0
+            try:
+                self.retrain()
+            except Exception as e:
+                log.exception("❌ ALSモデルの再学習に失敗", error=e)
+            last_trained = time.monotonic()
+
+
+class _FoldFeed:
+    """共有モードで fold-in イベントをワーカー間に配るリングバッファ（fork 前に共有メモリに作る）。
+
+    各ワーカーは読んだ位置（cursor）を持ち、ほかのワーカーが積んだ分だけを受け取る。
+    FOLD_FEED_SIZE 件より遅れたワーカーは古い分を取りこぼす（次の再学習で反映される）。
+    """
+
+    def __init__(self, size=FOLD_FEED_SIZE):
+        self.size = size
+        self._ids = multiprocessing.Array("q", size * 3, lock=False)      # (pid, user_id, item_id)
+        self._values = multiprocessing.Array("d", size * 2, lock=False)   # (weight, イベントの時刻)
+        self._head = multiprocessing.Value("q", 0)                         # これまでに積んだ件数
+
+    @property
+    def head(self):
+        return self._head.value
+
+    def publish(self, updates, at):
+        """{user_id: [(item_id, weight)]} を積む"""
+        pid = os.getpid()
+        with self._head.get_lock():
+            head = self._head.value
+            for user_id, weights in updates.items():
+                for item_id, weight in weights:
+                    slot = head % self.size
+                    self._ids[3 * slot:3 * slot + 3] = (pid, user_id, item_id)
+                    self._values[2 * slot:2 * slot + 2] = (weight, at)
+                    head += 1
+            self._head.value = head
+
+    def read(self, cursor, since=0.0):
+        """cursor 以降にほかのプロセスが積んだ since 以後のイベントを返す。
+
+        ({user_id: [(item_id, weight)]}, {user_id: 最後のイベントの時刻}, 新しい cursor, 取りこぼした件数)
+        """
+        pid = os.getpid()
+        updates, updated_at = {}, {}
+        with self._head.get_lock():
+            head = self._head.value
+            start = max(cursor, head - self.size)
+            for position in range(start, head):
+                slot = position % self.size
+                writer, user_id, item_id = self._ids[3 * slot:3 * slot + 3]
+                weight, at = self._values[2 * slot:2 * slot + 2]
+                if writer == pid or at < since:
+                    continue
+                updates.setdefault(user_id, []).append((item_id, weight))
+                updated_at[user_id] = max(at, updated_at.get(user_id, at))
+        return updates, updated_at, head, start - cursor
+
+
+class _LocalValue:
+    """multiprocessing.Value と同じ使い方ができるプロセス内カウンタ"""
+
+    def __init__(self, value):
+        self.value = value
+        self._lock = threading.Lock()
+
+    def get_lock(self):
+        return self._lock
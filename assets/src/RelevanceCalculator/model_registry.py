@@ -0,0 +1,318 @@
+"""学習済み ALS モデルの版ごとの保存先（モデルレジストリ）。
+
+    python model_registry.py list              # 保存済みの版と CURRENT
+    python model_registry.py rollback [版]     # 指定した版（省略時は1つ前）へ戻して固定する
+    python model_registry.py release           # 固定を解除し、再学習による更新を再開する
+
+版ごとにディレクトリを作り、因子・学習行列・前計算の表を npy で、
+行番号 → user_id / item_id の対応表（user_ids.npy / item_ids.npy）と
+学習時の設定・所要時間などを meta.json に書く。読み込みは mmap なので
+起動時に開くのは数ミリ秒で済み、再起動しても学習し直す必要がない。
+
+CURRENT が配信する版を指す。rollback は CURRENT を古い版に向けて pinned にし、
+release するまで学習担当は新しい版を公開しない（各ワーカーは次の確認で切り替わる）。
+CURRENT の読み書きはロックファイルで直列化するので、学習中に rollback しても、
+学習を終えた publish は版を保存するだけで CURRENT と固定はそのまま残る。
+"""
+import argparse
+import contextlib
+import fcntl
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from implicit.als import AlternatingLeastSquares
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))  # ../assets/src/RelevanceCalculator
+SRC_DIR = os.path.dirname(APP_DIR)                    # ../assets/src
+ASSETS_DIR = os.path.dirname(SRC_DIR)                 # ../assets
+
+if SRC_DIR not in sys.path:
+    sys.path.append(SRC_DIR)
+
+from RelevanceCalculator.candidate_table import CandidateTable
+from RelevanceCalculator.item_neighbors import ItemNeighbors
+from Monitoring.log import get_logger
+
+log = get_logger("model_registry")
+
+# ================================
+# 🔧 設定
+# ================================
+MODEL_DIR = os.environ.get("LEARNINGPATH_MODEL_DIR", os.path.join(ASSETS_DIR, "models"))
+CURRENT_FILE = "CURRENT"          # 配信する版を指すファイル
+CURRENT_LOCK_FILE = ".CURRENT.lock"   # CURRENT を読んで書き換える間に取るロック
+KEEP_MODELS = 5                   # 残しておく版の数（切り替え中のワーカー用・ロールバック用）
+
+ARRAYS = ("user_factors", "item_factors", "matrix_data", "matrix_indices", "matrix_indptr")
+ID_ARRAYS = ("user_ids", "item_ids")               # 因子の行番号 → user_id / item_id
+CANDIDATE_ARRAYS = ("items", "scores", "counts")   # candidates_<key>.npy（無い版もある）
+NEIGHBOR_ARRAYS = ("items", "sims", "counts")      # neighbors_<key>.npy（無い版もある）
+
+
+def model_name(version):
+    return f"als-v{version:06d}"
+
+
+def _parse_version(name):
+    try:
+        return int(name[len("als-v"):]) if name.startswith("als-v") else None
+    except ValueError:
+        return None
+
+
+# ============================================================
+# 保存・公開
+# ============================================================
+def publish(model, matrix, version, started_at, root=MODEL_DIR, candidates=None, neighbors=None,
+            meta=None):
+    """モデル（と候補表・近傍表）を版として保存して CURRENT を差し替え、保存先を返す。
+
+    meta には学習の設定や所要時間など、版と一緒に残したい値を渡す。
+    CURRENT がロールバックで固定されていれば版の保存だけにして None を返す。
+    """
+    name = model_name(version)
+    target = os.path.join(root, name)
+    tmp = os.path.join(root, f".{name}.{os.getpid()}.tmp")
+    os.makedirs(tmp, exist_ok=True)
+
+    arrays = {
+        "user_factors": model.user_factors,
+        "item_factors": model.item_factors,
+        # 行列の行・列番号がそのまま user_id / item_id（版をまたいで因子を対応付けるのに使う）
+        "user_ids": np.arange(model.user_factors.shape[0], dtype=np.int64),
+        "item_ids": np.arange(model.item_factors.shape[0], dtype=np.int64),
+        "matrix_data": matrix.data,
+        "matrix_indices": matrix.indices,
+        "matrix_indptr": matrix.indptr,
+    }
+    if candidates is not None:
+        arrays.update({f"candidates_{key}": a for key, a in candidates.arrays().items()})
+    if neighbors is not None:
+        arrays.update({f"neighbors_{key}": a for key, a in neighbors.arrays().items()})
+    for key, array in arrays.items():
+        np.save(os.path.join(tmp, f"{key}.npy"), np.ascontiguousarray(array))
+
+    meta = {
+        **(meta or {}),
+        "version": version,
+        "factors": int(model.item_factors.shape[1]),
+        "regularization": float(model.regularization),
+        "iterations": int(model.iterations),
+        "shape": list(matrix.shape),
+        "nnz": int(matrix.nnz),
+        "started_at": started_at,
+        "trained_at": time.time(),
+        "candidates_built_at": candidates.built_at if candidates is not None else None,
+        "neighbors_built_at": neighbors.built_at if neighbors is not None else None,
+        "neighbors_mode": neighbors.mode if neighbors is not None else None,
+    }
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    os.replace(tmp, target)
+
+    with _current_lock(root):
+        pointer = current(root)
+        pinned = bool(pointer and pointer.get("pinned"))
+        if not pinned:
+            set_current(version, root)
+        _prune(root, keep={name, pointer["name"] if pointer else name})
+    if pinned:
+        log.info("📌 ロールバックで固定中のため、保存だけして CURRENT は変えません",
+                 version=version, current=pointer["version"])
+        return None
+    return target
+
+
+@contextlib.contextmanager
+def _current_lock(root):
+    """CURRENT を読んでから書き換えるまでの間、ほかのプロセスの書き換えを待たせる"""
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, CURRENT_LOCK_FILE), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def set_current(version, root=MODEL_DIR, pinned=False):
+    """CURRENT を版 version に向ける（読み手は新旧どちらかを見る。固定の確認は呼び出し側で）"""
+    pointer = os.path.join(root, f".{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(pointer, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "name": model_name(version), "pinned": pinned}, f)
+    os.replace(pointer, os.path.join(root, CURRENT_FILE))
+
+
+def _prune(root, keep):
+    """keep（版名の集合）以外の古い版を消し、KEEP_MODELS 個まで残す"""
+    names = sorted(n for n in os.listdir(root) if _parse_version(n) is not None and n not in keep)
+    for name in names[:max(0, len(names) - (KEEP_MODELS - 1))]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+# ============================================================
+# 参照
+# ============================================================
+def current(root=MODEL_DIR):
+    """配信中の {"version", "name", "pinned"} を返す（無ければ None）"""
+    try:
+        with open(os.path.join(root, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def read_meta(name, root=MODEL_DIR):
+    with open(os.path.join(root, name, "meta.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def versions(root=MODEL_DIR):
+    """保存済みの版の meta を版番号順に返す"""
+    if not os.path.isdir(root):
+        return []
+    metas = []
+    for name in os.listdir(root):
+        if _parse_version(name) is None:
+            continue
+        try:
+            metas.append(read_meta(name, root))
+        except (OSError, ValueError):
+            continue
+    return sorted(metas, key=lambda m: m["version"])
+
+
+def latest_version(root=MODEL_DIR):
+    """保存済みの最大の版番号（新しい版はこれより大きい番号にする）"""
+    found = [_parse_version(n) for n in os.listdir(root)] if os.path.isdir(root) else []
+    return max([v for v in found if v is not None], default=0)
+
+
+def load(name, root=MODEL_DIR):
+    """保存済みモデルを mmap で開き (model, matrix, candidates, neighbors, meta) を返す。
+
+    開けなければ None。前計算の表が無い版では candidates / neighbors が None になる。
+    """
+    path = os.path.join(root, name)
+    try:
+        meta = read_meta(name, root)
+        # 因子は fold-in（recalculate_user）が書き込み可能なバッファを要求するので
+        # copy-on-write で開く（書き換えない限りページは全ワーカーで共有される）
+        arrays = {
+            key: np.load(os.path.join(path, f"{key}.npy"),
+                         mmap_mode="c" if key.endswith("factors") else "r")
+            for key in ARRAYS
+        }
+        candidates = None
+        if meta.get("candidates_built_at") is not None:
+            candidates = CandidateTable(
+                *(np.load(os.path.join(path, f"candidates_{key}.npy"), mmap_mode="r")
+                  for key in CANDIDATE_ARRAYS),
+                built_at=meta["candidates_built_at"],
+            )
+        neighbors = None
+        if meta.get("neighbors_built_at") is not None:
+            neighbors = ItemNeighbors(
+                *(np.load(os.path.join(path, f"neighbors_{key}.npy"), mmap_mode="r")
+                  for key in NEIGHBOR_ARRAYS),
+                mode=meta["neighbors_mode"],
+                built_at=meta["neighbors_built_at"],
+            )
+    except (OSError, ValueError) as e:
+        log.warning("⚠️ 保存済みモデルを読み込めません", path=path, error=e)
+        return None
+
+    model = AlternatingLeastSquares(factors=meta["factors"], regularization=meta["regularization"])
+    model.user_factors = arrays["user_factors"]
+    model.item_factors = arrays["item_factors"]
+    matrix = csr_matrix(
+        (arrays["matrix_data"], arrays["matrix_indices"], arrays["matrix_indptr"]),
+        shape=tuple(meta["shape"]),
+        copy=False,
+    )
+    return model, matrix, candidates, neighbors, meta
+
+
+def load_factors(name, root=MODEL_DIR):
+    """ウォームスタート用に (user_ids, user_factors, item_ids, item_factors, meta) を返す（無ければ None）"""
+    path = os.path.join(root, name)
+    try:
+        meta = read_meta(name, root)
+        arrays = {key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode="r")
+                  for key in ("user_factors", "item_factors")}
+        for key, factors in (("user_ids", arrays["user_factors"]), ("item_ids", arrays["item_factors"])):
+            id_path = os.path.join(path, f"{key}.npy")
+            # 対応表の無い古い版は行番号 = id とみなす
+            arrays[key] = (np.load(id_path, mmap_mode="r") if os.path.exists(id_path)
+                           else np.arange(factors.shape[0], dtype=np.int64))
+    except (OSError, ValueError) as e:
+        log.warning("⚠️ ウォームスタート用の因子を読み込めません", path=path, error=e)
+        return None
+    return arrays["user_ids"], arrays["user_factors"], arrays["item_ids"], arrays["item_factors"], meta
+
+
+# ============================================================
+# ロールバック
+# ============================================================
+def rollback(version=None, root=MODEL_DIR):
+    """CURRENT を version（省略時は配信中の1つ前の版）に向けて固定し、その meta を返す"""
+    with _current_lock(root):
+        pointer = current(root)
+        available = [m["version"] for m in versions(root)]
+        if version is None:
+            older = [v for v in available if pointer is None or v < pointer["version"]]
+            if not older:
+                raise ValueError("戻せる古い版がありません")
+            version = older[-1]
+        if version not in available:
+            raise ValueError(f"版 {version} は保存されていません（保存済み: {available}）")
+        set_current(version, root, pinned=True)
+    log.info("⏪ ALSモデルを以前の版に戻しました", version=version)
+    return read_meta(model_name(version), root)
+
+
+def release(root=MODEL_DIR):
+    """ロールバックの固定を解除する（次の再学習から新しい版の公開を再開する）"""
+    with _current_lock(root):
+        pointer = current(root)
+        if pointer is None:
+            return None
+        set_current(pointer["version"], root, pinned=False)
+    return pointer["version"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=("list", "rollback", "release"))
+    parser.add_argument("version", type=int, nargs="?", default=None)
+    parser.add_argument("--root", default=MODEL_DIR)
+    args = parser.parse_args()
+
+    if args.command == "rollback":
+        meta = rollback(args.version, args.root)
+        print(f"⏪ 版 {meta['version']} に戻して固定しました（release で固定を解除）")
+    elif args.command == "release":
+        version = release(args.root)
+        print(f"🔓 版 {version} の固定を解除しました" if version else "CURRENT がありません")
+
+    pointer = current(args.root)
+    for meta in versions(args.root):
+        mark = "*" if pointer and pointer["version"] == meta["version"] else " "
+        pinned = " (pinned)" if mark == "*" and pointer.get("pinned") else ""
+        warm = f"warm<-v{meta['warm_start_from']}" if meta.get("warm_start_from") else "cold"
+        print(f"{mark} v{meta['version']:<5} shape={meta['shape']} nnz={meta.get('nnz', '-')} "
+              f"factors={meta['factors']} iter={meta.get('iterations', '-')} {warm} "
+              f"train={meta.get('train_seconds', 0):.2f}s "
+              f"trained_at={time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(meta['trained_at']))}{pinned}")
+
+
+if __name__ == "__main__":
+    main()
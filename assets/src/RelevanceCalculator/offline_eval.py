@@ -0,0 +1,307 @@
+"""ALS とスコア統合のパラメータを、推薦の質と学習・配信コストの両面からオフライン評価する。
+
+    python offline_eval.py [--k 3 10] [--factors 8 20 64] [--regularization 0.01 0.1]
+                           [--iterations 5 20] [--w1 0.3 0.7 1.0] [--min-recall 0.3] [--out eval.json]
+                           [--min-users 30]
+
+user_events.csv をユーザーごとに時刻順に並べ、最後に触れたアイテムを正解として取り置く
+（leave-last-out）。そのアイテムへのイベントは学習から外し、正解の直前に触れたアイテムの
+タイトル（そのとき開いていたページ）を /recommend と同じく BM25 の keyword に使う。
+正解のイベント自身の from は、正解に触れた後のページを指すことがあるので使わない。
+
+評価できるのは、正解とは別のアイテムにも触れたユーザーだけで、それが --min-users
+（既定 MIN_EVAL_USERS 人）に満たなければ指標がほぼ 0 か 1 に張り付いて比べられないので、
+評価せずにエラーで止める。
+
+ALS の設定ごとに1プロセスで学習し（Linux では fork で CPU コア数まで並列、fork を安全に
+使えない macOS・Windows では直列）、各 w1（w2 = 1 - w1）について recall@k / NDCG@k と、
+学習時間・1問い合わせあたりの所要時間・因子のメモリ量を出す。
+--min-recall を渡すと、それを満たす中で最も安い設定を表示する。
+"""
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))  # ../assets/src/RelevanceCalculator
+SRC_DIR = os.path.dirname(APP_DIR)                    # ../assets/src
+
+if SRC_DIR not in sys.path:
+    sys.path.append(SRC_DIR)
+
+from RelevanceCalculator import user_action as ua
+from LearningPathManager import score_fusion as fusion
+from Monitoring.log import get_logger
+
+log = get_logger("offline_eval")
+
+# ================================
+# 🔧 評価の既定値
+# ================================
+DEFAULT_K = (3, 10)                      # recall / NDCG を測る件数（3 は /recommend の既定 top_n）
+DEFAULT_FACTORS = (8, 20, 64)
+DEFAULT_REGULARIZATION = (0.01, 0.1, 1.0)
+DEFAULT_ITERATIONS = (5, 20)
+DEFAULT_W1 = (0.0, 0.3, 0.5, 0.7, 1.0)   # BM25 の重み（ALS の重みは 1 - w1）
+ALS_TOP_N = 50                           # /recommend と同じく ALS は上位 50 件だけ使う
+SEED = 0
+MIN_EVAL_USERS = 30                      # これより評価できるユーザーが少なければ止める
+
+# 評価用の1問い合わせ（user の学習データに target は含まれない）
+EvalCase = namedtuple("EvalCase", ["user_id", "keyword", "target"])
+
+
+# ============================================================
+# データ分割（leave-last-out）
+# ============================================================
+def load_events(csv_path=ua.LOG_FILE):
+    """user_events.csv から重みのあるイベントを (時刻, user_id, item_id, action, from) で読む"""
+    events = []
+    with open(csv_path, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            action = (row.get("action") or "").lower()
+            if action not in ua.ACTIONS_WEIGHT:
+                continue
+            try:
+                user_id, item_id = int(row["user_id"]), int(row["item_id"])
+            except (TypeError, ValueError):
+                continue
+            if user_id < 0 or item_id < 0:
+                continue
+            events.append((row["timestamp"], user_id, item_id, action, row.get("from") or ""))
+    events.sort(key=lambda e: e[0])
+    return events
+
+
+def leave_last_out(events, num_items, title_of=lambda item_id: None):
+    """ユーザーごとに最後に触れたアイテムを取り置き、(学習行列, 評価ケース) を返す。
+
+    click → navigate のように同じアイテムへのイベントが続くので、正解アイテムへの
+    イベントはすべて学習から外す。学習に残るアイテムが無いユーザーは評価しない。
+    keyword は正解に初めて触れる直前のアイテムのタイトル（title_of で引く）。
+    """
+    by_user = {}
+    for event in events:
+        by_user.setdefault(event[1], []).append(event)
+
+    rows, cols, weights, cases = [], [], [], []
+    for user_id, user_events in by_user.items():
+        target = user_events[-1][2]
+        history = [e for e in user_events if e[2] != target]
+        if not history:
+            continue
+        first = next(i for i, e in enumerate(user_events) if e[2] == target)
+        context = user_events[first - 1][2] if first > 0 else history[-1][2]
+        keyword = fusion.normalize_keyword(title_of(context))
+        for _, _, item_id, action, _ in history:
+            rows.append(user_id)
+            cols.append(item_id)
+            weights.append(ua.ACTIONS_WEIGHT[action])
+        cases.append(EvalCase(user_id, keyword, target))
+
+    num_users = max(by_user) + 1 if by_user else 0
+    num_items = max([num_items] + [c + 1 for c in cols])
+    matrix = csr_matrix((weights, (rows, cols)), shape=(num_users, num_items), dtype=np.float32)
+    matrix.sum_duplicates()
+    return matrix, cases
+
+
+# ============================================================
+# 評価（ワーカープロセス側）
+# ============================================================
+# fork したワーカーが参照する評価データ（親で一度だけ用意する）
+_state = {}
+
+
+def _rank_metrics(top_ids, target, k):
+    """(recall@k, NDCG@k)。正解は1件なので recall はヒット率と同じ。"""
+    hits = np.flatnonzero(top_ids[:k] == target)
+    if len(hits) == 0:
+        return 0.0, 0.0
+    return 1.0, 1.0 / np.log2(hits[0] + 2)
+
+
+def evaluate_config(config):
+    """ALS の設定1つを学習し、すべての w1 について質とコストを測る"""
+    train, cases, items, bm25 = _state["train"], _state["cases"], _state["items"], _state["bm25"]
+    ks, weights = _state["ks"], _state["w1"]
+    max_k = max(ks)
+
+    started = time.perf_counter()
+    model = ua.fit_als_model(train, config["factors"], config["regularization"], config["iterations"],
+                             random_state=SEED, num_threads=1)
+    train_s = time.perf_counter() - started
+
+    scores = {(w1, k): [] for w1 in weights for k in ks}
+    als_ms, fusion_ms = [], {w1: [] for w1 in weights}
+    for case in cases:
+        t0 = time.perf_counter()
+        als = ua.get_als_scores(case.user_id, model, train, top_n=ALS_TOP_N)
+        als_array = fusion.als_scores_to_array(als, items)
+        als_ms.append(1000 * (time.perf_counter() - t0))
+
+        for w1 in weights:
+            t0 = time.perf_counter()
+            top, _ = fusion.recommend_positions(
+                bm25[case.keyword], als_array, items, case.keyword, w1=w1, w2=1.0 - w1, top_n=max_k
+            )
+            fusion_ms[w1].append(1000 * (time.perf_counter() - t0))
+            top_ids = items.item_ids[top]
+            for k in ks:
+                scores[(w1, k)].append(_rank_metrics(top_ids, case.target, k))
+
+    results = []
+    for w1 in weights:
+        query_ms = np.asarray(als_ms) + np.asarray(fusion_ms[w1])
+        result = {
+            **config,
+            "w1": w1,
+            "w2": round(1.0 - w1, 6),
+            "train_s": train_s,
+            "query_p50_ms": float(np.percentile(query_ms, 50)),
+            "query_p99_ms": float(np.percentile(query_ms, 99)),
+            "model_bytes": int(model.user_factors.nbytes + model.item_factors.nbytes),
+        }
+        for k in ks:
+            pairs = np.asarray(scores[(w1, k)])
+            result[f"recall@{k}"] = float(pairs[:, 0].mean())
+            result[f"ndcg@{k}"] = float(pairs[:, 1].mean())
+        results.append(result)
+    return results
+
+
+# ============================================================
+# 実行
+# ============================================================
+def _pool_context():
+    """並列評価に使う fork の context。fork を安全に使えない環境では None（直列で評価する）。
+
+    評価データはワーカーへ送らず fork で共有するので、spawn では使えない。macOS の fork は
+    BLAS（Accelerate）と組み合わせると落ちることがあり、Windows には fork が無い。
+    """
+    if not sys.platform.startswith("linux") or "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    return multiprocessing.get_context("fork")
+
+
+def sweep(csv_path, ks, factors, regularization, iterations, weights, workers=None,
+          min_users=MIN_EVAL_USERS):
+    """全設定を評価して結果のリストを返す（BM25 は keyword ごとに親で一度だけ計算する）"""
+    from InteresrEstimator import related_content_finder as rcf
+
+    items, _ = rcf.get_bm25_index()
+    events = load_events(csv_path)
+    train, cases = leave_last_out(events, int(items.item_ids.max()) + 1 if len(items) else 0, items.title)
+    if len(cases) < min_users:
+        raise ValueError(
+            f"評価できるユーザーが {len(cases)} 人しかいません（2つ以上のアイテムに触れたユーザーが "
+            f"{min_users} 人以上必要。--min-users で変えられます）: {csv_path}"
+        )
+
+    started = time.perf_counter()
+    bm25 = {keyword: rcf.get_bm25_score_array(keyword)[1] for keyword in {c.keyword for c in cases}}
+    bm25_ms = 1000 * (time.perf_counter() - started) / len(bm25)
+
+    _state.update(train=train, cases=cases, items=items, bm25=bm25, ks=tuple(ks), w1=tuple(weights))
+    configs = [
+        {"factors": f, "regularization": r, "iterations": i}
+        for f, r, i in itertools.product(factors, regularization, iterations)
+    ]
+    log.info("🧪 オフライン評価を開始します", users=len(cases), events=len(events),
+             train_nnz=int(train.nnz), configs=len(configs), weights=len(weights))
+
+    # 評価データは fork で共有する（ワーカーへ送るのは設定だけ）。fork できなければ直列
+    context = _pool_context()
+    if context is None or workers == 1:
+        results = [r for config in configs for r in evaluate_config(config)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=context) as pool:
+            results = [r for batch in pool.map(evaluate_config, configs) for r in batch]
+
+    summary = {
+        "csv": csv_path,
+        "users": len(cases),
+        "events": len(events),
+        "train_shape": list(train.shape),
+        "train_nnz": int(train.nnz),
+        "bm25_ms_per_keyword": bm25_ms,
+    }
+    return summary, results
+
+
+def cheapest(results, metric, bar):
+    """metric が bar 以上の設定のうち、学習時間 → 問い合わせ時間 → メモリの順に最も安いもの"""
+    passing = [r for r in results if r[metric] >= bar]
+    if not passing:
+        return None
+    return min(passing, key=lambda r: (r["train_s"], r["query_p50_ms"], r["model_bytes"]))
+
+
+def print_results(results, ks, limit):
+    primary = f"ndcg@{ks[0]}"
+    ranked = sorted(results, key=lambda r: (-r[primary], r["train_s"]))
+    header = (f"{'factors':>7} {'reg':>6} {'iter':>4} {'w1':>4} | "
+              + " ".join(f"{'R@' + str(k):>6} {'N@' + str(k):>6}" for k in ks)
+              + f" | {'train s':>7} {'q p50 ms':>8} {'q p99 ms':>8} {'KB':>7}")
+    print(header)
+    for r in ranked[:limit]:
+        print(f"{r['factors']:>7} {r['regularization']:>6g} {r['iterations']:>4} {r['w1']:>4g} | "
+              + " ".join(f"{r[f'recall@{k}']:>6.3f} {r[f'ndcg@{k}']:>6.3f}" for k in ks)
+              + f" | {r['train_s']:>7.3f} {r['query_p50_ms']:>8.3f} {r['query_p99_ms']:>8.3f} "
+              f"{r['model_bytes'] / 1024:>7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--csv", default=ua.LOG_FILE, help="評価に使うイベントログ")
+    parser.add_argument("--k", type=int, nargs="+", default=list(DEFAULT_K))
+    parser.add_argument("--factors", type=int, nargs="+", default=list(DEFAULT_FACTORS))
+    parser.add_argument("--regularization", type=float, nargs="+", default=list(DEFAULT_REGULARIZATION))
+    parser.add_argument("--iterations", type=int, nargs="+", default=list(DEFAULT_ITERATIONS))
+    parser.add_argument("--w1", type=float, nargs="+", default=list(DEFAULT_W1))
+    parser.add_argument("--workers", type=int, default=None, help="並列プロセス数（既定: CPU コア数）")
+    parser.add_argument("--min-users", type=int, default=MIN_EVAL_USERS, help="評価に必要なユーザー数の下限")
+    parser.add_argument("--min-recall", type=float, default=None, help="recall@k（k は --k の先頭）の下限")
+    parser.add_argument("--top", type=int, default=20, help="表示する上位件数")
+    parser.add_argument("--out", default=None, help="全結果を JSON で保存する")
+    args = parser.parse_args()
+
+    try:
+        summary, results = sweep(args.csv, args.k, args.factors, args.regularization,
+                                 args.iterations, args.w1, args.workers, args.min_users)
+    except ValueError as e:
+        log.error("❌ オフライン評価を中止しました", error=e)
+        sys.exit(1)
+    print(f"users={summary['users']} events={summary['events']} train={summary['train_shape']} "
+          f"nnz={summary['train_nnz']} bm25={summary['bm25_ms_per_keyword']:.2f}ms/keyword\n")
+    print_results(results, args.k, args.top)
+
+    best = None
+    if args.min_recall is not None:
+        metric = f"recall@{args.k[0]}"
+        best = cheapest(results, metric, args.min_recall)
+        if best is None:
+            print(f"\n⚠️ {metric} >= {args.min_recall} を満たす設定はありません")
+        else:
+            print(f"\n✅ {metric} >= {args.min_recall} で最も安い設定: factors={best['factors']} "
+                  f"regularization={best['regularization']} iterations={best['iterations']} "
+                  f"w1={best['w1']} w2={best['w2']} ({metric}={best[metric]:.3f}, "
+                  f"train={best['train_s']:.3f}s, query p50={best['query_p50_ms']:.3f}ms)")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({**summary, "results": results, "cheapest": best}, f, ensure_ascii=False, indent=2)
+        print(f"💾 結果を保存しました: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
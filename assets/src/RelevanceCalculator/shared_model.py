@@ -0,0 +1,54 @@
+"""prefork で学習済み ALS モデルをプロセス間で共有するときの学習担当の選出。
+
+学習は1プロセス（リーダー）だけが行い、モデルレジストリ（model_registry.py）に
+版として公開する。ほかのワーカーはそれを mmap で開くので、因子の実体は
+ページキャッシュ上の1つだけになる。CURRENT を書き換えると各ワーカーが
+次の確認で新しい版に切り替わる（再起動は不要）。
+"""
+import fcntl
+import os
+
+from RelevanceCalculator.model_registry import MODEL_DIR
+
+# ================================
+# 🔧 設定
+# ================================
+LEADER_LOCK_FILE = ".trainer.lock"
+
+
+# ============================================================
+# 学習担当（リーダー）の選出
+# ============================================================
+class LeaderLock:
+    """ファイルロックで学習担当を1プロセスに絞る。
+
+    ロックはプロセスが生きている間保持され、落ちれば OS が解放するので
+    残ったワーカーのどれかが次の try_acquire() で引き継ぐ。
+    """
+
+    def __init__(self, root=MODEL_DIR):
+        self.path = os.path.join(root, LEADER_LOCK_FILE)
+        self._fd = None
+
+    @property
+    def held(self):
+        return self._fd is not None
+
+    def try_acquire(self):
+        if self._fd is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
@@ -1,12 +1,20 @@
 
-import csv
 import os
+import threading
 
 import numpy as np
 import pandas as pd
 
 from scipy.sparse import csr_matrix
 from implicit.als import AlternatingLeastSquares
+
+from RelevanceCalculator import event_writer as ew
+from RelevanceCalculator import event_store as es
+from ContentManager.item_catalog import catalog
+from Monitoring.log import get_logger
+
+log = get_logger("user_action")
+
 # ================================
 # 🔧 設定
 # ================================
@@ -16,11 +24,16 @@ ASSETS_DIR = os.path.dirname(SRC_DIR)                 # ../assets
 ROOT_DIR = os.path.dirname(ASSETS_DIR)                # ../MyApp
 
 CONTENT_DIR = os.path.join(ASSETS_DIR, "content")
-LOG_DIR = os.path.join(ASSETS_DIR, "logs")
+LOG_DIR = os.environ.get("LEARNINGPATH_LOG_DIR", os.path.join(ASSETS_DIR, "logs"))
 
 LOG_FILE = os.path.join(LOG_DIR, "user_events.csv")
 ITEMS_CSV = os.path.join(CONTENT_DIR, "items.csv")
 
+LOG_HEADER = ["timestamp", "user_id", "item_id", "action", "action_id", "from"]
+LOG_DURABILITY = ew.DURABILITY_FLUSH   # イベントログの永続性モード
+KEEP_CSV_LOG = True                    # 人が読む用の user_events.csv も残すか
+TRAIN_WINDOW_DAYS = None               # 学習に使う直近日数（None なら全期間）
+
 # ================================
 # ⚙️ action → action_id マップ
 # ================================
@@ -39,54 +52,104 @@ ACTIONS_WEIGHT = {
 # 🗂️ items.csv のロード関数
 # ================================
 def load_items_map():
-    """items.csv から {title: item_id} の辞書を作成"""
-    mapping = {}
-    if not os.path.exists(ITEMS_CSV):
-        print(f"⚠️ {ITEMS_CSV} が存在しません。title→id変換ができません。")
-        return mapping
-
-    with open(ITEMS_CSV, "r", encoding="utf-8-sig") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            print("row:", row)  # デバッグ用に行データを表示
-            title = row.get("title")
-            item_id = row.get("item_id")
-            print("Loaded item:", title, item_id)  # デバッグ用に読み込んだアイテムを表示
-            if title and item_id:
-                mapping[title.strip()] = item_id.strip()
-    return mapping
+    """items.csv から {title: item_id} の辞書を作成（共有カタログから作る）"""
+    data = catalog.data
+    return {title: str(item_id) for title, item_id in data.title_to_id.items() if title}
 
 # ================================
 # 📝 ユーザーアクションログ記録関数
 # ================================
 def log_user_action(user_id, item_id, action, from_page="", timestamp=""):
-    """ユーザーアクションをCSVに記録する"""
+    """ユーザーアクションをCSVに記録する（書き込みはイベントライターがまとめて行う）"""
 
-    # ログフォルダを作成
-    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+    # action → action_id 変換
+    action_id = ACTION_MAP.get(str(action).lower(), 0)
 
-    # CSVファイルが存在しなければ、ヘッダーを書き込む
-    write_header = not os.path.exists(LOG_FILE)
+    get_event_writer().submit([timestamp, user_id, item_id, action, action_id, from_page])
 
-    # action → action_id 変換
-    action_id = ACTION_MAP.get(action.lower(), 0)
+def log_user_actions(events):
+    """複数のユーザーアクションをまとめて記録する。
+
+    events は (user_id, item_id, action, from_page, timestamp) の並び。
+    一度にキューへ積むので、同じグループコミットで書き込まれる。
+    """
+    get_event_writer().submit_many([
+        [timestamp, user_id, item_id, action, ACTION_MAP.get(str(action).lower(), 0), from_page]
+        for user_id, item_id, action, from_page, timestamp in events
+    ])
 
-    # CSV追記
-    with open(LOG_FILE, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        if write_header:
-            writer.writerow(["timestamp", "user_id", "item_id", "action", "action_id", "from"])
-        writer.writerow([timestamp, user_id, item_id, action, action_id, from_page])
+def coerce_event_row(row):
+    """ログ行 [timestamp, user_id, item_id, action, action_id, from] を検査して型を揃える。
 
-    print(f"📝 user_events に記録: user_id={user_id}, item_id={item_id}, action={action}")
+    user_id / item_id / action_id が整数にできない・action が文字列でない行は ValueError。
+    イベントライターが submit 時に呼ぶので、不正な行はキューに入らない。
+    """
+    try:
+        timestamp, user_id, item_id, action, action_id, from_page = row
+    except (TypeError, ValueError):
+        raise ValueError(f"ログ行の列数が不正です: {row!r}") from None
+    if not isinstance(action, str):
+        raise ValueError(f"action は文字列で指定してください: {action!r}")
+    try:
+        user_id, item_id, action_id = int(user_id), int(item_id), int(action_id)
+    except (TypeError, ValueError):
+        raise ValueError(f"user_id / item_id は整数で指定してください: {row!r}") from None
+    return ["" if timestamp is None else str(timestamp), user_id, item_id, action, action_id,
+            "" if from_page is None else str(from_page)]
+
+_event_writer = None
+_event_store = None
+_event_writer_lock = threading.Lock()
+
+def get_event_store():
+    """共有イベントストアを返す（初回に user_events.csv から一度だけ移行）"""
+    global _event_store
+    if _event_store is None:
+        with _event_writer_lock:
+            if _event_store is None:
+                store = es.EventStore()
+                migrated = store.migrate_from_csv(LOG_FILE)
+                if migrated:
+                    log.info("📦 user_events.csv をイベントストアへ移行しました", path=LOG_FILE, events=migrated)
+                _event_store = store
+    return _event_store
+
+def get_event_writer():
+    """LOG_FILE / イベントストア用の共有イベントライターを返す（初回に起動）"""
+    global _event_writer
+    if _event_writer is None:
+        store = get_event_store()
+        with _event_writer_lock:
+            if _event_writer is None:
+                _event_writer = ew.open_event_writer(
+                    LOG_FILE if KEEP_CSV_LOG else None,
+                    header=LOG_HEADER,
+                    durability=LOG_DURABILITY,
+                    on_commit=store.append_rows,
+                    validate=coerce_event_row,
+                )
+    return _event_writer
+
+def flush_user_actions():
+    """キューに残っているイベントをログファイルへ書き切る"""
+    if _event_writer is not None:
+        _event_writer.flush()
 
 # ============================================================
-# ALSモデルの訓練関数
+# 学習用の行列を読み込む関数
 # ============================================================
-def train_als_model(csv_path=LOG_FILE, factors=20, regularization=0.1, iterations=20):
+def load_interaction_matrix(csv_path=None, window_days=TRAIN_WINDOW_DAYS):
+    """学習用の (users × items) 行列を作る。
+
+    csv_path を省略するとイベントストアから読み込む（テキスト解析なし）。
+    csv_path を渡した場合は従来どおりCSVを解析する。
+    """
+    if csv_path is None:
+        return get_event_store().load_matrix(window_days)
+
     if not os.path.exists(csv_path):
-        print(f"❌ {csv_path} が見つかりません。学習をスキップします。")
-        return None, None
+        log.error("❌ ログCSVが見つかりません。学習をスキップします。", path=csv_path)
+        return None
 
     df = pd.read_csv(csv_path)
 
@@ -102,51 +165,110 @@ def train_als_model(csv_path=LOG_FILE, factors=20, regularization=0.1, iteration
     num_users = int(df["user_id"].max()) + 1
     num_items = int(df["item_id"].max()) + 1
 
-    # print(f"🧠 ALSモデル訓練中... 行列 shape=({num_users}, {num_items})")
-
     # 🔧 全てのitem_idを含む疎行列を生成
-    matrix = csr_matrix(
+    return csr_matrix(
         (df["weight"], (df["user_id"], df["item_id"])),
         shape=(num_users, num_items)
     )
 
+# ============================================================
+# ALSモデルの訓練関数
+# ============================================================
+def train_als_model(csv_path=None, factors=20, regularization=0.1, iterations=20,
+                    window_days=TRAIN_WINDOW_DAYS, initial_factors=None):
+    matrix = load_interaction_matrix(csv_path, window_days)
+    if matrix is None:
+        log.warning("⚠️ 学習データがありません。学習をスキップします。")
+        return None, None
+
+    # print(f"🧠 ALSモデル訓練中... 行列 shape={matrix.shape}")
+
+    model = fit_als_model(matrix, factors, regularization, iterations, initial_factors=initial_factors)
+
+    # print(f"✅ ALSモデル訓練完了: users={matrix.shape[0]}, items={matrix.shape[1]}")
+    # print(f"   model.item_factors.shape={model.item_factors.shape}")
+
+    return model, matrix
+
+def fit_als_model(matrix, factors=20, regularization=0.1, iterations=20, initial_factors=None,
+                  **als_kwargs):
+    """(users × items) 行列から ALS モデルを学習する（オフライン評価からも使う）
+
+    initial_factors=(user_ids, user_factors, item_ids, item_factors) を渡すと
+    前の版の因子から学習を始める（ウォームスタート）。id が一致する行は引き継ぎ、
+    新しいユーザー・アイテムの行は implicit と同じく小さな乱数で初期化する。
+    """
     # ALSモデルを構築
     model = AlternatingLeastSquares(
         factors=factors,
         regularization=regularization,
-        iterations=iterations
+        iterations=iterations,
+        **als_kwargs
     )
 
-    # 🚨 ここが重要：全アイテム列を含む転置行列を渡す
-    model.fit(matrix)
+    if initial_factors is not None:
+        user_ids, user_factors, item_ids, item_factors = initial_factors
+        if user_factors.shape[1] == factors and item_factors.shape[1] == factors:
+            rng = np.random.default_rng(als_kwargs.get("random_state"))
+            model.user_factors = _align_factors(user_ids, user_factors, matrix.shape[0], rng)
+            model.item_factors = _align_factors(item_ids, item_factors, matrix.shape[1], rng)
+        else:
+            log.info("ℹ️ 因子数が変わったのでウォームスタートしません",
+                     previous=user_factors.shape[1], factors=factors)
 
-    # print(f"✅ ALSモデル訓練完了: users={num_users}, items={num_items}")
-    # print(f"   model.item_factors.shape={model.item_factors.shape}")
+    # 🚨 ここが重要：全アイテム列を含む転置行列を渡す
+    model.fit(matrix, show_progress=False)
+    return model
 
-    return model, matrix
+def _align_factors(ids, factors, rows, rng):
+    """行番号 = id の (rows × factors) 行列に、前の版で同じ id だった行の因子を写す"""
+    aligned = rng.random((rows, factors.shape[1]), dtype=np.float32) * 0.01
+    ids = np.asarray(ids)
+    keep = (ids >= 0) & (ids < rows)
+    aligned[ids[keep]] = factors[np.flatnonzero(keep)]
+    return aligned
 
 # ============================================================
 # タイトル → item_id 変換関数
 # ============================================================
 def title_to_item_id(title):
-    try:
-        items_df = pd.read_csv(ITEMS_CSV)
-        title_to_id = dict(zip(items_df["title"], items_df["item_id"]))
-        item_id = title_to_id.get(title)
-        if item_id is None:
-            print(f"⚠️ タイトル '{title}' に対応する item_id が見つかりません。")
-            item_id = -1
-    except Exception as e:
-        print(f"❌ items.csv 読み込み失敗: {e}")
+    item_id = catalog.item_id(title)
+    if item_id is None:
+        log.warning("⚠️ タイトルに対応する item_id が見つかりません。", title=title)
         item_id = -1
     return item_id
 
+def titles_to_item_ids(titles):
+    """複数のタイトルをカタログの同じ版でまとめて item_id に変換する（見つからなければ -1）"""
+    data = catalog.data
+    item_ids = []
+    for title in titles:
+        item_id = data.item_id(title)
+        if item_id is None:
+            log.warning("⚠️ タイトルに対応する item_id が見つかりません。", title=title)
+            item_id = -1
+        item_ids.append(item_id)
+    return item_ids
+
+# ============================================================
+# スコアの Min-Max 正規化
+# ============================================================
+def _minmax_normalize(scores):
+    if len(scores) > 0:
+        min_score = np.min(scores)
+        max_score = np.max(scores)
+        if max_score > min_score:
+            scores = (scores - min_score) / (max_score - min_score)
+        else:
+            scores = np.zeros_like(scores)
+    return scores
+
 # ============================================================
 # ALSモデルからスコアを取得する関数
 # ============================================================
 def get_als_scores(user_id, model, matrix, top_n=5):
     if model is None or matrix is None:
-        print("⚠️ ALSモデルまたは行列が未定義のためスコア計算をスキップします。")
+        log.warning("⚠️ ALSモデルまたは行列が未定義のためスコア計算をスキップします。")
         return []
 
     num_items_matrix = matrix.shape[1]
@@ -154,32 +276,103 @@ def get_als_scores(user_id, model, matrix, top_n=5):
 
     # ✅ サイズ整合性チェック
     if num_items_matrix != num_items_model:
-        print(f"❌ モデルと行列の列数不一致: model={num_items_model}, matrix={num_items_matrix}")
-        print("🧩 再訓練が必要です。スコアを返さず終了します。")
+        log.error("❌ モデルと行列の列数不一致。再訓練が必要です。", model=num_items_model, matrix=num_items_matrix)
         return []
 
     # ✅ user_idが範囲内かチェック
     if user_id >= matrix.shape[0]:
-        print(f"⚠️ user_id {user_id} は範囲外です（最大 {matrix.shape[0]-1}）")
+        log.debug("user_id が学習行列の範囲外です", user_id=user_id, max_user_id=matrix.shape[0] - 1)
         return []
 
     # ✅ ALS推薦実行
     try:
         recs, scores = model.recommend(user_id, matrix[user_id], N=top_n)
+        # 既読で除外された分は -FLT_MAX の埋め草として返るので捨てる
         scores = np.array(scores, dtype=float)
-
-        # --- 🔧 Min-Max正規化 ---
-        if len(scores) > 0:
-            min_score = np.min(scores)
-            max_score = np.max(scores)
-            if max_score > min_score:
-                scores = (scores - min_score) / (max_score - min_score)
-            else:
-                scores = np.zeros_like(scores)
+        valid = scores > -np.finfo(np.float32).max
+        recs, scores = np.asarray(recs)[valid], _minmax_normalize(scores[valid])
 
         # print(f"🎯 ALS推薦結果: {list(zip(recs, scores))}")
         return list(zip(recs, scores))
     except Exception as e:
-        print(f"❌ ALS推薦中にエラー発生: {e}")
-        print(f"🧩 model.item_factors.shape={model.item_factors.shape}, matrix.shape={matrix.shape}")
-        return []
\ No newline at end of file
+        log.exception("❌ ALS推薦中にエラー発生", item_factors=model.item_factors.shape, matrix=matrix.shape)
+        return []
+
+# ============================================================
+# ユーザーベクトルの fold-in（アイテム因子は固定）
+# ============================================================
+def fold_in_user(model, item_weights):
+    """{item_id: weight} の行からユーザー因子だけを再計算する。
+
+    item_factors は固定したまま、そのユーザー1行分の最小二乗を解くので
+    全体の再学習は不要。モデルに無い item_id は無視する。
+    戻り値は (user_vector, user_row)。user_row は1行の csr_matrix。
+    """
+    num_items = model.item_factors.shape[0]
+    items = [i for i in item_weights if 0 <= i < num_items]
+    weights = [item_weights[i] for i in items]
+
+    user_row = csr_matrix(
+        (np.array(weights, dtype=np.float32), ([0] * len(items), items)),
+        shape=(1, num_items)
+    )
+    user_vector = model.recalculate_user(0, user_row)
+    return user_vector, user_row
+
+# ============================================================
+# ユーザーベクトルから直接スコアを取得する関数
+# ============================================================
+def get_als_scores_from_vector(user_vector, item_factors, liked_items=(), top_n=5):
+    """model.recommend と同じく内積上位を返す（既読アイテムは除外、Min-Max正規化）"""
+    scores = np.asarray(item_factors) @ np.asarray(user_vector)
+    liked = [i for i in liked_items if 0 <= i < len(scores)]
+    if liked:
+        scores[liked] = -np.inf
+
+    n = min(top_n, len(scores) - len(liked))
+    if n <= 0:
+        return []
+    top = np.argpartition(-scores, n - 1)[:n]
+    top = top[np.argsort(-scores[top])]
+    return list(zip(top.tolist(), _minmax_normalize(scores[top].astype(float))))
+
+# ============================================================
+# 複数ユーザーのスコアをまとめて取得する関数
+# ============================================================
+def als_top_n_batch(user_vectors, item_factors, liked_items, top_n=5):
+    """複数ユーザーの内積上位 top_n を (item_id 行列, 生スコア行列) で返す。
+
+    user_vectors は (ユーザー数 × 因子数)、liked_items はユーザーごとの既読 item_id 列。
+    (ユーザー × アイテム) のスコアは行列積1回で求め、上位の選択も行ごとにまとめて行う。
+    既読を除くと top_n に満たない行の残りは -inf になる。
+    """
+    item_factors = np.asarray(item_factors)
+    scores = np.asarray(user_vectors, dtype=item_factors.dtype).reshape(-1, item_factors.shape[1]) @ item_factors.T
+    num_users, num_items = scores.shape
+    k = min(top_n, num_items)
+    if num_users == 0 or k <= 0:
+        return np.empty((num_users, 0), dtype=np.int64), np.empty((num_users, 0), dtype=scores.dtype)
+
+    for u, liked in enumerate(liked_items):
+        liked = [i for i in liked if 0 <= i < num_items]
+        if liked:
+            scores[u, liked] = -np.inf
+
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+def get_als_scores_batch(user_vectors, item_factors, liked_items, top_n=5):
+    """get_als_scores_from_vector を複数ユーザー分まとめて行う。
+
+    戻り値はユーザーごとの [(item_id, score), ...]（Min-Max正規化）。
+    """
+    top, top_scores = als_top_n_batch(user_vectors, item_factors, liked_items, top_n)
+    results = []
+    for items, row in zip(top, top_scores):
+        valid = np.isfinite(row)
+        results.append(list(zip(
+            items[valid].tolist(), _minmax_normalize(row[valid].astype(float))
+        )))
+    return results
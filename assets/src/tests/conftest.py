@@ -0,0 +1,28 @@
+"""テスト共通設定。
+
+バックエンドのモジュールは import 時にログ・モデル・インデックスの場所を決めるので、
+最初の import より前に一時ディレクトリへ向けておく（assets/ 配下の実データを汚さない）。
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))  # ../assets/src/tests
+SRC_DIR = os.path.dirname(TESTS_DIR)                    # ../assets/src
+ASSETS_DIR = os.path.dirname(SRC_DIR)                   # ../assets
+
+if SRC_DIR not in sys.path:
+    sys.path.append(SRC_DIR)
+
+WORK_DIR = tempfile.mkdtemp(prefix="learningpath-test-")
+os.environ["LEARNINGPATH_LOG_DIR"] = os.path.join(WORK_DIR, "logs")
+os.environ["LEARNINGPATH_MODEL_DIR"] = os.path.join(WORK_DIR, "models")
+os.environ["LEARNINGPATH_INDEX_DIR"] = os.path.join(WORK_DIR, "index")
+
+os.makedirs(os.environ["LEARNINGPATH_LOG_DIR"])
+shutil.copy(os.path.join(ASSETS_DIR, "logs", "user_events.csv"), os.environ["LEARNINGPATH_LOG_DIR"])
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
@@ -0,0 +1,118 @@
+import csv
+
+import pytest
+
+from RelevanceCalculator import user_action as ua
+
+
+@pytest.fixture(scope="module")
+def client():
+    from LearningPathManager import app as app_module
+    yield app_module.app.test_client()
+    app_module.als_manager.stop(5)
+
+
+@pytest.fixture(scope="module")
+def titles():
+    from ContentManager.item_catalog import catalog
+    return [t for t in catalog.data.titles if t][:3]
+
+
+def _logged_rows():
+    ua.flush_user_actions()
+    with open(ua.LOG_FILE, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+@pytest.mark.parametrize("body", [
+    {"user_id": "abc", "item_id": "t", "action": "click"},
+    {"user_id": 1, "item_id": "t", "action": 5},
+    {"user_id": 1, "item_id": ["t"], "action": "click"},
+    {"user_id": 1, "action": "click"},
+])
+def test_log_event_rejects_invalid_event_without_recording(client, body):
+    before = len(_logged_rows())
+    response = client.post("/log_event", json=body)
+    assert response.status_code == 400
+    assert len(_logged_rows()) == before
+
+
+def test_log_event_records_valid_event(client, titles):
+    before = len(_logged_rows())
+    response = client.post("/log_event", json={"user_id": "5", "item_id": titles[0], "action": "click"})
+    assert response.status_code == 200
+    rows = _logged_rows()
+    assert len(rows) == before + 1
+    from ContentManager.item_catalog import catalog
+    assert rows[-1][1:4] == ["5", str(catalog.item_id(titles[0])), "click"]
+
+
+def test_log_events_rejects_invalid_events_and_records_the_rest(client, titles):
+    before = len(_logged_rows())
+    events = [
+        {"user_id": 7, "item_id": titles[0], "action": "click"},
+        {"user_id": "abc", "item_id": titles[1], "action": "click"},
+        {"user_id": 7, "item_id": titles[1], "action": 3},
+        {"user_id": 7, "item_id": ["t"], "action": "click"},
+        {"user_id": 7, "action": "click"},
+        "not an event",
+        {"user_id": "8", "item_id": titles[2], "action": "navigate"},
+    ]
+    response = client.post("/log_events", json={"events": events})
+    assert response.status_code == 200
+    assert response.get_json()["accepted"] == 2
+    assert response.get_json()["rejected"] == [1, 2, 3, 4, 5]
+    rows = _logged_rows()
+    assert len(rows) == before + 2
+    assert [row[1] for row in rows[-2:]] == ["7", "8"]
+
+
+def test_log_events_records_batch_even_if_fold_in_fails(client, titles, monkeypatch):
+    from LearningPathManager import app as app_module
+
+    def fail(events):
+        raise RuntimeError("fold-in failed")
+
+    monkeypatch.setattr(app_module.als_manager, "fold_in_many", fail)
+    before = len(_logged_rows())
+    response = client.post("/log_events", json={"events": [{"user_id": 9, "item_id": titles[0], "action": "click"}]})
+    assert response.status_code == 200
+    assert len(_logged_rows()) == before + 1
+
+
+def test_log_event_records_event_even_if_fold_in_fails(client, titles, monkeypatch):
+    from LearningPathManager import app as app_module
+
+    def fail(user_id, item_id, action):
+        raise RuntimeError("fold-in failed")
+
+    monkeypatch.setattr(app_module.als_manager, "fold_in", fail)
+    before = len(_logged_rows())
+    response = client.post("/log_event", json={"user_id": 9, "item_id": titles[0], "action": "click"})
+    assert response.status_code == 200
+    assert len(_logged_rows()) == before + 1
+
+
+@pytest.mark.parametrize("spacer", ["  ", "　", " \t"])
+def test_recommend_batch_matches_single_for_unnormalized_keyword(client, spacer):
+    from ContentManager.item_catalog import catalog
+    title = next((t for t in catalog.data.titles if t and " " in t.strip()), None)
+    if title is None:
+        pytest.skip("空白を含むタイトルがない")
+    keyword = spacer + title.replace(" ", spacer) + spacer
+    params = {"w1": 0.7, "w2": 0.3, "top_n": 5}
+    single = client.post("/recommend", json={"user_id": 1, "keyword": keyword, **params})
+    batch = client.post("/recommend_batch", json={"requests": [[1, keyword]], **params})
+    assert single.status_code == batch.status_code == 200
+    assert batch.get_json()["results"] == [single.get_json()]
+    assert str(catalog.item_id(title)) not in single.get_json()   # 同じタイトルは除外される
+
+
+def test_metrics_clamp_unknown_actions_and_export_cache_counters(client, titles):
+    client.post("/log_event", json={"user_id": 1, "item_id": titles[0], "action": "Injected-Label-1"})
+    client.post("/log_events", json={"events": [{"user_id": 1, "item_id": titles[0], "action": "CLICK"}]})
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'events_logged_total{action="other"}' in text
+    assert 'events_logged_total{action="click"}' in text
+    assert "injected" not in text.lower()
+    assert "query_cache_events_total counter" in text
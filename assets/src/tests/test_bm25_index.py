@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from rank_bm25 import BM25Okapi
+
+from Benchmark import synthetic
+from InteresrEstimator import bm25_index
+from InteresrEstimator.bm25_index import SparseBM25
+
+SMALL_CORPUS = [
+    ["python", "入門", "python", "変数"],
+    ["python", "関数"],
+    ["機械", "学習", "python"],
+    ["統計", "学習"],
+    ["データ", "分析", "統計", "python"],
+]
+
+
+@pytest.mark.parametrize("query", [
+    ["python"],                 # 半数超の文書に出る語（idf が負 → epsilon で下限）
+    ["学習", "統計"],
+    ["python", "python", "関数"],   # クエリ内の重複
+    ["未知の語"],
+    [],
+])
+def test_scores_match_rank_bm25_on_small_corpus(query):
+    expected = BM25Okapi(SMALL_CORPUS).get_scores(query)
+    np.testing.assert_allclose(SparseBM25.build(SMALL_CORPUS).get_scores(query), expected, atol=1e-12)
+
+
+def test_scores_match_rank_bm25_on_synthetic_corpus():
+    corpus = synthetic.make_token_corpus(300, vocab_size=2000, mean_len=40)
+    queries = synthetic.make_queries(corpus, 20)
+    old, new = BM25Okapi(corpus), SparseBM25.build(corpus)
+    for query in queries:
+        np.testing.assert_allclose(new.get_scores(query), old.get_scores(query), rtol=1e-9, atol=1e-9)
+
+    batch = new.get_scores_batch(queries)
+    for query, scores in zip(queries, batch):
+        np.testing.assert_allclose(scores, new.get_scores(query), atol=1e-12)
+
+
+@pytest.mark.parametrize("scores, mode, expected", [
+    ([1.0, 3.0, 2.0], bm25_index.NORMALIZE_MINMAX, [0.0, 1.0, 0.5]),
+    ([2.0, 2.0], bm25_index.NORMALIZE_MINMAX, [0.0, 0.0]),
+    ([1.0, 4.0], bm25_index.NORMALIZE_MAX, [0.25, 1.0]),
+    ([0.0, -1.0], bm25_index.NORMALIZE_MAX, [0.0, 0.0]),
+])
+def test_normalize_never_divides_by_zero(scores, mode, expected):
+    np.testing.assert_allclose(bm25_index.normalize(np.array(scores), mode), expected)
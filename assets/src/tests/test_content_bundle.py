@@ -0,0 +1,66 @@
+import gzip
+import json
+import os
+
+from ContentManager import content_bundle as cb
+
+
+def _store(tmp_path):
+    bundle_dir = str(tmp_path / "bundle")
+    cb.write_bundle(cb.compile_bundle(), bundle_dir)
+    return cb.ContentBundleStore(bundle_dir=bundle_dir)
+
+
+def test_compile_bundle_is_byte_identical_across_builds(tmp_path):
+    first = cb._dumps(cb.compile_bundle())
+    second = cb._dumps(cb.compile_bundle())
+    assert first == second
+    bundle = json.loads(first)
+    assert bundle["version"] == cb._digest({k: v for k, v in bundle.items() if k != "version"})[:16]
+
+
+def test_full_payload_serves_prebuilt_files(tmp_path):
+    store = _store(tmp_path)
+    full = store.loaded.full
+    with open(store.path, "rb") as f:
+        assert full.body == f.read()
+    with open(store.path + ".gz", "rb") as f:
+        assert full.gzipped == f.read()
+    assert full.etag == f'"{store.loaded.version}"'
+
+
+def test_mismatched_gzip_is_recompressed(tmp_path):
+    store = _store(tmp_path)
+    with open(store.path + ".gz", "wb") as f:
+        f.write(gzip.compress(b"{}", mtime=0))
+    full = store.loaded.full
+    assert gzip.decompress(full.gzipped) == full.body
+
+
+def test_corrupt_gzip_is_recompressed(tmp_path):
+    store = _store(tmp_path)
+    with open(store.path + ".gz", "rb") as f:
+        data = f.read()
+    with open(store.path + ".gz", "wb") as f:
+        f.write(data[:10] + bytes(b ^ 0xFF for b in data[10:40]) + data[40:])
+    full = store.loaded.full
+    assert gzip.decompress(full.gzipped) == full.body
+
+
+def test_bundle_endpoint_uses_etag_and_gzip(tmp_path, monkeypatch):
+    from LearningPathManager import app as app_module
+    monkeypatch.setattr(app_module, "content_bundle", _store(tmp_path))
+    client = app_module.app.test_client()
+
+    response = client.get("/content/bundle", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    etag = response.headers["ETag"]
+    with open(os.path.join(tmp_path, "bundle", cb.BUNDLE_FILE), "rb") as f:
+        assert gzip.decompress(response.data) == f.read()
+
+    response = client.get("/content/bundle", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    response = client.get("/content/bundle", headers={"If-None-Match": "W/" + etag})
+    assert response.status_code == 304   # プロキシが弱い ETag にしても一致する
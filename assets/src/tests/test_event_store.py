@@ -0,0 +1,91 @@
+import datetime
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from RelevanceCalculator import event_store as es
+
+OLD_DAY = (datetime.date.today() - datetime.timedelta(days=10)).strftime("%Y%m%d")
+
+
+def _dense(store):
+    matrix = store.load_matrix()
+    return matrix.toarray() if matrix is not None else None
+
+
+def _append_old_day(store, writer, events):
+    ts, user, item, action = zip(*events)
+    store.append(ts, user, item, action, day=OLD_DAY, writer=writer)
+
+
+def test_append_rows_round_trip_skips_only_bad_rows(tmp_path):
+    store = es.EventStore(str(tmp_path))
+    store.append_rows([
+        ["2025-01-01T00:00:00", 1, 2, "click", 1, ""],
+        ["2025-01-01T00:00:01", "abc", 2, "click", 1, ""],   # 不正な行
+        ["2025-01-01T00:00:02", "7", "3", "bookmark", 2, ""],
+        ["2025-01-01T00:00:03", 1, 2, "navigate", 3, ""],
+    ])
+    user, item, weight = store.load_triples()
+    got = {(int(u), int(i)): float(w) for u, i, w in zip(user, item, weight)}
+    assert got == {(1, 2): 1.0 + 2.0, (7, 3): 3.0}
+
+
+def test_compact_preserves_matrix(tmp_path):
+    store = es.EventStore(str(tmp_path))
+    _append_old_day(store, "w1", [(0, 1, 2, 1), (0, 1, 2, 3), (0, 2, 5, 2)])
+    _append_old_day(store, "w2", [(0, 1, 4, 1), (0, 0, 0, 0)])   # action 0 は重み 0
+    store.append_rows([["", 3, 1, "click", 1, ""]])               # 今日の分は圧縮しない
+    before = _dense(store)
+
+    assert store.compact() == [OLD_DAY]
+    assert not os.path.exists(os.path.join(store.segments_dir, OLD_DAY))
+    np.testing.assert_array_equal(_dense(store), before)
+
+
+def test_compact_is_idempotent_after_crash_before_segment_removal(tmp_path):
+    store = es.EventStore(str(tmp_path))
+    _append_old_day(store, "w1", [(0, 1, 2, 1), (0, 2, 5, 2)])
+    before = _dense(store)
+
+    # 集約ファイルの差し替え後・セグメント削除前に落ちた状態を再現する
+    backup = str(tmp_path / "backup")
+    shutil.copytree(os.path.join(store.segments_dir, OLD_DAY), backup)
+    store.compact()
+    shutil.copytree(backup, os.path.join(store.segments_dir, OLD_DAY))
+
+    np.testing.assert_array_equal(_dense(store), before)
+    store.compact()
+    np.testing.assert_array_equal(_dense(store), before)
+
+    # 後から同じ日に別の書き込み先が増えた分は合算される
+    _append_old_day(store, "w3", [(0, 1, 2, 1)])
+    store.compact()
+    assert _dense(store)[1, 2] == pytest.approx(before[1, 2] + 1.0)
+
+
+def _write_csv(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("timestamp,user_id,item_id,action,action_id,from\n")
+        for row in rows:
+            f.write(",".join(str(c) for c in row) + "\n")
+
+
+def test_migration_restarts_after_crash_and_runs_once(tmp_path):
+    csv_path = str(tmp_path / "user_events.csv")
+    _write_csv(csv_path, [
+        ("2025-01-01T10:00:00", 1, 2, "click", 1, "p"),
+        ("2025-01-02T10:00:00", 1, 3, "bookmark", 2, "p"),
+        ("2025-01-02T11:00:00", "x", 3, "click", 1, "p"),
+    ])
+    store = es.EventStore(str(tmp_path / "events"))
+    # 途中で落ちた移行の書きかけ（完了マーカーは無い）
+    store.append([0], [1], [2], [1], day="20250101", writer=es.MIGRATE_WRITER)
+
+    assert store.migrate_from_csv(csv_path) == 2
+    assert store.migrate_from_csv(csv_path) == 0
+    user, item, weight = store.load_triples()
+    got = {(int(u), int(i)): float(w) for u, i, w in zip(user, item, weight)}
+    assert got == {(1, 2): 1.0, (1, 3): 3.0}
@@ -0,0 +1,104 @@
+import csv
+import os
+import time
+
+import pytest
+
+from RelevanceCalculator import event_store as es
+from RelevanceCalculator import event_writer as ew
+from RelevanceCalculator import user_action as ua
+
+
+def _read_rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def _writer(tmp_path, **kwargs):
+    return ew.EventWriter(str(tmp_path / "events.csv"), header=ua.LOG_HEADER, **kwargs)
+
+
+def test_group_commit_writes_all_rows_once(tmp_path):
+    writer = _writer(tmp_path, flush_interval=0.05)
+    rows = [["2025-01-01T00:00:00", u, u + 1, "click", 1, "p"] for u in range(50)]
+    writer.submit_many(rows)
+    writer.flush()
+    writer.close()
+
+    written = _read_rows(writer.path)
+    assert written[0] == ua.LOG_HEADER
+    assert [int(r[1]) for r in written[1:]] == list(range(50))
+    assert writer.written == 50
+    assert writer.batches < 50   # 1行ずつではなくまとめてコミットしている
+
+
+def test_invalid_row_is_rejected_before_queueing(tmp_path):
+    store = es.EventStore(str(tmp_path / "store"))
+    writer = _writer(tmp_path, on_commit=store.append_rows, validate=ua.coerce_event_row)
+
+    with pytest.raises(ValueError):
+        writer.submit_many([["", 1, 2, "click", 1, ""], ["", "abc", 2, "click", 1, ""]])
+    with pytest.raises(ValueError):
+        writer.submit(["", 1, 2, 5, 1, ""])   # action が文字列でない
+
+    writer.submit_many([["", 1, 2, "click", 1, ""], ["", "7", "3", "bookmark", 2, ""]])
+    writer.flush()
+    writer.close()
+
+    assert len(_read_rows(writer.path)) == 1 + 2
+    assert store.load_matrix().sum() == pytest.approx(1.0 + 3.0)
+
+
+def test_on_commit_failure_keeps_csv_rows(tmp_path):
+    def fail(batch):
+        raise RuntimeError("store is down")
+
+    writer = _writer(tmp_path, on_commit=fail)
+    writer.submit(["", 1, 2, "click", 1, ""])
+    writer.flush()
+    writer.close()
+
+    assert len(_read_rows(writer.path)) == 2
+    assert writer.written == 1
+    assert writer.dropped == 1   # 渡せないままクローズした分は数える
+
+
+def test_on_commit_failure_is_retried_in_order(tmp_path):
+    delivered, failures = [], [RuntimeError("store is down")]
+
+    def flaky(batch):
+        if failures:
+            raise failures.pop()
+        delivered.extend(int(row[1]) for row in batch)
+
+    writer = _writer(tmp_path, on_commit=flaky, flush_interval=0.01, retry_interval=0.05)
+    writer.submit(["", 1, 2, "click", 1, ""])
+    writer.flush()
+    deadline = time.monotonic() + 5
+    while writer.commit_backlog and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert delivered == [1]   # 次のイベントを待たずに再試行される
+
+    failures.append(RuntimeError("store is down again"))
+    writer.submit(["", 2, 2, "click", 1, ""])
+    writer.flush()
+    writer.submit(["", 3, 2, "click", 1, ""])
+    writer.flush()
+    writer.close()
+
+    assert delivered == [1, 2, 3]
+    assert writer.commit_backlog == 0 and writer.dropped == 0
+    assert len(_read_rows(writer.path)) == 1 + 3
+
+
+def test_flush_fails_fast_when_log_cannot_be_opened(tmp_path):
+    (tmp_path / "not_a_dir").write_text("")
+    writer = ew.EventWriter(os.path.join(str(tmp_path), "not_a_dir", "events.csv"))
+    deadline = time.monotonic() + 5
+    while writer._thread.is_alive() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert writer.error is not None
+    with pytest.raises(RuntimeError):
+        writer.submit(["x"])
+    writer.flush()   # キューは空なので待たずに戻る
@@ -0,0 +1,55 @@
+import json
+import os
+
+import pytest
+
+from InteresrEstimator import index_snapshot as snap
+from InteresrEstimator import tokenizer as tk
+from InteresrEstimator.bm25_index import SparseBM25
+
+CHECKSUM = "0" * 64
+CORPUS = [["python", "入門"], ["機械", "学習", "python"]]
+
+
+class FakeTokenizer(tk.BaseTokenizer):
+    name = "fake"
+
+    def __init__(self, dictionary="ipadic"):
+        super().__init__()
+        self.dictionary = dictionary
+
+
+@pytest.fixture
+def saved(tmp_path):
+    root = str(tmp_path)
+    path = snap.save_snapshot(SparseBM25.build(CORPUS), CORPUS, CHECKSUM, FakeTokenizer(), root)
+    return root, path
+
+
+def test_snapshot_round_trip(saved):
+    root, _ = saved
+    index, tokenized = snap.load_snapshot(CHECKSUM, FakeTokenizer(), root)
+    assert index.corpus_size == len(CORPUS)
+    assert list(tokenized) == CORPUS
+
+
+def test_snapshot_rejected_for_other_dictionary(saved):
+    root, _ = saved
+    assert snap.load_snapshot(CHECKSUM, FakeTokenizer("unidic"), root) is None
+
+
+def test_snapshot_rejected_after_policy_change(saved, monkeypatch):
+    root, _ = saved
+    monkeypatch.setattr(tk, "STOPWORDS", tk.STOPWORDS | {"python"})
+    assert snap.load_snapshot(CHECKSUM, FakeTokenizer(), root) is None
+
+
+def test_snapshot_rejected_when_meta_disagrees(saved):
+    root, path = saved
+    meta_path = os.path.join(path, "meta.json")
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    meta["tokenizer_signature"] = "stale"
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    assert snap.load_snapshot(CHECKSUM, FakeTokenizer(), root) is None
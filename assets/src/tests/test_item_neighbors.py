@@ -0,0 +1,58 @@
+import numpy as np
+
+from RelevanceCalculator import item_neighbors as inb
+from RelevanceCalculator.item_neighbors import ItemNeighbors
+
+
+def _clustered_factors(n_items=600, dim=16, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    factors = centers[rng.integers(0, clusters, n_items)] + 0.3 * rng.standard_normal((n_items, dim))
+    return factors.astype(np.float32)
+
+
+def _brute_force(factors, k):
+    normed = inb.normalize_rows(factors)
+    scores = normed @ normed.T
+    np.fill_diagonal(scores, -np.inf)
+    return np.argsort(-scores, axis=1, kind="stable")[:, :k], np.sort(scores, axis=1)[:, ::-1][:, :k]
+
+
+def test_exact_mode_matches_brute_force():
+    factors = _clustered_factors(n_items=200)
+    neighbors = ItemNeighbors.build(factors, k=10, mode=inb.MODE_EXACT)
+    expected_items, expected_sims = _brute_force(factors, 10)
+    np.testing.assert_allclose(neighbors.sims, expected_sims, rtol=1e-5, atol=1e-6)
+    # 類似度が同点でなければ並びも一致する
+    assert (neighbors.items[:, 0] == expected_items[:, 0]).mean() > 0.99
+
+
+def test_items_without_factors_have_no_neighbors():
+    factors = _clustered_factors(n_items=50)
+    factors[[3, 7]] = 0.0
+    for mode in (inb.MODE_EXACT, inb.MODE_LSH):
+        neighbors = ItemNeighbors.build(factors, k=5, mode=mode)
+        assert neighbors.similar(3) == [] and neighbors.similar(7) == []
+        listed = {item for i in range(50) for item, _ in neighbors.similar(i)}
+        assert not listed & {3, 7}
+        assert neighbors.similar(-1) == [] and neighbors.similar(50) == []
+
+
+def test_lsh_mode_returns_valid_neighbors_with_high_recall():
+    factors = _clustered_factors()
+    k = 10
+    lsh = ItemNeighbors.build(factors, k=k, mode=inb.MODE_LSH)
+    exact = ItemNeighbors.build(factors, k=k, mode=inb.MODE_EXACT)
+    normed = inb.normalize_rows(factors)
+
+    hits = 0
+    for i in range(len(factors)):
+        found = lsh.similar(i, k)
+        ids = [item for item, _ in found]
+        sims = [sim for _, sim in found]
+        assert i not in ids
+        assert len(ids) == len(set(ids))
+        assert sims == sorted(sims, reverse=True)
+        np.testing.assert_allclose(sims, normed[ids] @ normed[i], rtol=1e-5, atol=1e-6)
+        hits += len(set(ids) & {item for item, _ in exact.similar(i, k)})
+    assert hits / (k * len(factors)) > 0.8
@@ -0,0 +1,75 @@
+import os
+
+import networkx as nx
+import pytest
+
+from InteresrEstimator import related_content_finder as rcf
+from InteresrEstimator.keyword_index import KeywordIndex, read_keyword_line
+
+
+def _reference_relevance(input_keywords, folder):
+    """元の estimate_relevance_graph（networkx のグラフで文書ごとに数える）"""
+    graph = nx.Graph()
+    documents = []
+    for root, _, files in os.walk(folder):
+        for file in files:
+            if file.endswith(".txt"):
+                path = os.path.join(root, file)
+                keywords = read_keyword_line(path)
+                if keywords is None:
+                    continue
+                documents.append((path, keywords))
+                graph.add_nodes_from(keywords)
+                for i in range(len(keywords)):
+                    for j in range(i + 1, len(keywords)):
+                        graph.add_edge(keywords[i], keywords[j])
+
+    scores = []
+    for path, file_keywords in documents:
+        union = set(input_keywords) | set(file_keywords)
+        intersection = set(input_keywords) & set(file_keywords)
+        score = len(intersection) / len(union) if union else 0
+        graph_score = sum(1 for kw in input_keywords for fk in file_keywords if graph.has_edge(kw, fk))
+        scores.append((score + 0.1 * graph_score, path))
+    scores.sort(reverse=True)
+    return scores
+
+
+def _assert_same_ranking(index, folder, input_keywords, top_n=10):
+    expected = _reference_relevance(input_keywords, folder)[:top_n]
+    actual = index.top(input_keywords, top_n=top_n)
+    assert [p for _, p in actual] == [p for _, p in expected]
+    assert [s for s, _ in actual] == pytest.approx([s for s, _ in expected], abs=1e-12)
+
+
+def _queries(folder):
+    paths = sorted(os.path.join(root, f) for root, _, files in os.walk(folder) for f in files if f.endswith(".txt"))
+    queries = [["未知の語"], ["学習", "学習", "未知の語"]]
+    for path in paths[::7]:
+        keywords = read_keyword_line(path) or []
+        queries.append(keywords)
+        queries.append(keywords[:3] + ["未知の語"])
+    return queries
+
+
+def test_matches_reference_on_extra_contents():
+    folder = rcf.EXTRA_CONTENTS_DIR
+    index = KeywordIndex.build(folder)
+    for query in _queries(folder):
+        _assert_same_ranking(index, folder, query)
+
+
+def test_matches_reference_with_duplicate_keywords_and_ties(tmp_path):
+    files = {
+        "a.txt": "title: a\nkeyword: 学習, 統計, 学習\n",     # 同一文書内の重複語（自己ループ）
+        "b.txt": "title: b\nkeyword: 統計, 分析\n",
+        "c.txt": "title: c\nkeyword: 分析, 可視化\n",
+        "d.txt": "title: d\n",                                  # keyword: 行なし
+        "e.txt": "title: e\nkeyword: 可視化, 分析\n",           # c と同点
+    }
+    for name, text in files.items():
+        (tmp_path / name).write_text(text, encoding="utf-8")
+    folder = str(tmp_path)
+    index = KeywordIndex.build(folder)
+    for query in (["学習"], ["分析"], ["学習", "分析"], ["可視化", "可視化"], ["無関係"]):
+        _assert_same_ranking(index, folder, query)
@@ -0,0 +1,77 @@
+import csv
+import importlib.util
+import json
+import os
+
+import pytest
+
+from conftest import ASSETS_DIR
+
+
+@pytest.fixture(scope="module")
+def make_path(tmp_path_factory):
+    # make_path.py は import 時にカレントディレクトリへ folder_structure.txt を書くので一時ディレクトリで読む
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("make_path"))
+    try:
+        spec = importlib.util.spec_from_file_location("make_path", os.path.join(ASSETS_DIR, "content", "make_path.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        os.chdir(cwd)
+    return module
+
+
+def _write_txt(folder, name, title, main):
+    (folder / name).write_text(f"title: {title}\nmain: {main}\nkeyword: {title}, {main}\n", encoding="utf-8")
+
+
+def _write_legacy_csv(folder, input_dir, make_path):
+    """旧実装と同じく、ソートしたファイル名の順に 1 から番号を振った items.csv"""
+    with open(folder / "items.csv", "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(["item_id", "title", "body", "tags", "category"])
+        for i, name in enumerate(sorted(os.listdir(input_dir)), start=1):
+            title, body, tags, category, _ = make_path.parse_txt(os.path.join(input_dir, name))
+            writer.writerow([i, title, body, tags, category])
+
+
+def test_seeding_run_reports_files_edited_since_last_csv(tmp_path, make_path):
+    input_dir = tmp_path / "ExtraContents"
+    input_dir.mkdir()
+    for i in range(1, 4):
+        _write_txt(input_dir, f"Extra{i}.txt", f"記事{i}", f"本文{i}")
+    _write_legacy_csv(tmp_path, input_dir, make_path)
+
+    # 固定表（item_ids.json）を作る前に1件編集・1件追加されている
+    _write_txt(input_dir, "Extra2.txt", "記事2", "書き換えた本文")
+    _write_txt(input_dir, "Extra4.txt", "記事4", "本文4")
+
+    output_csv = str(tmp_path / "items.csv")
+    changes = make_path.txts_to_single_csv(str(input_dir), output_csv)
+    assert changes["modified"] == [2]
+    assert changes["added"] == [4]
+    assert changes["removed"] == []
+
+    with open(tmp_path / "item_ids.json", encoding="utf-8") as f:
+        assert all(entry["sha256"] for entry in json.load(f)["files"].values())
+
+    # 2回目以降はハッシュで比べる
+    assert make_path.txts_to_single_csv(str(input_dir), output_csv)["modified"] == []
+    _write_txt(input_dir, "Extra3.txt", "記事3", "また書き換えた")
+    os.remove(input_dir / "Extra1.txt")
+    changes = make_path.txts_to_single_csv(str(input_dir), output_csv)
+    assert (changes["modified"], changes["removed"]) == ([3], [1])
+
+
+def test_seeding_run_reports_csv_rows_without_files_as_removed(tmp_path, make_path):
+    input_dir = tmp_path / "ExtraContents"
+    input_dir.mkdir()
+    for i in range(1, 4):
+        _write_txt(input_dir, f"Extra{i}.txt", f"記事{i}", f"本文{i}")
+    _write_legacy_csv(tmp_path, input_dir, make_path)
+    os.remove(input_dir / "Extra3.txt")
+
+    changes = make_path.txts_to_single_csv(str(input_dir), str(tmp_path / "items.csv"))
+    assert changes["removed"] == [3]
+    assert changes["modified"] == []
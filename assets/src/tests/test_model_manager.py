@@ -0,0 +1,133 @@
+import multiprocessing
+import time
+
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+from RelevanceCalculator import model_manager as mm
+from RelevanceCalculator import user_action as ua
+
+
+def _matrix(seed=0, users=8, items=30):
+    rng = np.random.default_rng(seed)
+    dense = (rng.random((users, items)) < 0.3) * rng.integers(1, 4, (users, items))
+    return csr_matrix(dense.astype(np.float32))
+
+
+@pytest.fixture
+def interactions(monkeypatch):
+    """学習データを差し替える（matrix に None を入れると「データなし」）"""
+    state = {"matrix": None, "loads": 0}
+
+    def load(csv_path=None, window_days=None):
+        state["loads"] += 1
+        return state["matrix"]
+
+    monkeypatch.setattr(ua, "load_interaction_matrix", load)
+    return state
+
+
+def _manager(**kwargs):
+    return mm.ALSModelManager(csv_path="unused.csv", persist=False, factors=4, iterations=3, **kwargs)
+
+
+def _wait_for(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return predicate()
+
+
+def test_cold_start_without_data_does_not_retrain_per_request(interactions, monkeypatch):
+    monkeypatch.setattr(mm, "COLD_START_RETRY_SEC", 0)
+    manager = _manager()
+    try:
+        for _ in range(5):
+            assert manager.get().version == 0
+        assert interactions["loads"] == 1
+
+        # イベントが届いたらワーカーが学習し直す
+        interactions["matrix"] = _matrix()
+        manager.notify_events()
+        assert _wait_for(lambda: manager.version == 1)
+    finally:
+        manager.stop(5)
+
+
+def test_fold_in_updates_known_and_new_users(interactions):
+    interactions["matrix"] = _matrix()
+    manager = _manager()
+    try:
+        snapshot = manager.get()
+        before = dict(manager.get_als_scores(0, snapshot, top_n=30))
+        target = next(i for i in range(30) if snapshot.matrix[0, i] == 0)
+
+        folded = manager.fold_in(0, target, "bookmark")
+        assert folded.version == snapshot.version
+        assert target in folded.liked
+        after = dict(manager.get_als_scores(0, snapshot, top_n=30))
+        assert target not in after          # 反応済みのアイテムは推薦しない
+        assert after != before
+
+        # 学習時にいなかったユーザーもその場で因子を持つ
+        assert manager.get_als_scores(100, snapshot) == []
+        manager.fold_in_many([(100, 1, "click"), (100, 2, "navigate"), (100, 3, "unknown")])
+        assert sorted(manager._folded[100].liked) == [1, 2]
+        assert manager.get_als_scores(100, snapshot)
+    finally:
+        manager.stop(5)
+
+
+def test_retrain_drops_fold_ins_covered_by_new_model(interactions):
+    interactions["matrix"] = _matrix()
+    manager = _manager()
+    try:
+        manager.get()
+        manager.fold_in(100, 1, "click")
+        manager.retrain()
+        assert 100 not in manager._folded
+    finally:
+        manager.stop(5)
+
+
+def _publish_from_other_worker(feed, updates, at):
+    feed.publish(updates, at)
+
+
+def _run_in_other_worker(target, *args):
+    child = multiprocessing.get_context("fork").Process(target=target, args=args)
+    child.start()
+    child.join(10)
+    assert child.exitcode == 0
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="fork が使えない")
+def test_fold_ins_from_other_workers_reach_this_worker(interactions):
+    interactions["matrix"] = _matrix()
+    manager = _manager()
+    manager._feed = mm._FoldFeed(size=8)   # 共有モードと同じく fork 前に作る
+    try:
+        manager.get()
+        _run_in_other_worker(_publish_from_other_worker, manager._feed,
+                             {100: [(1, ua.ACTIONS_WEIGHT["click"])]}, time.time())
+        assert 100 not in manager._folded
+        manager.get()
+        assert manager._folded[100].liked == [1]
+
+        # 自分が積んだ分は二重に足さない
+        manager.fold_in(100, 2, "click")
+        manager.get()
+        assert manager._folded_rows[100] == {1: ua.ACTIONS_WEIGHT["click"], 2: ua.ACTIONS_WEIGHT["click"]}
+    finally:
+        manager.stop(5)
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="fork が使えない")
+def test_fold_feed_skips_trained_and_overwritten_events(interactions):
+    feed = mm._FoldFeed(size=2)
+    _run_in_other_worker(_publish_from_other_worker, feed, {1: [(1, 1.0)], 2: [(2, 1.0)], 3: [(3, 1.0)]}, 100.0)
+    updates, updated_at, cursor, dropped = feed.read(0, since=0.0)
+    assert (sorted(updates), cursor, dropped) == ([2, 3], 3, 1)
+    assert updated_at == {2: 100.0, 3: 100.0}
+    assert feed.read(0, since=200.0)[0] == {}      # 学習済みのイベントは反映しない
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+from RelevanceCalculator import model_manager as mm
+from RelevanceCalculator import model_registry as mr
+from RelevanceCalculator import user_action as ua
+
+
+@pytest.fixture
+def matrix(monkeypatch):
+    rng = np.random.default_rng(0)
+    dense = (rng.random((8, 30)) < 0.3) * rng.integers(1, 4, (8, 30))
+    data = csr_matrix(dense.astype(np.float32))
+    monkeypatch.setattr(ua, "load_interaction_matrix", lambda csv_path=None, window_days=None: data)
+    return data
+
+
+def _manager(root):
+    return mm.ALSModelManager(csv_path="unused.csv", model_dir=str(root), factors=4, iterations=3)
+
+
+def test_retrain_warm_starts_from_current(matrix, tmp_path):
+    manager = _manager(tmp_path)
+    assert manager.retrain().version == 1
+    assert manager.retrain().version == 2
+    meta = mr.read_meta(mr.model_name(2), str(tmp_path))
+    assert meta["warm_start_from"] == 1
+    assert meta["iterations"] == mm.WARM_START_ITERATIONS
+    assert mr.current(str(tmp_path)) == {"version": 2, "name": mr.model_name(2), "pinned": False}
+
+
+def test_rollback_pins_and_release_resumes(matrix, tmp_path):
+    root = str(tmp_path)
+    manager = _manager(tmp_path)
+    manager.retrain()
+    manager.retrain()
+
+    assert mr.rollback(root=root)["version"] == 1
+    assert manager.sync() and manager.version == 1
+    assert manager.retrain().version == 1          # 固定中は学習しない
+    assert mr.latest_version(root) == 2
+
+    assert mr.release(root) == 1
+    assert manager.retrain().version == 3          # 番号は保存済みの続きから
+    assert mr.current(root)["version"] == 3
+
+
+def test_rollback_during_retrain_keeps_pin(matrix, tmp_path, monkeypatch):
+    root = str(tmp_path)
+    manager = _manager(tmp_path)
+    manager.retrain()
+    manager.retrain()
+
+    train = ua.train_als_model
+
+    def train_then_rollback(*args, **kwargs):
+        result = train(*args, **kwargs)
+        mr.rollback(1, root)
+        return result
+
+    monkeypatch.setattr(ua, "train_als_model", train_then_rollback)
+    assert manager.retrain().version == 1
+    assert mr.current(root) == {"version": 1, "name": mr.model_name(1), "pinned": True}
+    assert mr.latest_version(root) == 3            # 学習した版は保存だけされる
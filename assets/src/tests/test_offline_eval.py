@@ -0,0 +1,33 @@
+import pytest
+
+from RelevanceCalculator import offline_eval as oe
+
+TITLES = {1: "Python 入門", 2: "リスト", 3: "辞書"}
+
+
+def _event(ts, user_id, item_id, action="click", source=""):
+    return (ts, user_id, item_id, action, source)
+
+
+def test_leave_last_out_uses_page_before_target_as_keyword():
+    events = [
+        _event("1", 0, 1),
+        _event("2", 0, 2, source="Python 入門"),
+        _event("3", 0, 3, source="リスト"),
+        _event("4", 0, 3, action="navigate", source="辞書"),
+    ]
+    train, cases = oe.leave_last_out(events, 4, TITLES.get)
+    assert cases == [oe.EvalCase(0, "リスト", 3)]
+    assert train[0, 3] == 0
+    assert train[0, 1] > 0 and train[0, 2] > 0
+
+
+def test_leave_last_out_skips_users_without_history():
+    events = [_event("1", 0, 1), _event("2", 0, 1, action="navigate")]
+    _, cases = oe.leave_last_out(events, 4, TITLES.get)
+    assert cases == []
+
+
+def test_sweep_refuses_too_few_users():
+    with pytest.raises(ValueError, match="--min-users"):
+        oe.sweep(oe.ua.LOG_FILE, [3], [4], [0.1], [3], [0.5], workers=1, min_users=10 ** 6)
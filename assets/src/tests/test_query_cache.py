@@ -0,0 +1,53 @@
+import multiprocessing
+
+import pytest
+
+from InteresrEstimator.query_cache import LRUCache
+
+
+def test_invalidate_drops_group_and_bumps_generation():
+    cache = LRUCache(16)
+    before = cache.generation(1)
+    cache.put(("a", before), "x", group=1)
+    cache.put(("b", 0), "y", group=2)
+    assert cache.invalidate(1) == 1
+    assert cache.get(("a", before)) is None
+    assert cache.get(("b", 0)) == "y"
+    assert cache.generation(1) == before + 1
+
+
+def test_generations_stay_bounded():
+    cache = LRUCache(16, generation_slots=8)
+    for user_id in range(1000):
+        before = cache.generation(user_id)
+        cache.invalidate(user_id)
+        assert cache.generation(user_id) > before
+    assert len(cache._generations) == 8
+
+
+def _invalidate_in_child(cache, group):
+    cache.invalidate(group)
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="fork が使えない")
+def test_shared_generation_is_seen_by_other_processes():
+    cache = LRUCache(16, shared=True)
+    before = cache.generation(42)
+    child = multiprocessing.get_context("fork").Process(target=_invalidate_in_child, args=(cache, 42))
+    child.start()
+    child.join(10)
+    assert child.exitcode == 0
+    assert cache.generation(42) == before + 1
+
+
+def test_recommend_cache_key_tracks_catalog_version(monkeypatch):
+    from LearningPathManager import app as app_module
+    client = app_module.app.test_client()
+    body = {"user_id": 1, "keyword": "", "w1": 0.5, "w2": 0.5, "top_n": 3}
+
+    client.post("/recommend", json=body)
+    assert client.post("/recommend", json=body).headers["X-Cache"] == "hit"
+
+    monkeypatch.setattr(type(app_module.catalog), "version", property(lambda self: -1))
+    assert client.post("/recommend", json=body).headers["X-Cache"] == "miss"   # 版が違えば引かない
+    assert client.post("/recommend", json=body).headers["X-Cache"] == "miss"   # 結果と食い違う版では入れない
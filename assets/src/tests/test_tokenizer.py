@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+from InteresrEstimator.tokenizer import get_tokenizer
+from LearningPathManager import make_keyword
+
+
+@pytest.fixture(scope="module")
+def ipadic():
+    return get_tokenizer("auto", make_keyword.TOKENIZER_DICTIONARY)
+
+
+def test_keywords_skip_numbers_and_keep_case(ipadic):
+    keywords = ipadic.keywords("1950年代に人工知能の研究が始まり、機械学習が発展した")
+    assert "1950" not in keywords
+    assert "人工" in keywords and "研究" in keywords
+    assert all(k == k.strip() and len(k) > 1 for k in keywords)
+
+
+def test_search_tokens_are_normalized(ipadic):
+    assert ipadic.tokenize("ＰＹＴＨＯＮ") == ipadic.tokenize("python")
+
+
+def test_keyword_lines_match_committed_content(ipadic):
+    """make_keyword を今の方針で実行しても keyword: 行が変わらない"""
+    mismatched = []
+    for path in make_keyword.list_files():
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        text = make_keyword.read_main(lines)
+        expected = ipadic.keywords(text, top_n=make_keyword.TOP_N) if text is not None else []
+        current = next((line for line in lines if line.startswith("keyword:")), None)
+        if current != f"keyword: {', '.join(expected)}\n":
+            mismatched.append(os.path.relpath(path, make_keyword.CONTENT_DIR))
+    assert mismatched == []
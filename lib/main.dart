@@ -1,18 +1,47 @@
 import 'package:flutter/material.dart';
 import 'screens/learning_path_select_screen.dart';
+import 'utils/log_and_bookmark.dart';
 
 void main() {
   runApp(const MyApp());
 }
 
-class MyApp extends StatelessWidget {
+class MyApp extends StatefulWidget {
   const MyApp({super.key});
 
+  @override
+  State<MyApp> createState() => _MyAppState();
+}
+
+class _MyAppState extends State<MyApp> with WidgetsBindingObserver {
+  @override
+  void initState() {
+    super.initState();
+    WidgetsBinding.instance.addObserver(this);
+  }
+
+  @override
+  void dispose() {
+    WidgetsBinding.instance.removeObserver(this);
+    super.dispose();
+  }
+
+  @override
+  void didChangeAppLifecycleState(AppLifecycleState state) {
+    // バックグラウンドに回ったら、たまっているイベントを送っておく
+    if (state == AppLifecycleState.paused ||
+        state == AppLifecycleState.inactive ||
+        state == AppLifecycleState.detached) {
+      eventBuffer.flush();
+    }
+  }
+
   @override
   Widget build(BuildContext context) {
     return MaterialApp(
       title: 'Learning Path App',
       theme: ThemeData(primarySwatch: Colors.blue),
+      navigatorObservers: [EventFlushObserver()],
       home: const LearningPathSelectScreen(),
     );
   }
@@ -88,50 +88,50 @@ class _ExtraDetailScreenState extends State<ExtraDetailScreen> {
   Future<void> _fetchRelatedByTitle(String title) async {
     setState(() => loading = true);
     try {
-      final response = await http.post(
-        Uri.parse('http://10.0.2.2:5000/recommend'),
-        headers: {'Content-Type': 'application/json'},
-        body: jsonEncode({'user_id': 2, 'keyword': title}),
-      );
-      if (response.statusCode == 200) {
-        final List<dynamic> paths = jsonDecode(response.body);
-        final List<Map<String, String>> loaded = [];
-        await _ensureItemsLoadedLocal();
+      // まずはアイテム因子の近傍（ユーザー不要）。無ければ従来のハイブリッド推薦
+      var paths = await _postForIds('similar_items', {'title': title});
+      if (paths == null || paths.isEmpty) {
+        paths = await _postForIds('recommend', {
+          'user_id': 2,
+          'keyword': title,
+        });
+      }
+      if (paths == null) return;
 
-        for (final s in paths) {
-          final numericMatch = RegExp(r'^\d+$').firstMatch(s.trim());
-          String? itemId;
-          if (numericMatch != null) {
-            itemId = s.trim();
-          } else {
-            final name = s.replaceAll('\\', '/').split('/').last;
-            final m = RegExp(r'(\d+)').firstMatch(name);
-            if (m != null) itemId = m.group(1);
-          }
+      final List<Map<String, String>> loaded = [];
+      await _ensureItemsLoadedLocal();
 
-          if (itemId != null && _itemsCacheLocal.containsKey(itemId)) {
-            final it = _itemsCacheLocal[itemId]!;
-            loaded.add({
-              'title': it['title'] ?? '',
-              'main': it['body'] ?? '',
-              'category': it['category'] ?? '',
-            });
-            continue;
-          }
+      for (final s in paths) {
+        final numericMatch = RegExp(r'^\d+$').firstMatch(s.trim());
+        String? itemId;
+        if (numericMatch != null) {
+          itemId = s.trim();
+        } else {
+          final name = s.replaceAll('\\', '/').split('/').last;
+          final m = RegExp(r'(\d+)').firstMatch(name);
+          if (m != null) itemId = m.group(1);
+        }
 
-          try {
-            final assetPath = assetPathFromPythonPath(s);
-            final content = await rootBundle.loadString(assetPath);
-            loaded.add(parseKeyValue(content));
-          } catch (e) {
-            debugPrint('⚠️ detail 参照コンテンツ読み込み失敗 ($s): $e');
-          }
+        if (itemId != null && _itemsCacheLocal.containsKey(itemId)) {
+          final it = _itemsCacheLocal[itemId]!;
+          loaded.add({
+            'title': it['title'] ?? '',
+            'main': it['body'] ?? '',
+            'category': it['category'] ?? '',
+          });
+          continue;
         }
 
-        setState(() => related = loaded);
-      } else {
-        debugPrint('⚠️ Python応答エラー (detail): ${response.body}');
+        try {
+          final assetPath = assetPathFromPythonPath(s);
+          final content = await rootBundle.loadString(assetPath);
+          loaded.add(parseKeyValue(content));
+        } catch (e) {
+          debugPrint('⚠️ detail 参照コンテンツ読み込み失敗 ($s): $e');
+        }
       }
+
+      setState(() => related = loaded);
     } catch (e) {
       debugPrint('❌ Python連携エラー (detail): $e');
     } finally {
@@ -139,6 +139,24 @@ class _ExtraDetailScreenState extends State<ExtraDetailScreen> {
     }
   }
 
+  /// Python サーバーへ POST し、item_id（文字列）のリストを受け取る。失敗時は null。
+  Future<List<String>?> _postForIds(
+    String endpoint,
+    Map<String, dynamic> body,
+  ) async {
+    final response = await http.post(
+      Uri.parse('http://10.0.2.2:5000/$endpoint'),
+      headers: {'Content-Type': 'application/json'},
+      body: jsonEncode(body),
+    );
+    if (response.statusCode == 200) {
+      final List<dynamic> ids = jsonDecode(response.body);
+      return ids.map((e) => e.toString()).toList();
+    }
+    debugPrint('⚠️ Python応答エラー (detail/$endpoint): ${response.body}');
+    return null;
+  }
+
   void _showRelatedContentsModal() {
     if (related.isEmpty) {
       showDialog(
@@ -1,3 +1,4 @@
+import 'dart:async';
 import 'dart:convert';
 import 'dart:io';
 import 'package:http/http.dart' as http;
@@ -16,30 +17,107 @@ Future<File> _interactionLogFile() async {
   return f;
 }
 
-Future<void> _sendEventToPython(
-  String action,
-  String itemId,
-  String from,
-) async {
-  try {
-    final response = await http.post(
-      Uri.parse('http://10.0.2.2:5000/log_event'),
-      headers: {'Content-Type': 'application/json'},
-      body: jsonEncode({
-        'user_id': 2,
-        'item_id': itemId,
-        'action': action,
-        'from': from,
-        'timestamp': DateTime.now().toIso8601String(),
-      }),
-    );
-    if (response.statusCode != 200) {
-      debugPrint('⚠️ Pythonログ送信エラー: ${response.body}');
+/// イベントをためて /log_events へまとめて送るバッファ。
+///
+/// 送信はタイマー（[flushInterval]）・件数（[maxBatch]）・画面遷移
+/// （[EventFlushObserver]）・アプリのバックグラウンド移行（main.dart）で行う。
+/// 送信に失敗したイベントは先頭に戻し、次の送信で再送する。
+class EventBuffer {
+  EventBuffer({
+    this.flushInterval = const Duration(seconds: 5),
+    this.maxBatch = 50,
+    this.maxPending = 500,
+  });
+
+  final Duration flushInterval;
+  final int maxBatch; // この件数たまったらタイマーを待たずに送る
+  final int maxPending; // 送れないまま超えたら古いものから捨てる
+
+  final List<Map<String, dynamic>> _pending = [];
+  Timer? _timer;
+  Future<void>? _inFlight;
+
+  void add(Map<String, dynamic> event) {
+    _pending.add(event);
+    if (_pending.length > maxPending) {
+      _pending.removeRange(0, _pending.length - maxPending);
+    }
+    if (_pending.length >= maxBatch) {
+      flush();
     } else {
-      debugPrint('✅ Pythonイベント送信成功 ($action / $itemId)');
+      _timer ??= Timer(flushInterval, flush);
     }
-  } catch (e) {
-    debugPrint('❌ Python送信失敗: $e');
+  }
+
+  /// たまっているイベントを送る（送信中なら終わってから続けて送る）。
+  Future<void> flush() async {
+    _timer?.cancel();
+    _timer = null;
+    while (_inFlight != null) {
+      await _inFlight;
+    }
+    if (_pending.isEmpty) return;
+
+    final batch = List<Map<String, dynamic>>.of(_pending);
+    _pending.clear();
+    final sending = _send(batch);
+    _inFlight = sending;
+    try {
+      await sending;
+    } finally {
+      _inFlight = null;
+    }
+  }
+
+  Future<void> _send(List<Map<String, dynamic>> batch) async {
+    try {
+      final response = await http.post(
+        Uri.parse('http://10.0.2.2:5000/log_events'),
+        headers: {'Content-Type': 'application/json'},
+        body: jsonEncode({'events': batch}),
+      );
+      if (response.statusCode == 200) {
+        debugPrint('✅ Pythonイベント送信成功 (${batch.length}件)');
+      } else if (response.statusCode >= 500) {
+        _requeue(batch);
+        debugPrint('⚠️ Pythonログ送信エラー（再送します）: ${response.body}');
+      } else {
+        // 形式の誤りは再送しても通らないので捨てる
+        debugPrint('⚠️ Pythonログ送信エラー: ${response.body}');
+      }
+    } catch (e) {
+      _requeue(batch);
+      debugPrint('❌ Python送信失敗（再送します）: $e');
+    }
+  }
+
+  void _requeue(List<Map<String, dynamic>> batch) {
+    _pending.insertAll(0, batch);
+    if (_pending.length > maxPending) {
+      _pending.removeRange(0, _pending.length - maxPending);
+    }
+    _timer ??= Timer(flushInterval, flush);
+  }
+}
+
+/// アプリ全体で共有するイベントバッファ
+final eventBuffer = EventBuffer();
+
+/// 画面遷移のたびにイベントバッファを送る（MaterialApp.navigatorObservers に登録）
+class EventFlushObserver extends NavigatorObserver {
+  @override
+  void didPush(Route<dynamic> route, Route<dynamic>? previousRoute) {
+    eventBuffer.flush();
+  }
+
+  @override
+  void didPop(Route<dynamic> route, Route<dynamic>? previousRoute) {
+    eventBuffer.flush();
+  }
+
+  @override
+  void didReplace({Route<dynamic>? newRoute, Route<dynamic>? oldRoute}) {
+    eventBuffer.flush();
   }
 }
 
@@ -55,7 +133,13 @@ Future<void> recordEvent(
     final line =
         '${DateTime.now().toIso8601String()},$action,"$safeTitle","$safeFrom"\n';
     await file.writeAsString(line, mode: FileMode.append, flush: true);
-    await _sendEventToPython(action, title, from);
+    eventBuffer.add({
+      'user_id': 2,
+      'item_id': title,
+      'action': action,
+      'from': from,
+      'timestamp': DateTime.now().toIso8601String(),
+    });
   } catch (e) {
     debugPrint('❌ ログ記録失敗: $e');
   }